@@ -1,5 +1,7 @@
 from flask import Flask, request, redirect, make_response, Response, render_template, g
 from cache import cache
+from settings import build_aws_config
+from storage import storageProvider
 from os import environ
 from authlib.integrations.flask_client import OAuth
 
@@ -99,23 +101,7 @@ def create_app():
     )
 
 
-    if app.config['USE_LOCAL_S3'] == True:
-        app.config['AWS_CONFIG'] = {
-            'aws_access_key_id':app.config['LOCAL_ACCESS_KEY_ID'],
-            'aws_access_secret':app.config['LOCAL_ACCESS_SECRET'],
-            'aws_region':app.config['AWS_REGION'],
-            's3_url':app.config['LOCAL_S3_URL'],
-            'local':True,
-            's3_bucket':app.config['LOCAL_BUCKET'] 
-        }
-    else:
-        app.config['AWS_CONFIG'] = {
-            'aws_access_key_id':app.config['AWS_ACCESS_KEY_ID'],
-            'aws_access_secret':app.config['AWS_ACCESS_SECRET'],
-            'aws_region':app.config['AWS_REGION'],
-            'local':False,
-            's3_bucket':app.config['S3_BUCKET'] 
-    }
+    app.config['AWS_CONFIG'] = build_aws_config(app.config, use_local_s3=app.config['USE_LOCAL_S3'] == True)
 
 
     return app
@@ -130,7 +116,7 @@ def check_datastore():
     """
     A function to return a small piece of JSON to indicate whether or not the connection to AWS is working
     """
-    scratch_json, success, errors = providers.s3Provider(app.config['AWS_CONFIG']).get('scratch/hello.json')
+    scratch_json, success, errors = storageProvider(app.config['AWS_CONFIG']).get('scratch/hello.json')
     if not success:
         scratch_json = {'error':'unable to connect'}
     scratch_json['cached'] = datetime.datetime.now()
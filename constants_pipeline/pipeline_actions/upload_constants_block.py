@@ -1,4 +1,5 @@
-from common.providers import filesystemProvider, s3Provider, awsKeyProvider
+from common.providers import filesystemProvider, awsKeyProvider
+from storage import storageProvider
 
 from .constants import CONSTANTS_FILES
 
@@ -13,7 +14,7 @@ constants_files = ['amino_acids','chains','class_i_starts','hetatoms','loci','pe
 
 # TODO error handling and comparison
 def upload_constants(aws_config):
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     constants = {}
     for slug in CONSTANTS_FILES:
         constants[slug] = CONSTANTS_FILES[slug]
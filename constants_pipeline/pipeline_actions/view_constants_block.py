@@ -1,11 +1,12 @@
-from common.providers import s3Provider, awsKeyProvider
+from common.providers import awsKeyProvider
+from storage import storageProvider
 
 from .constants import CONSTANTS_FILES, constants_details
 
 import logging
 
 def view_constants(aws_config):
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     constants = []
     for slug in CONSTANTS_FILES:
         key = awsKeyProvider().constants_key(slug)
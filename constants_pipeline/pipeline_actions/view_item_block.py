@@ -1,4 +1,5 @@
-from common.providers import s3Provider, awsKeyProvider
+from common.providers import awsKeyProvider
+from storage import storageProvider
 
 
 from .constants import CONSTANTS_FILES, constants_details
@@ -8,7 +9,7 @@ import logging
 
 
 def view_item(aws_config, slug):
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     constants = []
     key = awsKeyProvider().constants_key(slug)
     data, success, errors = s3.get(key)       
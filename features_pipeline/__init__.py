@@ -1,8 +1,8 @@
 from flask import Blueprint, current_app, request
 
 from common.decorators import templated, requires_privilege, check_user
-from common.providers import s3Provider, awsKeyProvider
-from common.helpers import fetch_core
+from common.providers import awsKeyProvider
+from storage import storageProvider, fetch_core
 
 
 import logging
@@ -25,7 +25,7 @@ def features_home_handler(userobj):
 @requires_privilege('users')
 @templated('features/view')
 def features_view_handler(userobj, pdb_code):
-    s3 = s3Provider(current_app.config['AWS_CONFIG'])
+    s3 = storageProvider(current_app.config['AWS_CONFIG'])
     core, success, errors = fetch_core(pdb_code, current_app.config['AWS_CONFIG'])
     if success:
         block_key = awsKeyProvider().block_key(pdb_code, 'features', 'structures')
@@ -42,7 +42,7 @@ def features_view_handler(userobj, pdb_code):
 @requires_privilege('users')
 #@templated('features/add')
 def features_add_handler(userobj, pdb_code):
-    s3 = s3Provider(current_app.config['AWS_CONFIG'])
+    s3 = storageProvider(current_app.config['AWS_CONFIG'])
     core, success, errors = fetch_core(pdb_code, current_app.config['AWS_CONFIG'])
     if success:
         block_key = awsKeyProvider().block_key(pdb_code, 'features', 'structures')
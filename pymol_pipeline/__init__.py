@@ -1,12 +1,14 @@
 
 from flask import Blueprint, current_app, request
 
-from common.providers import httpProvider
+from common.providers import httpProvider, awsKeyProvider
 from common.decorators import templated
 from common.helpers import fetch_constants
 
 from common.models import itemSet
 
+from storage import storageProvider
+
 
 pymol_views = Blueprint('pymol_views', __name__)
 
@@ -14,10 +16,9 @@ pymol_views = Blueprint('pymol_views', __name__)
 def check_file_exists(pdb_code, assembly_id, structure_component, file_format, http):
     exists = False
     try:
-        url = f'http://127.0.0.1:8080/structures/downloads/{pdb_code}_{assembly_id}_{structure_component}.cif'
-        print (url)
-        cif_data = http.get(url, format='txt')
-        if cif_data:
+        # check the storage inventory for the file served at /structures/downloads/{pdb_code}_{assembly_id}_{structure_component}.cif rather than downloading it
+        key = awsKeyProvider().cif_file_key(f'{pdb_code}_{assembly_id}', structure_component)
+        if storageProvider(current_app.config['AWS_CONFIG']).exists(key, data_format=file_format):
                 print (f'ALL GOOD {pdb_code}')
                 exists = True
         else:
@@ -1,4 +1,5 @@
-from common.providers import httpProvider, s3Provider, awsKeyProvider
+from common.providers import httpProvider, awsKeyProvider
+from storage import storageProvider
 
 from bs4 import BeautifulSoup
 
@@ -7,7 +8,7 @@ import json
 
 
 def check_ipd_version(aws_config):
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     key = awsKeyProvider().metadata_key('sequences','ipd_versions')
     previous_version, success, errors = s3.get(key)
     url = 'https://www.ebi.ac.uk/ipd/mhc/version/'
@@ -1,5 +1,6 @@
 from common.helpers import fetch_constants
-from common.providers import s3Provider, awsKeyProvider
+from common.providers import awsKeyProvider
+from storage import storageProvider
 
 from common.helpers import fetch_constants
 
@@ -51,7 +52,7 @@ def process_class_ii_beta():
 
 
 def process_ipd_bulk_fasta(aws_config):
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     key = awsKeyProvider().metadata_key('sequences', 'species_map')
     data, success, errors = s3.get(key)
 
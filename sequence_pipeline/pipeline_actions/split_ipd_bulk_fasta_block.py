@@ -1,6 +1,7 @@
 from Bio import SeqIO
 
-from common.providers import s3Provider, httpProvider
+from common.providers import httpProvider
+from storage import storageProvider
 from common.providers.aws import awsKeyProvider
 
 def generate_fasta_file_handle():
@@ -30,7 +31,7 @@ def fetch_local_ipd_data(s3):
 
 
 def split_ipd_bulk_fasta(aws_config, remote=True):
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     loci = {}
     step_errors = []
     all_alleles = []
@@ -1,5 +1,5 @@
 from flask import Blueprint, current_app, request, redirect
-from typing import Dict
+from typing import Dict, List, Tuple
 
 from common.decorators import check_user, requires_privilege, templated
 from common.models import itemSet, Core, PeptideNeighbours, PeptideAngles, AlleleMatch
@@ -7,6 +7,8 @@ from common.models import itemSet, Core, PeptideNeighbours, PeptideAngles, Allel
 from common.forms import request_variables, validate_variables
 from common.helpers import slugify
 
+from storage import fetch_facets
+
 
 import logging
 import json
@@ -22,23 +24,28 @@ contexts = ["complex_type", "similarity", "differences", "publication", "feature
 views = {
     'view':{
         'facet':Core,
-        'facet_display':'info'
+        'facet_display':'info',
+        'facets':['core']
     },
     'peptide_neighbours':{
         'facet':PeptideNeighbours,
-        'facet_display':'peptide_neighbours'
+        'facet_display':'peptide_neighbours',
+        'facets':['core', 'peptide_neighbours']
     },
     'peptide_angles':{
         'facet':PeptideAngles,
-        'facet_display':'peptide_angles'
+        'facet_display':'peptide_angles',
+        'facets':['core', 'peptide_angles']
     },
     'allele_match':{
         'facet':AlleleMatch,
-        'facet_display':'allele_match'
+        'facet_display':'allele_match',
+        'facets':['core', 'allele_match']
     },
     'record':{
         'facet':Core,
-        'facet_display':'record'
+        'facet_display':'record',
+        'facets':['core']
     }
 }
 
@@ -121,6 +128,36 @@ def sets_create_action_handler(userobj:Dict) -> Dict:
         return {'userobj': userobj, 'variables':variables, 'validated': validated, 'errors':errors, 'success':success, 'itemset':itemset, 'contexts':contexts}
 
 
+def hydrate_from_bundles(itemset:Dict, facets:List, aws_config:Dict) -> Tuple[Dict, bool, List]:
+    """
+    This function hydrates the members of a set from the facet bundle of each structure, reading the facets needed for a view of the set in one request per structure
+
+    Args:
+        itemset (Dict): the set, with the pdb codes of the members in 'members'
+        facets (List): the facets needed for the view e.g. ['core', 'peptide_neighbours']
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the set, with each member replaced by its core block and the other facets keyed by facet name
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    members = []
+    errors = []
+    for pdb_code in itemset['members']:
+        blocks, success, facet_errors = fetch_facets(pdb_code, facets, aws_config)
+        member = blocks.get('core') or {}
+        member['pdb_code'] = pdb_code
+        for facet in facets:
+            if facet != 'core':
+                member[facet] = blocks[facet]
+        if blocks.get('core') is None:
+            errors.append(f'{pdb_code}__no_core')
+        members.append(member)
+    itemset['members'] = members
+    return itemset, True, errors
+
+
 #TODO there must be a cleaner way to do this
 def get_additional_sets(list_string):
     to_replace = ['[',']']
@@ -184,7 +221,10 @@ def set_view(userobj:Dict, view, set_context:str, set_slug:str) -> Dict:
         itemset = itemSet(set_slug, set_context).get(page_number=page_number, page_size=page_size)
     if view in views:
         if itemset is not None:
-            itemset, success, errors = views[view]['facet']().hydrate(itemset)
+            if current_app.config['AWS_CONFIG'].get('facet_bundles'):
+                itemset, success, errors = hydrate_from_bundles(itemset, views[view]['facets'], current_app.config['AWS_CONFIG'])
+            else:
+                itemset, success, errors = views[view]['facet']().hydrate(itemset)
         return {'userobj': userobj, 'itemset':itemset, 'facet_display':views[view]['facet_display'], 'operator':operator, 'filtered':filtered, 'intersection':variables['intersection']}
 
 
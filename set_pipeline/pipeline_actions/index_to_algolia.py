@@ -1,15 +1,16 @@
 from typing import Dict, List, Tuple
-from flask import current_app
 
 import json
 import time
     
 
-from common.providers import s3Provider, awsKeyProvider, algoliaProvider
-from common.helpers import update_block, fetch_core
+from common.providers import awsKeyProvider, algoliaProvider
+from storage import storageProvider
 
 from common.models import itemSet
 
+from settings import get_setting
+
 
 def index_to_algolia(set_context:str, set_slug:str, aws_config:Dict, force:bool=False) -> Dict:
     """
@@ -24,7 +25,7 @@ def index_to_algolia(set_context:str, set_slug:str, aws_config:Dict, force:bool=
     step_errors = []
     
     set_key = ''
-    algolia = algoliaProvider(current_app.config['ALGOLIA_APPLICATION_ID'], current_app.config['ALGOLIA_KEY'])
+    algolia = algoliaProvider(get_setting('ALGOLIA_APPLICATION_ID'), get_setting('ALGOLIA_KEY'))
     itemset = {}
     data, success, errors = algolia.index_item(set_key, 'sets', itemset)
     time.sleep(5)
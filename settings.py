@@ -0,0 +1,121 @@
+from typing import Dict, Optional
+from flask import Flask, current_app, has_app_context
+
+import os
+import toml
+
+
+settings_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.toml')
+
+_settings = {}
+
+
+def load_settings(filename:str=settings_file) -> Dict:
+    """
+    This function loads the application settings from the config.toml file, without needing a Flask app
+
+    Args:
+        filename (str): the path to the settings file
+
+    Returns:
+        Dict: the settings in the file
+    """
+    if filename not in _settings:
+        _settings[filename] = toml.load(filename)
+    return _settings[filename]
+
+
+def storage_settings(settings:Dict) -> Dict:
+    """
+    This function returns the storage settings in the AWS configuration, which are the same for AWS and for the local (MinIO) S3
+    """
+    return {
+        'block_cache_ttl':settings.get('BLOCK_CACHE_TTL', 0),
+        'journal_dir':settings.get('JOURNAL_DIR'),
+        'storage_backend':settings.get('STORAGE_BACKEND', 's3'),
+        'local_storage_path':settings.get('LOCAL_STORAGE_PATH'),
+        'compression':settings.get('COMPRESSION'),
+        'compression_minimum_size':settings.get('COMPRESSION_MINIMUM_SIZE', 4096),
+        'compression_prefixes':settings.get('COMPRESSION_PREFIXES', []),
+        'facet_bundles':settings.get('FACET_BUNDLES', False),
+        'storage_pool':settings.get('STORAGE_POOL', True),
+        'max_connections':settings.get('STORAGE_MAX_CONNECTIONS', 10),
+        'content_addressed':settings.get('CONTENT_ADDRESSED', False),
+        'conditional_puts':settings.get('CONDITIONAL_PUTS', False),
+        'structure_cache_size':settings.get('STRUCTURE_CACHE_SIZE', 256),
+        'atom_tables':settings.get('ATOM_TABLES', False),
+        'inventory_max_age':settings.get('INVENTORY_MAX_AGE', 600)
+    }
+
+
+def build_aws_config(settings:Dict, use_local_s3:bool=False) -> Dict:
+    """
+    This function builds the AWS configuration dictionary which is passed to every pipeline action
+
+    Args:
+        settings (Dict): the application settings, either a Flask app config or the output of load_settings
+        use_local_s3 (bool): whether to use the local (MinIO) S3 settings rather than AWS
+
+    Returns:
+        Dict: the AWS configuration for the environment
+    """
+    if use_local_s3:
+        aws_config = {
+            'aws_access_key_id':settings['LOCAL_ACCESS_KEY_ID'],
+            'aws_access_secret':settings['LOCAL_ACCESS_SECRET'],
+            'aws_region':settings['AWS_REGION'],
+            's3_url':settings['LOCAL_S3_URL'],
+            'local':True,
+            's3_bucket':settings['LOCAL_BUCKET']
+        }
+    else:
+        aws_config = {
+            'aws_access_key_id':settings['AWS_ACCESS_KEY_ID'],
+            'aws_access_secret':settings['AWS_ACCESS_SECRET'],
+            'aws_region':settings['AWS_REGION'],
+            'local':False,
+            's3_bucket':settings['S3_BUCKET']
+        }
+    aws_config.update(storage_settings(settings))
+    return aws_config
+
+
+def get_setting(key:str, default:Optional[str]=None):
+    """
+    This function returns a setting from the Flask app config if there is an app context, or from the config.toml file if not
+
+    This lets pipeline actions which need secrets (e.g. the Algolia keys) run from the command line as well as from the web app
+
+    Args:
+        key (str): the name of the setting e.g. 'ALGOLIA_KEY'
+        default: the value to return if the setting is missing
+
+    Returns:
+        the value of the setting
+    """
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return load_settings().get(key, default)
+
+
+def create_pipeline_app(filename:str=settings_file, use_local_s3:Optional[bool]=None) -> Flask:
+    """
+    This function creates a minimal Flask app for running the pipeline outside of a web request, e.g. from the command line
+
+    It has no Blueprints or authentication, only the settings and AWS configuration, so that shared models which read the app config still work
+
+    Args:
+        filename (str): the path to the settings file
+        use_local_s3 (bool): whether to use the local (MinIO) S3 settings, defaults to the USE_LOCAL_S3 setting
+
+    Returns:
+        Flask: a configured instance of a Flask app
+    """
+    settings = load_settings(filename)
+    if use_local_s3 is None:
+        use_local_s3 = settings.get('USE_LOCAL_S3', False)
+    app = Flask(__name__)
+    app.config.update(settings)
+    app.config['USE_LOCAL_S3'] = use_local_s3
+    app.config['AWS_CONFIG'] = build_aws_config(settings, use_local_s3=use_local_s3)
+    return app
@@ -0,0 +1,19 @@
+"""
+The storage layer for the pipeline, a set of providers with the same get/put contract as s3Provider (a key and data format in, a (data, success, errors) tuple out), each adding one thing
+
+storageProvider is the one the steps and views use, reading and writing through the active run context (runContext) and the process wide block cache. Below it, storage_backend returns the backend shared by the process for a configuration: a localProvider (a directory tree on the local filesystem) or an s3ClientProvider (a boto3 client, which also reads and writes bytes), in a pooledProvider which limits the requests in flight, and in a compressedProvider when compression is configured.
+"""
+
+from .context import runContext, active_context, deep_merge
+from .providers import storageProvider
+from .backends import localProvider, s3ClientProvider, pooledProvider, storage_backend, backend_stats, reset_backends, migrate_keys
+from .compression import compressedProvider, compression_report, reset_compression_stats
+from .cache import process_cache, configure_process_cache
+from .structures import process_structures, configure_structure_cache
+from .journal import replay_journal
+from .bundles import read_bundle, write_bundle_facets
+from .inventory import build_inventory, save_inventory, structure_inventory
+from .hashes import payload_hash, write_stats
+from .content import content_hash, save_derived_file, save_derived_files, recorded_file
+from .helpers import fetch_constants, fetch_core, fetch_facet, fetch_facets, update_block, load_cif, load_pdb, save_cif
+from .atoms import atom_table, atom_table_key, load_atom_table, save_atom_table, store_atom_table, residue_rows, parse_atom_site, atom_index
@@ -0,0 +1,299 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .providers import storageProvider
+
+from io import BytesIO
+
+import logging
+import numpy as np
+import re
+
+
+# one row per atom of the first model, in the order of the structure file
+atom_dtype = np.dtype([
+    ('chain_id', 'U4'),
+    ('residue_index', 'i4'),
+    ('residue_number', 'i4'),
+    ('insertion_code', 'U1'),
+    ('residue_name', 'U5'),
+    ('hetero', '?'),
+    ('atom_name', 'U4'),
+    ('element', 'U2'),
+    ('b_factor', 'f4'),
+    ('coord', 'f4', (3,))
+])
+
+
+def atom_table_key(file_key:str) -> str:
+    """
+    This function returns the key of the atom table for a structure file, stored next to it e.g. 'structures/files/aligned/1hhk_1.cif' -> 'structures/files/aligned/1hhk_1.atoms.npz'
+    """
+    if file_key.endswith('.cif'):
+        file_key = file_key[:-4]
+    return f'{file_key}.atoms.npz'
+
+
+def atom_table(structure, decimals:Optional[int]=None) -> np.ndarray:
+    """
+    This function builds the atom table for the first model of a parsed structure
+
+    Args:
+        structure (Bio.PDB.Structure): the parsed structure
+        decimals (int): the number of decimal places to round the coordinates to, so that the table of a structure which is about to be written matches the file e.g. 3 for MMCIFIO
+
+    Returns:
+        np.ndarray: a structured array of the atoms, see atom_dtype
+    """
+    rows = []
+    residue_index = 0
+    for chain in structure[0]:
+        for residue in chain:
+            hetfield, residue_number, insertion_code = residue.get_id()
+            for atom in residue:
+                coord = atom.get_coord()
+                if decimals is not None:
+                    coord = [float(f'{value:.{decimals}f}') for value in coord]
+                rows.append((chain.get_id(), residue_index, residue_number, insertion_code.strip(), residue.resname, hetfield != ' ', atom.get_name(), atom.element, atom.get_bfactor(), coord))
+            residue_index += 1
+    return np.array(rows, dtype=atom_dtype)
+
+
+def store_atom_table(file_key:str, table:np.ndarray, aws_config:Dict) -> bool:
+    """
+    This function stores the atom table for a structure file, next to the file
+
+    Args:
+        file_key (str): the key of the structure file
+        table (np.ndarray): the atom table of the structure, see atom_dtype
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        bool: whether the table was stored
+    """
+    buffer = BytesIO()
+    np.savez_compressed(buffer, atoms=table)
+    payload, success, errors = storageProvider(aws_config).put(atom_table_key(file_key), buffer.getvalue(), data_format='binary')
+    if not success:
+        logging.warn(f'UNABLE TO SAVE ATOM TABLE FOR {file_key}')
+    return success
+
+
+def save_atom_table(file_key:str, structure, aws_config:Dict, decimals:Optional[int]=None) -> bool:
+    """
+    This function builds and stores the atom table for a structure file
+
+    Args:
+        file_key (str): the key of the structure file
+        structure (Bio.PDB.Structure): the parsed structure
+        aws_config (Dict): the configuration details for AWS for the current app
+        decimals (int): the number of decimal places to round the coordinates to, see atom_table
+
+    Returns:
+        bool: whether the table was stored
+    """
+    return store_atom_table(file_key, atom_table(structure, decimals=decimals), aws_config)
+
+
+def load_atom_table(file_key:str, aws_config:Dict) -> Optional[np.ndarray]:
+    """
+    This function loads the atom table for a structure file, or builds it from the _atom_site loop of the file (see parse_atom_site) if the file doesn't have one
+
+    A table built here isn't stored, the tables are written by the steps which write the files (fetch_structure and align) so that reading one never writes.
+
+    Args:
+        file_key (str): the key of the structure file e.g. the 'file_key' of an aligned assembly
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        np.ndarray: a structured array of the atoms (see atom_dtype), or None if the structure can't be loaded
+    """
+    data, success, errors = storageProvider(aws_config).get(atom_table_key(file_key), data_format='binary')
+    if success and data:
+        if not isinstance(data, (bytes, bytearray)):
+            logging.warn(f'ATOM TABLE FOR {file_key} WAS NOT RETURNED AS BYTES')
+        else:
+            try:
+                with np.load(BytesIO(data), allow_pickle=False) as stored:
+                    return stored['atoms']
+            except Exception as e:
+                logging.warn(f'UNABLE TO READ ATOM TABLE FOR {file_key}')
+                logging.warn(e)
+    data, success, errors = storageProvider(aws_config).get(file_key, data_format='cif')
+    if not success or not data:
+        logging.warn(f'UNABLE TO LOAD {file_key}')
+        return None
+    return parse_atom_site(data)
+
+
+def residue_rows(table:np.ndarray) -> Dict:
+    """
+    This function returns the rows of the atom table for each residue, keyed by residue index, in the order of the table
+    """
+    indexes, starts = np.unique(table['residue_index'], return_index=True)
+    order = np.argsort(starts)
+    ends = np.append(starts[order][1:], len(table))
+    return {int(indexes[i]):np.arange(starts[i], end) for i, end in zip(order, ends)}
+
+
+# the _atom_site columns read, and the columns used instead if a file doesn't have them, as MMCIFParser does
+atom_site_columns = {
+    'group_PDB':None,
+    'type_symbol':None,
+    'label_atom_id':None,
+    'label_alt_id':None,
+    'label_comp_id':None,
+    'auth_asym_id':'label_asym_id',
+    'auth_seq_id':'label_seq_id',
+    'pdbx_PDB_ins_code':None,
+    'Cartn_x':None,
+    'Cartn_y':None,
+    'Cartn_z':None,
+    'occupancy':None,
+    'B_iso_or_equiv':None,
+    'pdbx_PDB_model_num':None
+}
+
+cif_token_pattern = re.compile(r"""'(.*?)'(?=\s|$)|"(.*?)"(?=\s|$)|(\S+)""")
+
+loop_ends = ('#', 'loop_', '_', 'data_')
+
+
+def cif_tokens(line:str) -> List:
+    """
+    This function splits a line of an mmCIF loop into its values, removing the quotes around quoted values e.g. "O5'"
+    """
+    if "'" not in line and '"' not in line:
+        return line.split()
+    return [next(group for group in match.groups() if group is not None) for match in cif_token_pattern.finditer(line)]
+
+
+def atom_site_rows(lines) -> Tuple[List, Iterator[List]]:
+    """
+    This function reads the _atom_site loop of an mmCIF file line by line, skipping the other categories rather than parsing them
+
+    Args:
+        lines: the lines of the file e.g. an open file or a list of lines
+
+    Returns:
+        List: the names of the columns in the loop
+        Iterator: the values in each row of the loop
+    """
+    lines = iter(lines)
+    columns = []
+    line = None
+    for line in lines:
+        if line.startswith('_atom_site.'):
+            columns.append(line.split()[0][len('_atom_site.'):])
+        elif columns:
+            break
+    else:
+        line = None
+
+    def rows(line):
+        values = []
+        while line is not None:
+            stripped = line.strip()
+            if stripped.startswith(loop_ends):
+                return
+            if stripped:
+                tokens = cif_tokens(stripped)
+                if not values and len(tokens) == len(columns):
+                    yield tokens
+                else:
+                    values += tokens
+                    while len(values) >= len(columns):
+                        yield values[:len(columns)]
+                        values = values[len(columns):]
+            line = next(lines, None)
+
+    return columns, rows(line if columns else None)
+
+
+def parse_atom_site(cif_data, alt_loc:Optional[str]=None) -> np.ndarray:
+    """
+    This function builds the atom table for the first model of an mmCIF file straight from its _atom_site loop, without building a Bio.PDB structure
+
+    The table is the same as the one built from the structure parsed by MMCIFParser (see atom_table). Chains are taken from auth_asym_id and residue numbers from auth_seq_id, the atoms of a chain which is split in the file (e.g. its waters) are kept together, and atoms from HETATM records are flagged as hetero.
+
+    Args:
+        cif_data: the mmCIF file, as a string or an iterable of lines
+        alt_loc (str): the alternate location to select e.g. 'A', otherwise (or where an atom doesn't have it) the location with the highest occupancy is selected, as MMCIFParser does
+
+    Returns:
+        np.ndarray: a structured array of the atoms, see atom_dtype
+    """
+    if isinstance(cif_data, bytes):
+        cif_data = cif_data.decode('utf-8')
+    if isinstance(cif_data, str):
+        cif_data = cif_data.splitlines()
+    columns, rows = atom_site_rows(cif_data)
+    # columns which the file doesn't have point past the end of each row, at a '.' (no value)
+    positions = {}
+    for column, fallback in atom_site_columns.items():
+        if column in columns:
+            positions[column] = columns.index(column)
+        elif fallback is not None and fallback in columns:
+            positions[column] = columns.index(fallback)
+        else:
+            positions[column] = len(columns)
+    missing = [column for column in ['label_atom_id', 'label_comp_id', 'auth_asym_id', 'auth_seq_id', 'Cartn_x', 'Cartn_y', 'Cartn_z'] if positions[column] == len(columns)]
+    if len(columns) > 0 and missing:
+        raise ValueError(f'_atom_site is missing {", ".join(missing)}')
+    no_value = ('.', '?')
+    group, element, atom_id, alt_id, residue_id, chain, sequence, insertion, x, y, z, occupancy_id, b_factor_id, model_id = [positions[column] for column in atom_site_columns]
+
+    atoms = []
+    selected = {}
+    chain_order = {}
+    first_model = None
+    for row in rows:
+        row.append('.')
+        if first_model is None:
+            first_model = row[model_id]
+        elif row[model_id] != first_model:
+            break
+        chain_id = row[chain]
+        hetero = row[group] == 'HETATM'
+        residue_number = int(row[sequence])
+        insertion_code = row[insertion] if row[insertion] not in no_value else ''
+        atom_name = row[atom_id]
+        occupancy = float(row[occupancy_id]) if row[occupancy_id] not in no_value else 1.0
+        atom_key = (chain_id, hetero, residue_number, insertion_code, atom_name)
+        atom = (chain_id, (chain_id, hetero, residue_number, insertion_code), residue_number, insertion_code, row[residue_id], hetero, atom_name, row[element].upper() if row[element] not in no_value else '', float(row[b_factor_id]) if row[b_factor_id] not in no_value else 0.0, (float(row[x]), float(row[y]), float(row[z])))
+        rank = (alt_loc is not None and row[alt_id] == alt_loc, occupancy)
+        if chain_id not in chain_order:
+            chain_order[chain_id] = len(chain_order)
+        if atom_key not in selected:
+            selected[atom_key] = (len(atoms), rank)
+            atoms.append(atom)
+        elif rank > selected[atom_key][1]:
+            selected[atom_key] = (selected[atom_key][0], rank)
+            atoms[selected[atom_key][0]] = atom
+    # keep the atoms of each chain together, in the order the chains first appear
+    atoms.sort(key=lambda atom: chain_order[atom[0]])
+    residue_indexes = {}
+    return np.array([(atom[0], residue_indexes.setdefault(atom[1], len(residue_indexes))) + atom[2:] for atom in atoms], dtype=atom_dtype)
+
+
+def atom_index(table:np.ndarray) -> Dict:
+    """
+    This function returns the arrays indexing the chains and residues of an atom table
+
+    Args:
+        table (np.ndarray): the atom table of a structure
+
+    Returns:
+        Dict: the 'chain_ids' in order, the 'chain_index' of each atom, and the first row ('residue_starts') and 'residue_chain' index of each residue
+    """
+    chain_ids, chain_starts, chain_index = np.unique(table['chain_id'], return_index=True, return_inverse=True)
+    order = np.argsort(chain_starts)
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order))
+    residue_starts = np.nonzero(np.diff(table['residue_index'], prepend=-1) != 0)[0]
+    chain_index = rank[chain_index].astype(np.int32)
+    return {
+        'chain_ids':chain_ids[order],
+        'chain_index':chain_index,
+        'residue_starts':residue_starts,
+        'residue_chain':chain_index[residue_starts]
+    }
@@ -0,0 +1,432 @@
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .compression import compressedProvider, codecs, detect_codec, to_bytes
+
+import boto3
+import botocore.config
+import botocore.exceptions
+import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+
+# the suffix of the temporary files written before they replace a file, which aren't listed
+temporary_suffix = '.partial'
+
+text_formats = ['cif', 'txt', 'fasta']
+
+# the same as the default connection pool size of a boto3 client
+default_max_connections = 10
+
+_backends = {}
+_backends_lock = threading.Lock()
+_backend_stats = {'created':0, 'reused':0, 'setup_time':0.0}
+
+
+class localProvider():
+    """
+    A storage backend which keeps the blocks and files in a directory tree on the local filesystem laid out by their keys (see awsKeyProvider)
+
+    It is selected with 'storage_backend':'local' in the AWS configuration, and stores the blocks and files in a directory for the bucket under the 'local_storage_path', so that bulk reprocessing can run on a single machine without S3 (or MinIO).
+    """
+    def __init__(self, aws_config:Dict):
+        self.root = os.path.abspath(os.path.join(aws_config['local_storage_path'], aws_config.get('s3_bucket') or 'default'))
+
+
+    def path(self, key:str) -> str:
+        """
+        This function returns the path of the file for a key, refusing keys which would resolve outside the storage directory or look like temporary files
+        """
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep) or key.endswith(temporary_suffix):
+            raise ValueError(f'invalid key {key}')
+        return path
+
+
+    def get(self, key:str, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        """
+        This function reads a block or file
+
+        Args:
+            key (str): the key of the block or file
+            data_format (str): the format of the data e.g. 'json', 'cif', 'txt', 'fasta'
+
+        Returns:
+            the data, a success boolean and any errors
+        """
+        try:
+            path = self.path(key)
+            if not os.path.exists(path):
+                return None, False, ['file_not_found']
+            with open(path, 'rb') as local_file:
+                raw = local_file.read()
+            if data_format == 'json':
+                return json.loads(raw), True, None
+            elif data_format in text_formats:
+                return raw.decode('utf-8'), True, None
+            return raw, True, None
+        except Exception as e:
+            logging.warn(f'UNABLE TO READ {key}')
+            logging.warn(e)
+            return None, False, [f'unable_to_read__{type(e).__name__.lower()}']
+
+
+    def put(self, key:str, data, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        """
+        This function writes a block or file, replacing the file in one step so that a reader never sees a partly written file
+
+        Args:
+            key (str): the key of the block or file
+            data: the data to write
+            data_format (str): the format of the data e.g. 'json', 'cif', 'txt', 'fasta'
+
+        Returns:
+            the serialised data, a success boolean and any errors
+        """
+        try:
+            path = self.path(key)
+            if data_format == 'json':
+                payload = json.dumps(data)
+            else:
+                payload = data
+            raw = payload.encode('utf-8') if isinstance(payload, str) else payload
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix=temporary_suffix)
+            try:
+                with os.fdopen(file_descriptor, 'wb') as local_file:
+                    local_file.write(raw)
+                os.replace(temporary_path, path)
+            except Exception:
+                os.unlink(temporary_path)
+                raise
+            return payload, True, None
+        except Exception as e:
+            logging.warn(f'UNABLE TO WRITE {key}')
+            logging.warn(e)
+            return None, False, [f'unable_to_write__{type(e).__name__.lower()}']
+
+
+    def stored_bytes(self, key:str, data, data_format:str='json') -> bytes:
+        """
+        This function returns the bytes which a put of the data to a key would store
+        """
+        return to_bytes(data, data_format)
+
+
+    def head(self, key:str) -> Optional[str]:
+        """
+        This function returns the MD5 hash of the file stored for a key, the same hash S3 gives as the ETag of an object uploaded in one part, or None if there isn't one
+        """
+        try:
+            with open(self.path(key), 'rb') as local_file:
+                return hashlib.md5(local_file.read()).hexdigest()
+        except (OSError, ValueError):
+            return None
+
+
+    def list_keys(self, prefix:str='') -> Iterator[Tuple[str, int, str, Optional[str]]]:
+        """
+        This function lists the files stored, with their sizes, when they were last modified and the MD5 hash of their content
+        """
+        for directory, directories, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if key.startswith(prefix) and not filename.endswith(temporary_suffix):
+                    stat = os.stat(path)
+                    with open(path, 'rb') as local_file:
+                        digest = hashlib.md5(local_file.read()).hexdigest()
+                    yield key, stat.st_size, datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(), digest
+
+
+class s3ClientProvider():
+    """
+    A storage backend built on a boto3 client whose connection pool is the size of the 'max_connections' in the AWS configuration (see s3_client)
+
+    Unlike s3Provider, it reads and writes the 'binary' data format (e.g. compressed data and atom tables) as bytes, without decoding them.
+    """
+    def __init__(self, aws_config:Dict):
+        self.client = s3_client(aws_config)
+        self.bucket = aws_config['s3_bucket']
+
+
+    def get(self, key:str, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        """
+        This function reads a block or file
+
+        Args:
+            key (str): the key of the block or file
+            data_format (str): the format of the data e.g. 'json', 'cif', 'txt', 'fasta', 'binary'
+
+        Returns:
+            the data, a success boolean and any errors
+        """
+        try:
+            raw = self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+            if data_format == 'json':
+                return json.loads(raw), True, None
+            elif data_format in text_formats:
+                return raw.decode('utf-8'), True, None
+            return raw, True, None
+        except botocore.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ['NoSuchKey', '404']:
+                return None, False, ['file_not_found']
+            logging.warn(f'UNABLE TO READ {key}')
+            logging.warn(e)
+            return None, False, ['unable_to_read__clienterror']
+        except Exception as e:
+            logging.warn(f'UNABLE TO READ {key}')
+            logging.warn(e)
+            return None, False, [f'unable_to_read__{type(e).__name__.lower()}']
+
+
+    def put(self, key:str, data, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        """
+        This function writes a block or file
+
+        Args:
+            key (str): the key of the block or file
+            data: the data to write
+            data_format (str): the format of the data e.g. 'json', 'cif', 'txt', 'fasta', 'binary'
+
+        Returns:
+            the serialised data, a success boolean and any errors
+        """
+        try:
+            if data_format == 'json':
+                payload = json.dumps(data)
+            else:
+                payload = data
+            raw = payload.encode('utf-8') if isinstance(payload, str) else payload
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=raw)
+            return payload, True, None
+        except Exception as e:
+            logging.warn(f'UNABLE TO WRITE {key}')
+            logging.warn(e)
+            return None, False, [f'unable_to_write__{type(e).__name__.lower()}']
+
+
+    def stored_bytes(self, key:str, data, data_format:str='json') -> bytes:
+        """
+        This function returns the bytes which a put of the data to a key would store
+        """
+        return to_bytes(data, data_format)
+
+
+    def head(self, key:str) -> Optional[str]:
+        """
+        This function returns the ETag of the object stored for a key, which is the MD5 hash of its content, or None if there isn't one or it was uploaded in parts (when the ETag isn't its MD5 hash)
+        """
+        try:
+            etag = self.client.head_object(Bucket=self.bucket, Key=key).get('ETag', '').strip('"')
+        except botocore.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ['NoSuchKey', '404']:
+                logging.warn(f'UNABLE TO HEAD {key}')
+                logging.warn(e)
+            return None
+        except Exception as e:
+            logging.warn(f'UNABLE TO HEAD {key}')
+            logging.warn(e)
+            return None
+        return etag if etag and '-' not in etag else None
+
+
+class pooledProvider():
+    """
+    A wrapper around a storage backend provider which is shared by all of the threads in a process and limits the requests in flight to the size of its connection pool
+    """
+    def __init__(self, provider, max_connections:int=default_max_connections):
+        self.provider = provider
+        self.max_connections = max_connections
+        self.slots = threading.BoundedSemaphore(max_connections)
+
+
+    def get(self, key:str, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        with self.slots:
+            return self.provider.get(key, data_format=data_format)
+
+
+    def put(self, key:str, data, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        with self.slots:
+            return self.provider.put(key, data, data_format=data_format)
+
+
+    def stored_bytes(self, key:str, data, data_format:str='json') -> bytes:
+        return self.provider.stored_bytes(key, data, data_format=data_format)
+
+
+    def head(self, key:str) -> Optional[str]:
+        with self.slots:
+            return self.provider.head(key)
+
+
+def s3_client(aws_config:Dict):
+    """
+    This function creates a boto3 S3 client for the bucket in the AWS configuration, with a connection pool of 'max_connections'
+    """
+    return boto3.client(
+        's3',
+        aws_access_key_id=aws_config['aws_access_key_id'],
+        aws_secret_access_key=aws_config['aws_access_secret'],
+        region_name=aws_config['aws_region'],
+        endpoint_url=aws_config.get('s3_url'),
+        config=botocore.config.Config(max_pool_connections=aws_config.get('max_connections') or default_max_connections)
+    )
+
+
+def list_keys(aws_config:Dict, prefix:str='', page_size:int=1000) -> Iterator[Tuple[str, int, str, Optional[str]]]:
+    """
+    This function lists the objects stored in the storage backend, page by page
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+        prefix (str): only list the keys starting with this prefix
+        page_size (int): the number of keys to list per request to S3
+
+    Returns:
+        Iterator: the key, size in bytes, last modified time and MD5 hash (the ETag, unless the object was uploaded in parts) of each object
+    """
+    if aws_config.get('storage_backend') == 'local':
+        yield from localProvider(aws_config).list_keys(prefix=prefix)
+        return
+    paginator = s3_client(aws_config).get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=aws_config['s3_bucket'], Prefix=prefix, PaginationConfig={'PageSize':page_size}):
+        for item in page.get('Contents', []):
+            etag = item.get('ETag', '').strip('"')
+            yield item['Key'], item['Size'], item['LastModified'].isoformat(), etag if etag and '-' not in etag else None
+
+
+def backend_key(aws_config:Dict) -> Tuple:
+    """
+    This function returns a hashable key for an AWS configuration, so that configurations with the same settings share a backend
+    """
+    return tuple(sorted((setting, repr(value)) for setting, value in aws_config.items()))
+
+
+def build_backend(aws_config:Dict):
+    """
+    This function creates the provider for the storage backend in the AWS configuration, either S3 (the default, including MinIO) or the local filesystem, compressing and decompressing the data if there is a 'compression' table in the configuration
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        a provider with get/put methods e.g. s3ClientProvider or localProvider, in a pooledProvider and wrapped in a compressedProvider if compression is configured
+    """
+    if aws_config.get('storage_backend') == 'local':
+        provider = localProvider(aws_config)
+    else:
+        provider = s3ClientProvider(aws_config)
+    provider = pooledProvider(provider, aws_config.get('max_connections') or default_max_connections)
+    if aws_config.get('compression') is not None:
+        provider = compressedProvider(provider, aws_config)
+    return provider
+
+
+def storage_backend(aws_config:Dict):
+    """
+    This function returns the provider for the storage backend in the AWS configuration, creating it the first time it is needed in the process and then reusing it, along with its client and connections, for every read and write
+
+    Setting 'storage_pool' to False in the AWS configuration creates a new provider (and client) each time, as s3Provider is used elsewhere.
+
+    The providers aren't shared with processes forked from this one (e.g. a process pool), as a boto3 client and its connections can't be used safely across a fork, so each forked process creates its own the first time it needs one.
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        a provider with get/put methods, see build_backend
+    """
+    if aws_config.get('storage_pool') is False:
+        start = time.perf_counter()
+        provider = build_backend(aws_config)
+        with _backends_lock:
+            _backend_stats['created'] += 1
+            _backend_stats['setup_time'] += time.perf_counter() - start
+        return provider
+    key = backend_key(aws_config)
+    with _backends_lock:
+        if key in _backends:
+            _backend_stats['reused'] += 1
+        else:
+            start = time.perf_counter()
+            _backends[key] = build_backend(aws_config)
+            _backend_stats['created'] += 1
+            _backend_stats['setup_time'] += time.perf_counter() - start
+        return _backends[key]
+
+
+def forget_backends():
+    """
+    This function drops the storage backend providers inherited by a forked process, and the lock guarding them in case it was held during the fork
+    """
+    global _backends_lock
+    _backends_lock = threading.Lock()
+    _backends.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=forget_backends)
+
+
+def backend_stats() -> Dict:
+    """
+    This function returns the number of storage backend providers created and reused in this process, and the time spent creating them
+    """
+    with _backends_lock:
+        return {'created':_backend_stats['created'], 'reused':_backend_stats['reused'], 'setup_time':round(_backend_stats['setup_time'], 3)}
+
+
+def reset_backends():
+    """
+    This function drops the storage backend providers created in this process, e.g. after the configuration has changed
+    """
+    with _backends_lock:
+        _backends.clear()
+
+
+def migrate_keys(keys:List, aws_config:Dict) -> Dict:
+    """
+    This function compresses objects which were stored before compression was turned on, using the codec configured for their data format. Objects which are read outside the storage package are left as they are (see compressible_key)
+
+    Args:
+        keys (List): a list of (key, data_format) tuples
+        aws_config (Dict): the configuration details for AWS for the current app, with a 'compression' table
+
+    Returns:
+        Dict: the keys compressed, skipped (missing, already compressed, read outside the storage package or with no codec configured) and failed, and the bytes before and after
+    """
+    provider = storage_backend(aws_config)
+    report = {'compressed':[], 'skipped':[], 'failed':[], 'raw_bytes':0, 'stored_bytes':0}
+    if not isinstance(provider, compressedProvider):
+        report['skipped'] = [key for key, data_format in keys]
+        return report
+    for key, data_format in keys:
+        codec = provider.codec(key, data_format)
+        if codec is None:
+            report['skipped'].append(key)
+            continue
+        raw, success, errors = provider.get_raw(key)
+        if not success or not raw or codec not in codecs or detect_codec(raw) is not None:
+            report['skipped'].append(key)
+            continue
+        minimum_size = provider.minimum_size if data_format == 'json' else 0
+        if len(raw) < minimum_size:
+            report['skipped'].append(key)
+            continue
+        stored = codecs[codec]['compress'](raw)
+        payload, success, errors = provider.provider.put(key, stored, data_format='binary')
+        if not success:
+            report['failed'].append(key)
+            continue
+        report['compressed'].append(key)
+        report['raw_bytes'] += len(raw)
+        report['stored_bytes'] += len(stored)
+    report['bytes_saved'] = report['raw_bytes'] - report['stored_bytes']
+    return report
+
@@ -0,0 +1,138 @@
+from typing import Dict, List, Optional, Tuple
+
+from common.providers import awsKeyProvider
+
+from .backends import storage_backend
+from .inventory import inventory_entry
+from .keys import bundle_facet, parse_block_key
+
+import datetime
+import logging
+import threading
+
+
+# blocks which aren't copied into the bundle, as they are only used by the pipeline itself
+unbundled_facets = [bundle_facet, 'fingerprints']
+
+_bundle_locks = {}
+_bundle_locks_lock = threading.Lock()
+
+
+def bundle_key(pdb_code:str) -> str:
+    """
+    This function returns the key of the facet bundle for a structure
+    """
+    return awsKeyProvider().block_key(pdb_code, bundle_facet, 'info')
+
+
+def bundle_lock(pdb_code:str) -> threading.Lock:
+    """
+    This function returns the lock for the bundle of a structure, so that threads updating the same bundle don't overwrite each other's facets
+    """
+    with _bundle_locks_lock:
+        if pdb_code not in _bundle_locks:
+            _bundle_locks[pdb_code] = threading.Lock()
+        return _bundle_locks[pdb_code]
+
+
+def read_bundle(pdb_code:str, aws_config:Dict) -> Dict:
+    """
+    This function reads the facet bundle for a structure
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the bundle, with the blocks keyed by facet in 'facets', when each was last written in 'updated' and the MD5 hash of the block it was copied from in 'md5'
+    """
+    bundle, success, errors = storage_backend(aws_config).get(bundle_key(pdb_code))
+    if not success or not bundle:
+        return {'pdb_code':pdb_code, 'facets':{}, 'updated':{}, 'md5':{}}
+    # bundles written before the hashes were recorded
+    bundle.setdefault('md5', {})
+    return bundle
+
+
+def block_digest(key:str, aws_config:Dict) -> Optional[str]:
+    """
+    This function returns the MD5 hash of the block stored at a key, from the storage inventory if it has been built and has a hash for the block, or from the ETag of the stored object (see head) otherwise
+
+    Returns:
+        str: the MD5 hash, or None if the block isn't stored (or its hash is unknown)
+    """
+    entry = inventory_entry(key, aws_config)
+    if entry is not None and entry.get('md5'):
+        return entry['md5']
+    return storage_backend(aws_config).head(key)
+
+
+def fresh_facets(bundle:Dict, digests:Dict) -> Dict:
+    """
+    This function returns the blocks in a bundle which are the same as the blocks stored, those whose recorded hash matches the hash of the block stored now
+
+    A block written by a process without bundles turned on, or a facet lost when two processes updated the bundle at once, has a different (or no) recorded hash, and is left out so that it is read from its own block.
+
+    Args:
+        bundle (Dict): the bundle, see read_bundle
+        digests (Dict): the MD5 hash of each block stored now, keyed by facet, see block_digest
+
+    Returns:
+        Dict: the blocks which can be used from the bundle, keyed by facet
+    """
+    fresh = {}
+    for facet, digest in digests.items():
+        if facet in bundle['facets'] and digest is not None and bundle['md5'].get(facet) == digest:
+            fresh[facet] = bundle['facets'][facet]
+    return fresh
+
+
+def write_bundle_facets(pdb_code:str, facets:Dict, aws_config:Dict, digests:Optional[Dict]=None) -> bool:
+    """
+    This function writes blocks into the facet bundle for a structure, leaving the other facets in it as they are
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        facets (Dict): the blocks to write, keyed by facet
+        aws_config (Dict): the configuration details for AWS for the current app
+        digests (Dict): the MD5 hash of the stored block each was copied from, keyed by facet. A block without one is never used from the bundle (see fresh_facets)
+
+    Returns:
+        bool: whether the bundle was written
+    """
+    facets = {facet:facets[facet] for facet in facets if facet not in unbundled_facets}
+    if len(facets) == 0:
+        return True
+    digests = digests or {}
+    updated = datetime.datetime.now().isoformat()
+    with bundle_lock(pdb_code):
+        bundle = read_bundle(pdb_code, aws_config)
+        for facet in facets:
+            bundle['facets'][facet] = facets[facet]
+            bundle['updated'][facet] = updated
+            bundle['md5'][facet] = digests.get(facet)
+        payload, success, errors = storage_backend(aws_config).put(bundle_key(pdb_code), bundle)
+    if not success:
+        logging.warn(f'UNABLE TO UPDATE FACET BUNDLE FOR {pdb_code}')
+    return success
+
+
+def update_bundle(aws_config:Dict, key:str, data, digest:Optional[str]=None) -> bool:
+    """
+    This function copies a block which has just been written into the facet bundle for its structure, if bundles are turned on with 'facet_bundles' in the AWS configuration
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+        key (str): the key of the block written
+        data: the block written
+        digest (str): the MD5 hash of the bytes stored for the block
+
+    Returns:
+        bool: whether the bundle was updated
+    """
+    if not aws_config.get('facet_bundles'):
+        return False
+    pdb_code, facet = parse_block_key(key)
+    if pdb_code is None or facet in unbundled_facets:
+        return False
+    return write_bundle_facets(pdb_code, {facet:data}, aws_config, digests={facet:digest})
@@ -0,0 +1,180 @@
+from typing import Dict, Hashable, Optional, Tuple
+
+from .backends import storage_backend, backend_key
+from .bundles import update_bundle
+from .inventory import record_put
+from .hashes import payload_hash, unchanged, record_write
+from .compression import serialise
+
+import copy
+import hashlib
+import json
+import threading
+import time
+
+
+class ttlCache():
+    """
+    A process wide store of JSON blocks, each kept for a limited time (the ttl, in seconds)
+
+    Blocks read and written through the storage layer are keyed by the store as well as the key of the block (see block_cache_key), so that a process using more than one store (e.g. S3 and the local filesystem, or two buckets) never serves a block from the wrong one.
+
+    It sits between the run contexts and S3, so that blocks read by one run (e.g. the core block read by each step of a set run in the web interface) can be reused by the next for a short time. Writes through the storage layer refresh the block stored for that key.
+    """
+    def __init__(self, ttl:float=0, max_entries:int=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.stats = {'hits':0, 'misses':0, 'evictions':0}
+
+
+    def get(self, key:Hashable) -> Tuple[bool, Optional[Dict]]:
+        """
+        This function returns a copy of the block stored for a key, if there is one and it hasn't expired
+
+        Args:
+            key (Hashable): the key the block is stored under e.g. from block_cache_key
+
+        Returns:
+            bool: whether the block was found
+            Dict: a copy of the block
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                self.stats['misses'] += 1
+                return False, None
+            self.stats['hits'] += 1
+            return True, copy.deepcopy(entry[1])
+
+
+    def set(self, key:Hashable, data:Dict):
+        """
+        This function stores a copy of a block, evicting the oldest block if the cache is full
+        """
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            if key not in self.entries and len(self.entries) >= self.max_entries:
+                oldest = min(self.entries, key=lambda entry_key: self.entries[entry_key][0])
+                del self.entries[oldest]
+                self.stats['evictions'] += 1
+            self.entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(data))
+
+
+    def invalidate(self, key:Hashable):
+        """
+        This function removes the block stored for a key
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+    def clear(self):
+        """
+        This function removes all of the blocks stored
+        """
+        with self.lock:
+            self.entries = {}
+
+
+process_cache = ttlCache()
+
+
+def configure_process_cache(aws_config:Dict) -> ttlCache:
+    """
+    This function sets the ttl of the process wide cache from the 'block_cache_ttl' in the AWS configuration (0, the default, turns it off)
+    """
+    ttl = aws_config.get('block_cache_ttl', 0) or 0
+    if ttl != process_cache.ttl:
+        process_cache.ttl = ttl
+        process_cache.clear()
+    return process_cache
+
+
+def block_cache_key(aws_config:Dict, key:str) -> Tuple:
+    """
+    This function returns the key a block is stored under in the process wide cache, the store in the AWS configuration along with the key of the block
+    """
+    return (backend_key(aws_config), key)
+
+
+def read_through(aws_config:Dict, key:str, data_format:str='json', hashes:Optional[Dict]=None):
+    """
+    This function reads a block or file from the storage backend (S3 or the local filesystem), through the process wide cache for JSON blocks if it is turned on
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+        key (str): the key of the block or file
+        data_format (str): the format of the data e.g. 'json', 'cif', 'txt'
+        hashes (Dict): the hashes of the blocks read and written in the run, to record the hash of a JSON block in for conditional puts
+
+    Returns:
+        the data, a success boolean and any errors
+    """
+    cache = configure_process_cache(aws_config)
+    found = False
+    if data_format == 'json' and cache.ttl > 0:
+        found, data = cache.get(block_cache_key(aws_config, key))
+    if found:
+        success, errors = True, None
+    else:
+        data, success, errors = storage_backend(aws_config).get(key, data_format=data_format)
+        if data_format == 'json' and success:
+            cache.set(block_cache_key(aws_config, key), data)
+    if aws_config.get('conditional_puts') and hashes is not None and data_format == 'json' and success and data is not None:
+        hashes[key] = payload_hash(data, data_format)
+    return data, success, errors
+
+
+def write_through(aws_config:Dict, key:str, data, data_format:str='json', stats:Optional[Dict]=None, hashes:Optional[Dict]=None):
+    """
+    This function writes a block or file to the storage backend (S3 or the local filesystem), refreshing the block in the process wide cache (or dropping it if the write fails) and in the facet bundle for the structure if bundles are turned on, and recording it in the storage inventory
+
+    With 'conditional_puts' in the AWS configuration, the write is skipped if the object stored is the same as the one which would be written. The MD5 hash of the bytes which would be stored (after compression) is compared with the ETag of the stored object (see head), which is the MD5 hash of its content. The hashes of the data last read or written for each key in the run (hashes) are checked first, so that a block read and written back unchanged in a run is skipped without the extra request.
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+        key (str): the key of the block or file
+        data: the data to write
+        data_format (str): the format of the data e.g. 'json', 'cif', 'txt'
+        stats (Dict): the statistics of the run, to count the skipped writes in
+        hashes (Dict): the hashes of the blocks and files read and written in the run, see runContext
+
+    Returns:
+        the serialised data, a success boolean and any errors
+    """
+    backend = storage_backend(aws_config)
+    digest = None
+    if aws_config.get('conditional_puts'):
+        data_hash = payload_hash(data, data_format)
+        stored = backend.stored_bytes(key, data, data_format)
+        digest = hashlib.md5(stored).hexdigest()
+        if unchanged(hashes, key, data_hash) or backend.head(key) == digest:
+            record_write(True, stats=stats)
+            if hashes is not None:
+                hashes[key] = data_hash
+            return serialise(data, data_format), True, None
+    if digest is None and data_format == 'json' and aws_config.get('facet_bundles'):
+        # the bundle records the hash of each block it holds, so that blocks written since can be told apart (see fetch_facets)
+        stored = backend.stored_bytes(key, data, data_format)
+        digest = hashlib.md5(stored).hexdigest()
+    cache = configure_process_cache(aws_config)
+    cache.invalidate(block_cache_key(aws_config, key))
+    if digest is not None:
+        payload, success, errors = backend.put(key, stored, data_format='binary')
+        if success:
+            payload = serialise(data, data_format)
+    else:
+        payload, success, errors = backend.put(key, data, data_format=data_format)
+    if data_format == 'json' and success:
+        cache.set(block_cache_key(aws_config, key), data)
+        update_bundle(aws_config, key, data, digest=digest)
+    if success:
+        record_write(False)
+        if digest is not None and hashes is not None:
+            hashes[key] = data_hash
+        record_put(aws_config, key, len(payload) if isinstance(payload, (str, bytes)) else 0, digest=digest)
+    return payload, success, errors
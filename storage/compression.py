@@ -0,0 +1,209 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+import gzip
+import json
+import logging
+import lzma
+import threading
+import time
+
+from .keys import compressible_key
+
+
+# the codecs which can be used, with the magic bytes at the start of the data they write. gzip is given a fixed timestamp so that the same data is always stored as the same bytes, and has the same MD5 hash (see write_through)
+codecs = {
+    'gzip':{'compress':lambda data: gzip.compress(data, mtime=0), 'decompress':gzip.decompress, 'magic':b'\x1f\x8b'},
+    'lzma':{'compress':lzma.compress, 'decompress':lzma.decompress, 'magic':b'\xfd7zXZ\x00'}
+}
+
+text_formats = ['cif', 'txt', 'fasta']
+
+# JSON blocks smaller than this are stored uncompressed, as there is little to gain
+default_minimum_size = 4096
+
+_stats_lock = threading.Lock()
+compression_stats = {}
+
+
+def record(data_format:str, **counts):
+    """
+    This function adds to the process wide compression statistics for a data format
+    """
+    with _stats_lock:
+        if data_format not in compression_stats:
+            compression_stats[data_format] = {'encoded':0, 'raw_bytes':0, 'stored_bytes':0, 'encode_time':0.0, 'decoded':0, 'decode_time':0.0}
+        for counter in counts:
+            compression_stats[data_format][counter] += counts[counter]
+
+
+def compression_report() -> Dict:
+    """
+    This function summarises the bytes saved by compression, and the time spent decompressing, for each data format since the process started (or the statistics were reset)
+
+    Returns:
+        Dict: the bytes written, stored and saved, the compression ratio and the mean encode and decode times in milliseconds, keyed by data format
+    """
+    report = {}
+    with _stats_lock:
+        for data_format, stats in compression_stats.items():
+            report[data_format] = {
+                'objects':stats['encoded'],
+                'raw_bytes':stats['raw_bytes'],
+                'stored_bytes':stats['stored_bytes'],
+                'bytes_saved':stats['raw_bytes'] - stats['stored_bytes'],
+                'ratio':round(stats['stored_bytes'] / stats['raw_bytes'], 3) if stats['raw_bytes'] else None,
+                'encode_ms':round(1000 * stats['encode_time'] / stats['encoded'], 3) if stats['encoded'] else None,
+                'decoded':stats['decoded'],
+                'decode_ms':round(1000 * stats['decode_time'] / stats['decoded'], 3) if stats['decoded'] else None
+            }
+    return report
+
+
+def reset_compression_stats():
+    """
+    This function clears the process wide compression statistics
+    """
+    with _stats_lock:
+        compression_stats.clear()
+
+
+def detect_codec(raw:bytes) -> Optional[str]:
+    """
+    This function returns the codec which wrote some stored data, from its magic bytes, or None if it isn't compressed
+    """
+    for codec in codecs:
+        if raw.startswith(codecs[codec]['magic']):
+            return codec
+    return None
+
+
+def serialise(data, data_format:str='json'):
+    """
+    This function returns data in the form returned by a put to S3 (the serialised JSON for JSON blocks, the data itself for files)
+    """
+    if data_format == 'json':
+        return json.dumps(data)
+    return data
+
+
+def to_bytes(data, data_format:str) -> bytes:
+    """
+    This function serialises a block or file to the bytes which are stored uncompressed
+    """
+    if data_format == 'json':
+        data = json.dumps(data)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return data
+
+
+def encode(data, data_format:str, codec:Optional[str], minimum_size:int=0) -> bytes:
+    """
+    This function serialises a block or file and compresses it with a codec
+
+    Args:
+        data: the data to store
+        data_format (str): the format of the data e.g. 'json', 'cif', 'txt', 'fasta'
+        codec (str): the codec to compress with, 'gzip' or 'lzma', or None to store the data uncompressed
+        minimum_size (int): the size in bytes below which the data is stored uncompressed
+
+    Returns:
+        bytes: the data to store
+    """
+    raw = to_bytes(data, data_format)
+    if codec not in codecs or len(raw) < minimum_size:
+        return raw
+    start = time.perf_counter()
+    stored = codecs[codec]['compress'](raw)
+    record(data_format, encoded=1, raw_bytes=len(raw), stored_bytes=len(stored), encode_time=time.perf_counter() - start)
+    return stored
+
+
+def decode(raw:Union[bytes, str], data_format:str):
+    """
+    This function decompresses stored data if it was compressed, detecting the codec from its magic bytes, and parses it for its data format
+
+    Args:
+        raw (bytes): the stored data
+        data_format (str): the format of the data e.g. 'json', 'cif', 'txt', 'fasta'
+
+    Returns:
+        the data, a dictionary for JSON blocks, a string for the text formats and bytes otherwise
+    """
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    codec = detect_codec(raw)
+    if codec is not None:
+        start = time.perf_counter()
+        raw = codecs[codec]['decompress'](raw)
+        record(data_format, decoded=1, decode_time=time.perf_counter() - start)
+    if data_format == 'json':
+        return json.loads(raw)
+    elif data_format in text_formats:
+        return raw.decode('utf-8')
+    return raw
+
+
+class compressedProvider():
+    """
+    A wrapper around a storage backend provider (s3ClientProvider or localProvider) which compresses the data written in the data formats configured and decompresses any compressed data read
+
+    It is used when there is a 'compression' table in the AWS configuration, mapping data formats to codecs e.g. {'cif':'gzip', 'json':'lzma'}. A data format can be set to 'none' to store it uncompressed while still reading the data compressed earlier. Only the keys which are read through this package alone are compressed (see compressible_key), along with any 'compression_prefixes' in the AWS configuration; everything else is stored uncompressed for the readers which go to the bucket directly.
+    """
+    def __init__(self, provider, aws_config:Dict):
+        self.provider = provider
+        self.codecs = aws_config.get('compression') or {}
+        self.minimum_size = aws_config.get('compression_minimum_size', default_minimum_size)
+        self.prefixes = aws_config.get('compression_prefixes') or []
+
+
+    def codec(self, key:str, data_format:str) -> Optional[str]:
+        """
+        This function returns the codec to compress the data stored at a key with, or None if it is stored uncompressed
+        """
+        if not compressible_key(key, self.prefixes):
+            return None
+        return self.codecs.get(data_format)
+
+
+    def get_raw(self, key:str) -> Tuple[Optional[bytes], bool, Optional[List]]:
+        """
+        This function reads the data stored for a key, without decompressing or parsing it
+        """
+        raw, success, errors = self.provider.get(key, data_format='binary')
+        if success and isinstance(raw, str):
+            raw = raw.encode('utf-8')
+        return raw, success, errors
+
+
+    def get(self, key:str, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        raw, success, errors = self.get_raw(key)
+        if not success or raw is None:
+            return None, False, errors
+        try:
+            return decode(raw, data_format), True, None
+        except Exception as e:
+            logging.warn(f'UNABLE TO DECODE {key}')
+            logging.warn(e)
+            return None, False, [f'unable_to_decode__{type(e).__name__.lower()}']
+
+
+    def stored_bytes(self, key:str, data, data_format:str='json') -> bytes:
+        """
+        This function returns the bytes which a put of the data to a key would store, compressed with the codec for its data format if the key can be compressed
+        """
+        minimum_size = self.minimum_size if data_format == 'json' else 0
+        return encode(data, data_format, self.codec(key, data_format), minimum_size=minimum_size)
+
+
+    def head(self, key:str) -> Optional[str]:
+        return self.provider.head(key)
+
+
+    def put(self, key:str, data, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        stored = self.stored_bytes(key, data, data_format)
+        payload, success, errors = self.provider.put(key, stored, data_format='binary')
+        if not success:
+            return payload, success, errors
+        return (json.dumps(data) if data_format == 'json' else data), True, None
+
@@ -0,0 +1,118 @@
+from typing import Dict, List, Optional, Tuple
+
+from .providers import storageProvider
+from .inventory import inventory_exists
+
+import datetime
+import hashlib
+import re
+import threading
+
+
+_known_blobs = set()
+_known_blobs_lock = threading.Lock()
+
+
+def content_hash(data) -> str:
+    """
+    This function returns the SHA-256 hash of the content of a file, the same for the text and its UTF-8 bytes
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_key(digest:str) -> str:
+    """
+    This function returns the key of the content addressed copy of a derived structure file
+    """
+    return f'structures/blobs/{digest[:2]}/{digest}.cif'
+
+
+def blob_hash(key:str) -> Optional[str]:
+    """
+    This function returns the content hash of a blob from its key, or None if the key isn't the key of a blob
+    """
+    match = re.match(r'^structures/blobs/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})\.cif$', key)
+    return match.group('digest') if match else None
+
+
+def blob_store(aws_config:Dict) -> Tuple:
+    """
+    This function returns the store (backend and bucket) blobs are written to, so that the blobs known to be stored are remembered per store
+    """
+    return (aws_config.get('storage_backend'), aws_config.get('local_storage_path'), aws_config.get('s3_bucket'))
+
+
+def recorded_file(block:Optional[Dict], path:List) -> Optional[Dict]:
+    """
+    This function returns the file details recorded for a derived file in a block from an earlier run e.g. recorded_file(aligned, ['aligned', 'files', '1', 'files']), or None if there aren't any
+    """
+    for step in path:
+        if not isinstance(block, dict):
+            return None
+        block = block.get(step)
+    return block if isinstance(block, dict) else None
+
+
+def save_derived_files(files:List, aws_config:Dict) -> Dict:
+    """
+    This function stores derived structure files (e.g. aligned structures, antigen binding domains and peptides), writing them at the same time
+
+    With 'content_addressed' in the AWS configuration, each file is stored once as a blob keyed by the hash of its content, and the file details returned point at the blob. A blob already stored (written earlier in the process, or in the storage inventory) isn't uploaded again, and the file is only written to its own key (which is still used for downloads) when its content has changed since the run which recorded the previous details. Unchanged files keep their 'last_updated', so the blocks recording them are unchanged too.
+
+    Args:
+        files (List): a list of (key, data, data_format, previous) tuples, where previous is the file details recorded by an earlier run (see recorded_file) or None
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the (file details, success, errors) for each file, keyed by key
+    """
+    now = datetime.datetime.now().isoformat()
+    s3 = storageProvider(aws_config)
+    if not aws_config.get('content_addressed'):
+        written = s3.put_many([(key, data, data_format) for key, data, data_format, previous in files])
+        return {key:({'file_key':key, 'last_updated':now}, written[key][1], written[key][2]) for key, data, data_format, previous in files}
+    store = blob_store(aws_config)
+    writes = {}
+    details = {}
+    for key, data, data_format, previous in files:
+        digest = content_hash(data)
+        blob = blob_key(digest)
+        with _known_blobs_lock:
+            known = (store, blob) in _known_blobs
+        if not known and not inventory_exists(blob, aws_config):
+            writes[blob] = (blob, data, data_format)
+        unchanged = previous is not None and previous.get('content_hash') == digest
+        if not unchanged:
+            writes[key] = (key, data, data_format)
+        details[key] = {'file_key':blob, 'alias_key':key, 'content_hash':digest, 'last_updated':previous.get('last_updated', now) if unchanged else now}
+    written = s3.put_many(list(writes.values()))
+    results = {}
+    for key in details:
+        blob = details[key]['file_key']
+        errors = [error for write_key in [blob, key] if write_key in written and not written[write_key][1] for error in (written[write_key][2] or ['unable_to_write'])]
+        if blob in written and written[blob][1]:
+            with _known_blobs_lock:
+                _known_blobs.add((store, blob))
+        results[key] = (details[key], len(errors) == 0, errors or None)
+    return results
+
+
+def save_derived_file(key:str, data, aws_config:Dict, data_format:str='cif', previous:Optional[Dict]=None) -> Tuple[Dict, bool, Optional[List]]:
+    """
+    This function stores a derived structure file, see save_derived_files
+
+    Args:
+        key (str): the key of the file e.g. awsKeyProvider().cif_file_key('1hhk_1', 'aligned')
+        data: the file
+        aws_config (Dict): the configuration details for AWS for the current app
+        data_format (str): the format of the data e.g. 'cif', 'txt'
+        previous (Dict): the file details recorded by an earlier run, or None
+
+    Returns:
+        Dict: the file details, with the 'file_key' to read the file from
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    return save_derived_files([(key, data, data_format, previous)], aws_config)[key]
@@ -0,0 +1,280 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+from .cache import read_through, write_through
+from .journal import spill
+from .compression import serialise
+
+import contextvars
+import copy
+import json
+import logging
+import threading
+
+
+_active_context = contextvars.ContextVar('storage_run_context', default=None)
+
+
+def active_context() -> Optional['runContext']:
+    """
+    This function returns the run context which is active for the current thread of execution, if there is one
+
+    Returns:
+        runContext: the active run context, or None
+    """
+    return _active_context.get()
+
+
+def deep_merge(block:Dict, update:Dict) -> Dict:
+    """
+    This function merges an update into a block, key by key. Nested dictionaries are merged, anything else in the update replaces the value in the block
+
+    Args:
+        block (Dict): the block to be updated, which is modified in place
+        update (Dict): the update
+
+    Returns:
+        Dict: the updated block
+    """
+    for key in update:
+        if isinstance(update[key], dict) and isinstance(block.get(key), dict):
+            deep_merge(block[key], update[key])
+        else:
+            block[key] = update[key]
+    return block
+
+
+class runContext():
+    """
+    A run scoped store of the blocks, files and parsed structures read and written by pipeline actions
+
+    While a run context is active (used as a context manager), storageProvider and the storage helpers read through it and, if writes are deferred, write into it.
+
+    The blocks written are then flushed to S3 when the context exits, so that a chain of steps over one structure only reads the core, chains and aligned blocks (and parses each structure) once.
+
+    With writes not deferred, and only JSON blocks cached (cache_formats=['json']), it is a read-through cache for a whole set run, with the hit and miss counts in its stats.
+
+    With coalesce_updates, the updates merged into a block with update_block are held and written once, when the step ends (see end_step) or the context exits, rather than on every update. Writes which still fail when flushed are saved to a local journal to be replayed (see journal.py).
+    """
+    def __init__(self, aws_config:Dict, defer_writes:bool=True, cache_formats:Optional[List]=None, coalesce_updates:bool=False):
+        self.aws_config = aws_config
+        self.defer_writes = defer_writes
+        self.cache_formats = cache_formats
+        self.coalesce_updates = coalesce_updates
+        self.blocks = {}
+        self.structures = {}
+        self.pending = {}
+        self.lock = threading.RLock()
+        self.key_locks = {}
+        self.tokens = []
+        # the hashes of the blocks and files read and written in this run, for conditional puts
+        self.hashes = {}
+        self.stats = {'reads':0, 'hits':0, 'misses':0, 'writes':0, 'updates':0, 'flushed':0, 'skipped_writes':0, 'structures_parsed':0, 'structures_reused':0}
+        self.errors = []
+
+
+    def __enter__(self):
+        self.tokens.append(_active_context.set(self))
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.flush()
+        finally:
+            _active_context.reset(self.tokens.pop())
+        return False
+
+
+    def caches(self, data_format:str) -> bool:
+        """
+        This function checks whether data in a format is kept in this run context
+        """
+        return self.cache_formats is None or data_format in self.cache_formats
+
+
+    def get(self, key:str, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        """
+        This function returns a block or file, from the run context if it has been read or written in this run, otherwise from S3
+
+        JSON blocks are returned as copies, as pipeline actions modify the blocks they read
+
+        Args:
+            key (str): the key of the block or file
+            data_format (str): the format of the data e.g. 'json', 'cif', 'txt'
+
+        Returns:
+            the data, a success boolean and any errors
+        """
+        if not self.caches(data_format):
+            return read_through(self.aws_config, key, data_format=data_format, hashes=self.hashes)
+        with self.lock:
+            self.stats['reads'] += 1
+            if key in self.blocks:
+                self.stats['hits'] += 1
+                return copy.deepcopy(self.blocks[key]), True, None
+            self.stats['misses'] += 1
+        data, success, errors = read_through(self.aws_config, key, data_format=data_format, hashes=self.hashes)
+        if success:
+            with self.lock:
+                if key not in self.blocks:
+                    self.blocks[key] = copy.deepcopy(data)
+        return data, success, errors
+
+
+    def put(self, key:str, data, data_format:str='json', defer:Optional[bool]=None) -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        """
+        This function stores a block or file in the run context, and either writes it to S3 or queues it to be written when the context is flushed
+
+        Args:
+            key (str): the key of the block or file
+            data: the data to store
+            data_format (str): the format of the data e.g. 'json', 'cif', 'txt'
+            defer (bool): whether to queue the write, defaults to the defer_writes of the context
+
+        Returns:
+            the serialised data, a success boolean and any errors
+        """
+        if defer is None:
+            defer = self.defer_writes
+        with self.lock:
+            self.stats['writes'] += 1
+            self.structures.pop(key, None)
+            if not self.caches(data_format):
+                self.blocks.pop(key, None)
+            else:
+                self.blocks[key] = copy.deepcopy(data)
+                if defer:
+                    self.pending[key] = data_format
+                    return serialise(data, data_format), True, None
+                # this write supersedes any coalesced updates to the block
+                self.pending.pop(key, None)
+        return write_through(self.aws_config, key, data, data_format=data_format, stats=self.stats, hashes=self.hashes)
+
+
+    def update(self, key:str, update:Dict) -> Tuple[Dict, bool, Optional[List]]:
+        """
+        This function merges an update into a JSON block, reading, merging and storing it in one step so that steps running concurrently in this run don't overwrite each other's updates
+
+        Args:
+            key (str): the key of the block
+            update (Dict): the update to merge in
+
+        Returns:
+            Dict: the updated block, a success boolean and any errors
+        """
+        with self.key_lock(key):
+            block, success, errors = self.get(key)
+            if not block:
+                block = {}
+            block = deep_merge(block, copy.deepcopy(update))
+            self.stats['updates'] += 1
+            payload, success, errors = self.put(key, block, defer=self.defer_writes or self.coalesce_updates)
+        return block, success, errors
+
+
+    def end_step(self) -> List:
+        """
+        This function is called at the end of each step, and flushes the coalesced updates if the rest of the writes aren't deferred to the end of the run
+
+        Returns:
+            List: a list of errors from the writes
+        """
+        if self.coalesce_updates and not self.defer_writes:
+            return self.flush()
+        return []
+
+
+    def key_lock(self, key:str) -> threading.Lock:
+        """
+        This function returns the lock for updates to a key, so that updates to different blocks don't wait for each other
+        """
+        with self.lock:
+            if key not in self.key_locks:
+                self.key_locks[key] = threading.Lock()
+            return self.key_locks[key]
+
+
+    def get_structure(self, key:str):
+        """
+        This function returns a copy of a structure parsed earlier in this run, if there is one
+
+        A copy is returned as some steps (e.g. alignment) move the atoms of the structures they load
+
+        Args:
+            key (str): the key of the structure file
+
+        Returns:
+            Bio.PDB.Structure: a copy of the parsed structure, or None
+        """
+        with self.lock:
+            if key in self.structures and self.cache_formats is None:
+                self.stats['structures_reused'] += 1
+                return self.structures[key].copy()
+        return None
+
+
+    def set_structure(self, key:str, structure, parsed:bool=True):
+        """
+        This function keeps a parsed structure for the rest of the run
+
+        Args:
+            key (str): the key of the structure file
+            structure (Bio.PDB.Structure): the parsed structure
+            parsed (bool): whether the structure was parsed in this run, rather than taken from the process wide structure cache
+        """
+        with self.lock:
+            self.stats['structures_parsed' if parsed else 'structures_reused'] += 1
+            if self.cache_formats is None:
+                self.structures[key] = structure.copy()
+
+
+    def flush(self) -> List:
+        """
+        This function writes the blocks and files queued in this run to S3
+
+        Each key is written once, with the last data stored for it. A failed write is logged and recorded, but doesn't stop the other writes. Failed writes are tried once more, and then saved to the local journal so that they aren't lost.
+
+        Returns:
+            List: a list of errors from the writes
+        """
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+            to_write = [(key, self.blocks[key], pending[key]) for key in pending]
+        errors = []
+        unwritten = []
+        for key, data, data_format in to_write:
+            put_errors = self.write(key, data, data_format)
+            if put_errors:
+                put_errors = self.write(key, data, data_format)
+            if put_errors:
+                errors.append({'key':key, 'errors':put_errors})
+                unwritten.append((key, data, data_format))
+        if len(unwritten) > 0:
+            try:
+                spill(self.aws_config, unwritten)
+            except Exception as e:
+                logging.warn('UNABLE TO SAVE UNFLUSHED WRITES TO THE JOURNAL')
+                logging.warn(e)
+        self.errors += errors
+        return errors
+
+
+    def write(self, key:str, data, data_format:str) -> Optional[List]:
+        """
+        This function writes a queued block or file to S3
+
+        Returns:
+            List: the errors from the write, or None if it succeeded
+        """
+        try:
+            payload, success, put_errors = write_through(self.aws_config, key, data, data_format=data_format, stats=self.stats, hashes=self.hashes)
+        except Exception as e:
+            logging.warn(f'UNABLE TO FLUSH {key}')
+            logging.warn(e)
+            return [str(e)]
+        if not success:
+            return put_errors or ['unable_to_write']
+        with self.lock:
+            self.stats['flushed'] += 1
+        return None
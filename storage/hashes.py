@@ -0,0 +1,35 @@
+from typing import Dict, Optional
+
+from .compression import to_bytes
+
+import hashlib
+import threading
+
+
+_stats_lock = threading.Lock()
+write_stats = {'writes':0, 'skipped_writes':0}
+
+
+def payload_hash(data, data_format:str='json') -> str:
+    """
+    This function returns the MD5 hash of the serialised form of a block or file, which is also the ETag S3 gives an object uploaded in one part
+    """
+    return hashlib.md5(to_bytes(data, data_format)).hexdigest()
+
+
+def unchanged(hashes:Optional[Dict], key:str, digest:str) -> bool:
+    """
+    This function checks whether the hash of the data to write for a key is the same as the hash of the object last read or written for it in the run (hashes)
+    """
+    return hashes is not None and hashes.get(key) == digest
+
+
+def record_write(skipped:bool, stats:Optional[Dict]=None):
+    """
+    This function counts a write, or a write skipped as the object stored was unchanged, for the process and for a run (stats)
+    """
+    counter = 'skipped_writes' if skipped else 'writes'
+    with _stats_lock:
+        write_stats[counter] += 1
+        if stats is not None and skipped:
+            stats['skipped_writes'] = stats.get('skipped_writes', 0) + 1
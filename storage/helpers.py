@@ -0,0 +1,239 @@
+from typing import Dict, List, Optional, Tuple
+
+from Bio.PDB import MMCIFParser, PDBParser
+from io import StringIO
+
+from common.providers import awsKeyProvider
+from common.helpers import fetch_constants as load_constants
+
+from .context import active_context, deep_merge
+from .cache import process_cache
+from .providers import storageProvider
+from .bundles import read_bundle, write_bundle_facets, block_digest, fresh_facets
+from .content import content_hash, blob_hash
+from .structures import configure_structure_cache, structure_cache_key
+
+import copy
+import logging
+
+
+def fetch_constants(name:str):
+    """
+    This function returns a set of constants e.g. 'species' or 'loci', loading them once per run context (or once per ttl of the process wide cache if it is turned on)
+
+    Args:
+        name (str): the name of the constants
+
+    Returns:
+        the constants
+    """
+    key = f'constants:{name}'
+    context = active_context()
+    if context is not None:
+        with context.lock:
+            if key in context.blocks:
+                context.stats['hits'] += 1
+                return copy.deepcopy(context.blocks[key])
+    elif process_cache.ttl > 0:
+        found, constants = process_cache.get(key)
+        if found:
+            return constants
+    constants = load_constants(name)
+    if context is not None:
+        with context.lock:
+            context.stats['misses'] += 1
+            context.blocks[key] = copy.deepcopy(constants)
+    else:
+        process_cache.set(key, constants)
+    return constants
+
+
+def fetch_core(pdb_code:str, aws_config:Dict) -> Tuple[Optional[Dict], bool, Optional[List]]:
+    """
+    This function fetches the core block for a structure
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the core block
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    return fetch_facet(pdb_code, 'core', aws_config)
+
+
+def fetch_facet(pdb_code:str, facet:str, aws_config:Dict, domain:str='info') -> Tuple[Optional[Dict], bool, Optional[List]]:
+    """
+    This function fetches a block (facet) for a structure e.g. 'chains' or 'aligned'
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        facet (str): the name of the facet
+        aws_config (Dict): the configuration details for AWS for the current app
+        domain (str): the domain of the block, defaults to 'info'
+
+    Returns:
+        Dict: the block
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    key = awsKeyProvider().block_key(pdb_code, facet, domain)
+    return storageProvider(aws_config).get(key)
+
+
+def fetch_facets(pdb_code:str, facets:List, aws_config:Dict) -> Tuple[Dict, bool, Optional[List]]:
+    """
+    This function fetches several blocks (facets) for a structure, from its facet bundle in one read if bundles are turned on
+
+    Blocks held in the active run context are used in preference to the bundle. A block is only used from the bundle while it is the same as the block stored (see fresh_facets), and the blocks which aren't (or all of the blocks if bundles are turned off) are fetched at the same time, and added to the bundle.
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        facets (List): the names of the facets e.g. ['core', 'chains']
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the blocks keyed by facet, None for a block which can't be found
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    found = {}
+    context = active_context()
+    if context is not None:
+        with context.lock:
+            for facet in facets:
+                key = awsKeyProvider().block_key(pdb_code, facet, 'info')
+                if key in context.blocks:
+                    found[facet] = copy.deepcopy(context.blocks[key])
+    digests = {}
+    if aws_config.get('facet_bundles'):
+        # the hashes are taken before the blocks are read, so that a block written in between is seen as stale next time rather than bundled as fresh
+        digests = {facet:block_digest(awsKeyProvider().block_key(pdb_code, facet, 'info'), aws_config) for facet in facets if facet not in found}
+        found.update(fresh_facets(read_bundle(pdb_code, aws_config), digests))
+    missing = [facet for facet in facets if facet not in found]
+    keys = {facet:awsKeyProvider().block_key(pdb_code, facet, 'info') for facet in missing}
+    blocks = storageProvider(aws_config).get_many(list(keys.values()))
+    for facet in missing:
+        found[facet] = blocks[keys[facet]][0]
+    if aws_config.get('facet_bundles'):
+        write_bundle_facets(pdb_code, {facet:found[facet] for facet in missing if found[facet] is not None}, aws_config, digests=digests)
+    return {facet:found[facet] for facet in facets}, True, None
+
+
+def update_block(pdb_code:str, facet:str, domain:str, update:Dict, aws_config:Dict) -> Tuple[Optional[Dict], bool, Optional[List]]:
+    """
+    This function merges an update into a block for a structure and stores it
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        facet (str): the name of the facet e.g. 'core'
+        domain (str): the domain of the block e.g. 'info'
+        update (Dict): the update to merge in
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the updated block
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    key = awsKeyProvider().block_key(pdb_code, facet, domain)
+    context = active_context()
+    if context is not None:
+        return context.update(key, update)
+    s3 = storageProvider(aws_config)
+    block, success, errors = s3.get(key)
+    if not block:
+        block = {}
+    block = deep_merge(block, update)
+    payload, success, errors = s3.put(key, block)
+    return block, success, errors
+
+
+def load_structure(key:str, identifier:str, aws_config:Dict, parser, data_format:str):
+    """
+    This function loads a structure file and parses it with the parser given, reusing a structure parsed earlier in the active run context, or in the process (see structureCache) if the content of the file is unchanged
+
+    Content addressed files (blobs) aren't read at all if their structure is in the process wide cache, as the hash of their content is in their key
+    """
+    context = active_context()
+    if context is not None:
+        structure = context.get_structure(key)
+        if structure is not None:
+            return structure
+    cache = configure_structure_cache(aws_config)
+    digest = blob_hash(key)
+    if digest is not None and cache.max_bytes > 0:
+        structure = cache.checkout(structure_cache_key(aws_config, key, identifier, digest))
+        if structure is not None:
+            if context is not None:
+                context.set_structure(key, structure, parsed=False)
+            return structure
+    data, success, errors = storageProvider(aws_config).get(key, data_format=data_format)
+    if not success or not data:
+        logging.warn(f'UNABLE TO LOAD {key}')
+        return None
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    cache_key = structure_cache_key(aws_config, key, identifier, digest or content_hash(data))
+    structure = cache.checkout(cache_key) if cache.max_bytes > 0 and digest is None else None
+    if structure is not None:
+        if context is not None:
+            context.set_structure(key, structure, parsed=False)
+        return structure
+    structure = parser.get_structure(identifier, StringIO(data))
+    if cache.max_bytes > 0:
+        cache.set(cache_key, structure)
+        structure = structure.copy()
+    if context is not None:
+        context.set_structure(key, structure)
+    return structure
+
+
+def load_cif(key:str, identifier:str, aws_config:Dict):
+    """
+    This function loads and parses an mmCIF file
+
+    Within a run context, and in the process while the file is unchanged, a structure is only parsed once, and a fresh copy is returned each time it is loaded
+
+    Args:
+        key (str): the key of the file
+        identifier (str): the identifier for the structure e.g. '1hhk_1'
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Bio.PDB.Structure: the parsed structure, or None if it can't be loaded
+    """
+    return load_structure(key, identifier, aws_config, MMCIFParser(QUIET=True), 'cif')
+
+
+def load_pdb(key:str, identifier:str, aws_config:Dict):
+    """
+    This function loads and parses a PDB format file
+
+    Args:
+        key (str): the key of the file
+        identifier (str): the identifier for the structure e.g. '1hhk_1'
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Bio.PDB.Structure: the parsed structure, or None if it can't be loaded
+    """
+    return load_structure(key, identifier, aws_config, PDBParser(QUIET=True), 'txt')
+
+
+def save_cif(key:str, cif_file:StringIO, aws_config:Dict):
+    """
+    This function stores an mmCIF file written by MMCIFIO
+
+    Args:
+        key (str): the key of the file
+        cif_file (StringIO): the file
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        str: the mmCIF data stored
+    """
+    cif_data, success, errors = storageProvider(aws_config).put(key, cif_file.getvalue(), data_format='cif')
+    return cif_data
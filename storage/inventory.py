@@ -0,0 +1,270 @@
+from typing import Dict, List, Optional
+
+from common.providers import awsKeyProvider
+
+from .backends import storage_backend, list_keys, backend_key
+from .keys import parse_block_key
+
+from functools import lru_cache
+
+import datetime
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+
+inventory_key = 'pipeline/inventory/inventory.json'
+
+# each process saves the puts it records under this prefix, in an object of its own (see save_inventory)
+delta_prefix = 'pipeline/inventory/deltas/'
+
+# the number of puts recorded in the process before they are saved
+save_every = 100
+
+# the seconds the inventory is kept in the process before it is loaded again, so that objects deleted or written by other processes are seen
+default_max_age = 600
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+# a token for the delta object of this process, which along with the process id keeps processes forked from it apart
+_process_token = uuid.uuid4().hex
+
+
+@lru_cache(maxsize=None)
+def cif_key_pattern():
+    """
+    This function returns a regular expression matching the keys of CIF files, built from the layout used by awsKeyProvider, with the assembly identifier as a named group
+    """
+    template = awsKeyProvider().cif_file_key('xidentifierx', 'xtypex')
+    pattern = re.escape(template).replace('xidentifierx', '(?P<identifier>[^/]+)').replace('xtypex', '(?P<cif_type>[^/]+)')
+    return re.compile(f'^{pattern}$')
+
+
+def pdb_code_for_key(key:str) -> Optional[str]:
+    """
+    This function returns the pdb code of the structure a block or CIF file key belongs to, or None for other keys
+    """
+    pdb_code, facet = parse_block_key(key)
+    if pdb_code is not None:
+        return pdb_code
+    match = cif_key_pattern().match(key)
+    if match is not None:
+        return match.group('identifier').split('_')[0]
+    return None
+
+
+def index_structures(keys:Dict) -> Dict:
+    """
+    This function groups the keys in an inventory by the pdb code of the structure they belong to
+    """
+    structures = {}
+    for key in keys:
+        pdb_code = pdb_code_for_key(key)
+        if pdb_code is not None:
+            if pdb_code not in structures:
+                structures[pdb_code] = []
+            structures[pdb_code].append(key)
+    return structures
+
+
+def delta_key() -> str:
+    """
+    This function returns the key of the object holding the puts recorded by this process
+    """
+    return f'{delta_prefix}{os.getpid()}-{_process_token}.json'
+
+
+def parse_time(timestamp:str) -> datetime.datetime:
+    """
+    This function parses a timestamp from the inventory, taking those without a timezone (from datetime.now()) to be in local time, so that they can be compared with the times from an S3 listing
+    """
+    parsed = datetime.datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed
+
+
+def merge_entries(keys:Dict, entries:Dict) -> Dict:
+    """
+    This function merges inventory entries into the entries for a set of keys, keeping the most recently modified entry for each key
+    """
+    for key, entry in entries.items():
+        if key not in keys or parse_time(entry['last_modified']) >= parse_time(keys[key]['last_modified']):
+            keys[key] = entry
+    return keys
+
+
+def load_inventory(aws_config:Dict) -> Optional[Dict]:
+    """
+    This function loads the stored inventory, merged with the puts saved by every process since it was built
+
+    Only the delta objects written since the inventory was built are read, as the listing it was built from holds the puts saved before.
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: when the inventory was built and the entry for each key, or None if no inventory has been built
+    """
+    backend = storage_backend(aws_config)
+    stored, success, errors = backend.get(inventory_key)
+    if not success or not stored:
+        return None
+    built = parse_time(stored['built'])
+    keys = stored['keys']
+    for key, size, last_modified, digest in list_keys(aws_config, prefix=delta_prefix):
+        if parse_time(last_modified) >= built:
+            delta, success, errors = backend.get(key)
+            if success and delta:
+                merge_entries(keys, delta['keys'])
+    return {'built':stored['built'], 'keys':keys}
+
+
+def cached_inventory(aws_config:Dict) -> Dict:
+    """
+    This function returns the inventory held in this process for the store in the AWS configuration, loading it from storage the first time it is needed and again once it is older than the 'inventory_max_age' in the AWS configuration (in seconds), keeping the puts recorded in this process since it was built
+    """
+    store = backend_key(aws_config)
+    max_age = aws_config.get('inventory_max_age', default_max_age)
+    with _inventories_lock:
+        if store not in _inventories:
+            _inventories[store] = {'lock':threading.Lock(), 'save_lock':threading.Lock(), 'loaded':None, 'built':None, 'keys':{}, 'structures':{}, 'recorded':{}, 'unsaved':0, 'puts':0}
+        inventory = _inventories[store]
+    with inventory['lock']:
+        if inventory['loaded'] is None or time.monotonic() - inventory['loaded'] > max_age:
+            loaded = load_inventory(aws_config)
+            if loaded is not None:
+                if loaded['built'] != inventory['built'] and inventory['built'] is not None:
+                    # the inventory has been built again since, and its listing holds the puts recorded before that
+                    built = parse_time(loaded['built'])
+                    inventory['recorded'] = {key:entry for key, entry in inventory['recorded'].items() if parse_time(entry['last_modified']) >= built}
+                inventory['built'] = loaded['built']
+                inventory['keys'] = merge_entries(loaded['keys'], inventory['recorded'])
+                inventory['structures'] = index_structures(inventory['keys'])
+            inventory['loaded'] = time.monotonic()
+    return inventory
+
+
+def build_inventory(aws_config:Dict, prefix:str='') -> Dict:
+    """
+    This function builds the inventory of the objects in the store from one paginated listing, and saves it
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+        prefix (str): only list the keys starting with this prefix e.g. 'structures/'
+
+    Returns:
+        Dict: the number of objects and structures in the inventory and their total size
+    """
+    # taken before the listing, so that the puts other processes save while it runs are still merged on load
+    built = datetime.datetime.now().isoformat()
+    keys = {}
+    for key, size, last_modified, digest in list_keys(aws_config, prefix=prefix):
+        if key != inventory_key and not key.startswith(delta_prefix):
+            keys[key] = {'size':size, 'last_modified':last_modified, 'md5':digest}
+    inventory = cached_inventory(aws_config)
+    with inventory['lock']:
+        # keep puts recorded while the listing was running
+        merge_entries(keys, inventory['recorded'])
+        inventory['keys'] = keys
+        inventory['structures'] = index_structures(keys)
+        inventory['built'] = built
+        inventory['recorded'] = {}
+        inventory['unsaved'] = 0
+        stored = {'built':built, 'keys':keys}
+    payload, success, errors = storage_backend(aws_config).put(inventory_key, stored)
+    if not success:
+        logging.warn('UNABLE TO SAVE THE STORAGE INVENTORY')
+    return {'objects':len(keys), 'structures':len(index_structures(keys)), 'bytes':sum(keys[key]['size'] for key in keys), 'saved':success}
+
+
+def save_inventory(aws_config:Dict) -> bool:
+    """
+    This function saves the puts recorded in this process since the inventory was built
+
+    The puts are written to a delta object of the process's own (see delta_key), which is merged into the inventory when it is loaded, so processes saving at the same time never overwrite each other's puts.
+    """
+    inventory = cached_inventory(aws_config)
+    with inventory['save_lock']:
+        with inventory['lock']:
+            if inventory['built'] is None or inventory['unsaved'] == 0:
+                return True
+            delta = {'built':inventory['built'], 'keys':dict(inventory['recorded'])}
+            unsaved = inventory['unsaved']
+            inventory['unsaved'] = 0
+        payload, success, errors = storage_backend(aws_config).put(delta_key(), delta)
+        if not success:
+            logging.warn('UNABLE TO SAVE THE STORAGE INVENTORY')
+            with inventory['lock']:
+                inventory['unsaved'] += unsaved
+    return success
+
+
+def record_put(aws_config:Dict, key:str, size:int, digest:Optional[str]=None):
+    """
+    This function records an object which has just been written in the inventory, if one has been built, saving the puts every few puts
+    """
+    if key == inventory_key or key.startswith(delta_prefix):
+        return
+    inventory = cached_inventory(aws_config)
+    with inventory['lock']:
+        if inventory['built'] is None:
+            return
+        entry = {'size':size, 'last_modified':datetime.datetime.now().isoformat(), 'md5':digest}
+        pdb_code = pdb_code_for_key(key)
+        if pdb_code is not None and key not in inventory['keys']:
+            inventory['structures'].setdefault(pdb_code, []).append(key)
+        inventory['keys'][key] = entry
+        inventory['recorded'][key] = entry
+        inventory['unsaved'] += 1
+        inventory['puts'] += 1
+        save = inventory['puts'] % save_every == 0
+    if save:
+        save_inventory(aws_config)
+
+
+def inventory_exists(key:str, aws_config:Dict) -> Optional[bool]:
+    """
+    This function checks the inventory for an object
+
+    Args:
+        key (str): the key of the object
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        bool: whether the object is in the inventory, or None if no inventory has been built
+    """
+    inventory = cached_inventory(aws_config)
+    with inventory['lock']:
+        if inventory['built'] is None:
+            return None
+        return key in inventory['keys']
+
+
+def inventory_entry(key:str, aws_config:Dict) -> Optional[Dict]:
+    """
+    This function returns the size, last modified time and hash recorded for an object in the inventory, or None if it isn't there
+    """
+    inventory = cached_inventory(aws_config)
+    with inventory['lock']:
+        return inventory['keys'].get(key)
+
+
+def structure_inventory(pdb_code:str, aws_config:Dict) -> Dict:
+    """
+    This function returns the blocks and CIF files stored for a structure, from the inventory
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the size and last modified time of each object, keyed by key
+    """
+    inventory = cached_inventory(aws_config)
+    with inventory['lock']:
+        return {key:inventory['keys'][key] for key in inventory['structures'].get(pdb_code, []) if key in inventory['keys']}
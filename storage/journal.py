@@ -0,0 +1,78 @@
+from typing import Dict, List
+
+from .cache import write_through
+
+import base64
+import datetime
+import json
+import logging
+import os
+import tempfile
+import uuid
+
+
+def journal_dir(aws_config:Dict) -> str:
+    """
+    This function returns the directory where writes which couldn't be flushed to S3 are kept, from the 'journal_dir' in the AWS configuration or the system temporary directory
+    """
+    return aws_config.get('journal_dir') or os.path.join(tempfile.gettempdir(), 'histo_pipeline_journal')
+
+
+def spill(aws_config:Dict, writes:List) -> str:
+    """
+    This function saves writes which couldn't be flushed to S3 to a journal file, so that they can be replayed later with replay_journal
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+        writes (List): a list of (key, data, data_format) tuples
+
+    Returns:
+        str: the path of the journal file
+    """
+    entries = []
+    for key, data, data_format in writes:
+        if isinstance(data, bytes):
+            entries.append({'key':key, 'data':base64.b64encode(data).decode('ascii'), 'data_format':data_format, 'encoding':'base64'})
+        else:
+            entries.append({'key':key, 'data':data, 'data_format':data_format, 'encoding':None})
+    directory = journal_dir(aws_config)
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, f'{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}_{uuid.uuid4().hex[:8]}.json')
+    with open(filename, 'w') as journal_file:
+        json.dump({'bucket':aws_config.get('s3_bucket'), 'writes':entries}, journal_file)
+    logging.warn(f'{len(entries)} UNFLUSHED WRITES SAVED TO {filename}')
+    return filename
+
+
+def replay_journal(aws_config:Dict) -> Dict:
+    """
+    This function replays the writes saved to the journal for the bucket in the AWS configuration, removing each journal file once all of its writes have succeeded
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the number of writes replayed and the keys which still couldn't be written
+    """
+    directory = journal_dir(aws_config)
+    report = {'replayed':0, 'failed':[]}
+    if not os.path.isdir(directory):
+        return report
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        with open(path, 'r') as journal_file:
+            journal = json.load(journal_file)
+        if journal['bucket'] != aws_config.get('s3_bucket'):
+            continue
+        failed = []
+        for entry in journal['writes']:
+            data = base64.b64decode(entry['data']) if entry['encoding'] == 'base64' else entry['data']
+            payload, success, errors = write_through(aws_config, entry['key'], data, data_format=entry['data_format'])
+            if success:
+                report['replayed'] += 1
+            else:
+                failed.append(entry['key'])
+        if len(failed) == 0:
+            os.remove(path)
+        report['failed'] += failed
+    return report
@@ -0,0 +1,51 @@
+from typing import List, Optional, Tuple
+
+from common.providers import awsKeyProvider
+
+from functools import lru_cache
+
+import re
+
+
+bundle_facet = 'bundle'
+
+# the objects which are only ever read through this package. The web app's models (common.models, via s3Provider) and the downloads of the structure files read the bucket directly and can't decompress, so only these keys are safe to compress (see compressedProvider)
+storage_only_prefixes = ['pipeline/', 'structures/blobs/']
+storage_only_facets = [bundle_facet, 'fingerprints']
+
+
+@lru_cache(maxsize=None)
+def block_key_pattern(domain:str='info'):
+    """
+    This function returns a regular expression matching the keys of the blocks in a domain, built from the layout used by awsKeyProvider, with the pdb code and facet as named groups
+    """
+    template = awsKeyProvider().block_key('xpdbcodex', 'xfacetx', domain)
+    pattern = re.escape(template).replace('xpdbcodex', '(?P<pdb_code>[^/]+)').replace('xfacetx', '(?P<facet>[^/]+)')
+    return re.compile(f'^{pattern}$')
+
+
+def parse_block_key(key:str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    This function returns the pdb code and facet of a block key, or (None, None) if the key isn't the key of a block for a structure
+    """
+    match = block_key_pattern().match(key)
+    if match is None:
+        return None, None
+    return match.group('pdb_code'), match.group('facet')
+
+
+def compressible_key(key:str, prefixes:Optional[List]=None) -> bool:
+    """
+    This function returns whether the object stored at a key can be compressed, as it is only read through this package
+
+    Args:
+        key (str): the key of the block or file
+        prefixes (List): any further key prefixes which are safe to compress, from the 'compression_prefixes' in the AWS configuration, once their readers have moved onto this package
+
+    Returns:
+        bool: whether the object can be stored compressed
+    """
+    if key.startswith(tuple(storage_only_prefixes + (prefixes or []))):
+        return True
+    pdb_code, facet = parse_block_key(key)
+    return facet in storage_only_facets
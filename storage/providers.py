@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import read_through, write_through
+from .backends import default_max_connections
+from .context import active_context
+from .inventory import inventory_exists
+
+import contextvars
+
+
+class storageProvider():
+    """
+    The provider for the pipeline's steps and views, which reads and writes through the active run context if there is one, and through the process wide block cache if it is turned on
+    """
+    def __init__(self, aws_config:Dict):
+        self.aws_config = aws_config
+
+
+    def get(self, key:str, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        context = active_context()
+        if context is not None:
+            return context.get(key, data_format=data_format)
+        return read_through(self.aws_config, key, data_format=data_format)
+
+
+    def put(self, key:str, data, data_format:str='json') -> Tuple[Union[Dict, str, bytes, None], bool, Optional[List]]:
+        context = active_context()
+        if context is not None:
+            return context.put(key, data, data_format=data_format)
+        return write_through(self.aws_config, key, data, data_format=data_format)
+
+
+    def exists(self, key:str, data_format:str='json') -> bool:
+        """
+        This function checks whether a block or file is stored, from the active run context and the storage inventory without reading it, or by reading it if no inventory has been built
+
+        Args:
+            key (str): the key of the block or file
+            data_format (str): the format of the data e.g. 'json', 'cif', 'txt'
+
+        Returns:
+            bool: whether the block or file is stored
+        """
+        context = active_context()
+        if context is not None:
+            with context.lock:
+                if key in context.blocks:
+                    return True
+        exists = inventory_exists(key, self.aws_config)
+        if exists is None:
+            data, success, errors = self.get(key, data_format=data_format)
+            exists = success and data is not None
+        return exists
+
+
+    def workers(self, count:int, max_workers:Optional[int]=None) -> int:
+        """
+        This function returns the number of threads for a batch of reads or writes, bounded by the connection pool of the storage backend
+        """
+        if max_workers is None:
+            max_workers = self.aws_config.get('max_connections') or default_max_connections
+        return max(1, min(count, max_workers))
+
+
+    def run_many(self, function, arguments:List, max_workers:Optional[int]=None) -> List:
+        """
+        This function calls a function for each set of arguments at the same time, on a bounded pool of threads each running in a copy of the caller's context (so that the active run context is used), and returns the results in order
+        """
+        workers = self.workers(len(arguments), max_workers=max_workers)
+        if workers <= 1:
+            return [function(*argument) for argument in arguments]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, function, *argument) for argument in arguments]
+            return [future.result() for future in futures]
+
+
+    def get_many(self, keys:List, data_format:str='json', max_workers:Optional[int]=None) -> Dict:
+        """
+        This function reads several blocks or files at the same time
+
+        Args:
+            keys (List): the keys of the blocks or files
+            data_format (str): the format of the data e.g. 'json', 'cif', 'txt'
+            max_workers (int): the most reads to make at once, defaults to the size of the connection pool
+
+        Returns:
+            Dict: the (data, success, errors) for each key, keyed by key
+        """
+        keys = list(dict.fromkeys(keys))
+        results = self.run_many(self.get, [(key, data_format) for key in keys], max_workers=max_workers)
+        return dict(zip(keys, results))
+
+
+    def put_many(self, items:List, max_workers:Optional[int]=None) -> Dict:
+        """
+        This function writes several blocks or files at the same time
+
+        Args:
+            items (List): a list of (key, data, data_format) tuples, with different keys
+            max_workers (int): the most writes to make at once, defaults to the size of the connection pool
+
+        Returns:
+            Dict: the (serialised data, success, errors) for each key, keyed by key
+        """
+        results = self.run_many(self.put, items, max_workers=max_workers)
+        return {item[0]:result for item, result in zip(items, results)}
@@ -0,0 +1,109 @@
+from typing import Dict, Tuple
+
+from .backends import backend_key
+
+from collections import OrderedDict
+
+import threading
+
+
+# an approximation of the memory used by each atom of a parsed structure, along with its share of the residues and chains
+bytes_per_atom = 1500
+
+default_size = 256
+
+
+class structureCache():
+    """
+    A process wide store of parsed structures (Bio.PDB.Structure), keyed by the key and content hash of the file they were parsed from, which keeps the structures used most recently up to an approximate memory size (max_bytes)
+
+    Structures are checked out as copies, as some steps (e.g. alignment) move the atoms of the structures they load, so the stored structure is never changed.
+    """
+    def __init__(self, max_bytes:int=default_size * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits':0, 'misses':0, 'evictions':0}
+
+
+    def checkout(self, key:Tuple):
+        """
+        This function returns a copy of the structure stored for a key, if there is one
+
+        Args:
+            key (Tuple): the store, the key of the file and the hash of its content
+
+        Returns:
+            Bio.PDB.Structure: a copy of the structure, or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            structure = entry[0]
+        return structure.copy()
+
+
+    def set(self, key:Tuple, structure):
+        """
+        This function stores a structure, evicting the structures used least recently until it fits
+
+        Args:
+            key (Tuple): the store, the key of the file and the hash of its content
+            structure (Bio.PDB.Structure): the parsed structure, which mustn't be changed afterwards
+        """
+        size = sum(1 for atom in structure.get_atoms()) * bytes_per_atom
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            while self.entries and self.size + size > self.max_bytes:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= evicted[1]
+                self.stats['evictions'] += 1
+            self.entries[key] = (structure, size)
+            self.size += size
+
+
+    def clear(self):
+        """
+        This function removes all of the structures stored
+        """
+        with self.lock:
+            self.entries = OrderedDict()
+            self.size = 0
+
+
+    def report(self) -> Dict:
+        """
+        This function returns the number of structures stored, their approximate size, and the hits, misses and evictions so far
+        """
+        with self.lock:
+            return {'structures':len(self.entries), 'bytes':self.size, 'max_bytes':self.max_bytes, **self.stats}
+
+
+process_structures = structureCache()
+
+
+def configure_structure_cache(aws_config:Dict) -> structureCache:
+    """
+    This function sets the size of the process wide structure cache from the 'structure_cache_size' in the AWS configuration, in MB (0 turns it off)
+    """
+    size = aws_config.get('structure_cache_size', default_size)
+    max_bytes = int((size or 0) * 1024 * 1024)
+    if max_bytes != process_structures.max_bytes:
+        process_structures.max_bytes = max_bytes
+        process_structures.clear()
+    return process_structures
+
+
+def structure_cache_key(aws_config:Dict, key:str, identifier:str, digest:str) -> Tuple:
+    """
+    This function returns the key a parsed structure is stored under, so that a file which has been rewritten is parsed again
+    """
+    return (backend_key(aws_config), key, identifier, digest)
@@ -1,11 +1,21 @@
 from common.helpers import slugify
 from flask import Blueprint, current_app, request, redirect
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 from common.decorators import check_user, requires_privilege, templated
 from common.models import itemSet
 from common.forms import request_variables
 
+from storage import runContext
+
+from .workers import run_members, summarise_timings, execution_modes
+from .fingerprints import fingerprinted
+from .manifests import load_manifest, new_manifest, save_manifest, checkpoint_page, remaining_members
+from .jobs import jobs
+from .sets import error_set_context, error_set_slug, record_error_types, fetch_error_members, clear_resolved_errors
+from .paging import load_history, record_run, estimate_cost, adaptive_page_size, default_page_size
+from .lineage import plan_recomputation, group_plan, lineage_graph, downstream_steps
+
 
 # initial methods
 from .pipeline_actions import test, view, initialise
@@ -30,9 +40,17 @@ from .pipeline_actions import align_structures, peptide_neighbours, peptide_feat
 # indexing based methods
 from .pipeline_actions import index_to_algolia
 
+# all of the above in one run per structure
+from .fused import run_fused
+# independent steps at the same time, ordered by the facets they read and write
+from .scheduler import run_scheduled
+
+
+from functools import partial
 
 import logging
 import json
+import time
 
 
 structure_pipeline_views = Blueprint('structure_pipeline_views', __name__)
@@ -62,13 +80,15 @@ def process_errors(errors_dict, action_name):
 
 
 def store_error_sets(errors_dict, action_name):
-    context = 'errors'
+    context = error_set_context
     for error_type in errors_dict:
         set_title = f'{action_name} | {error_type}'
         set_description = 'Autogenerated error set from structure pipeline.'
-        set_slug = slugify(set_title)
+        set_slug = error_set_slug(action_name, error_type)
         members = errors_dict[error_type]
         itemset, success, errors = itemSet(set_slug, context).create_or_update(set_title, set_description, members, context)
+    # keep an index of the error sets for the action, so that they can be retried
+    record_error_types(action_name, list(errors_dict.keys()), current_app.config['AWS_CONFIG'])
 
 
 def roll_up_stats(errors_dict, members, success, action_name):
@@ -88,28 +108,30 @@ def roll_up_stats(errors_dict, members, success, action_name):
 
 pipeline_actions = {
     'class_i': {
-        'test':{'action':test, 'next':None, 'name':'Test', 'show_in_list':False, 'link':False},
-        'view':{'action':view, 'next':None, 'name':'View', 'show_in_list':False, 'link':False},
-        'initialise':{'action':initialise, 'name':'Initialise', 'show_in_list':False, 'link':False, 'next':'fetch_summary'},
-        'fetch_summary':{'action':fetch_summary_info, 'name': 'Fetch summary', 'show_in_list':False, 'link':False, 'next':'fetch_structure'},
-        'fetch_structure':{'action':get_pdbe_structures, 'name':'Fetch structure', 'show_in_list':False, 'link':False, 'next':'fetch_publications'},
-        'fetch_publications':{'action':fetch_publication_info, 'name': 'Fetch publications', 'show_in_list':False, 'link':False, 'next':'fetch_doi_url'},
-        'fetch_doi_url':{'action':fetch_doi_url, 'name': 'Fetch DOI url', 'show_in_list':False, 'link':False, 'next':'fetch_experiment'},
-        'fetch_experiment':{'action':fetch_experiment_info, 'name': 'Fetch experiment information', 'show_in_list':False, 'link':False, 'next':'assign_chains'},
-        'assign_chains':{'action':assign_chains, 'name': 'Assign chains', 'show_in_list':False, 'link':False, 'next':'assign_complex_type'},
-        'assign_complex_type':{'action':assign_complex_type, 'name': 'Assign complex type', 'show_in_list':False, 'link':False, 'next':'match_chains'},
-        'match_chains':{'action':match_chains, 'name': 'Match to MHC sequences', 'show_in_list':False, 'link':False, 'next':'match_peptide'},
-        'match_peptide':{'action':api_match_peptide, 'name': 'Match peptide', 'link':False, 'next':'map_pockets'},
-        'map_pockets':{'action':map_pockets, 'name': 'Map pockets', 'link':False, 'next':'align'},
-        'align': {'action':align_structures, 'name': 'Align structures', 'link':False, 'next':'peptide_neighbours'},
-        'peptide_neighbours': {'action':peptide_neighbours, 'name': 'Find peptide neighbours', 'link':False, 'next':'peptide_features'},
-        'peptide_features': {'action':peptide_features, 'name': 'Define peptide features', 'link':False, 'next':'extract_peptides'},
-        'extract_peptides': {'action':extract_peptides, 'name': 'Extract peptides', 'link':False, 'next':'extract_abds'},
-        'extract_abds': {'action':extract_abds, 'name': 'Extract antigen binding domains', 'link':False, 'next':'measure_peptide_angles'},
-        'measure_peptide_angles': {'action':measure_peptide_angles, 'name': 'Measure peptide angles', 'link':False, 'next':'measure_cleft_angles'},
-        'measure_cleft_angles': {'action':measure_cleft_angles, 'name': 'Measure cleft angles', 'link':False, 'next':'measure_distances'},
-        'measure_distances': {'action':measure_distances, 'name': 'Measure C alpha distances', 'link':False, 'next':'index_to_algolia'},
-        'index_to_algolia': {'action':index_to_algolia, 'name': 'Index to Algolia', 'link':False, 'next':'view'}
+        'test':{'action':test, 'next':None, 'name':'Test', 'show_in_list':False, 'link':False, 'execution':'thread'},
+        'view':{'action':view, 'next':None, 'name':'View', 'show_in_list':False, 'link':False, 'execution':'thread'},
+        'initialise':{'action':initialise, 'name':'Initialise', 'show_in_list':False, 'link':False, 'reads':['core'], 'writes':['core'], 'fingerprint':False, 'execution':'thread', 'next':'fetch_summary'},
+        'fetch_summary':{'action':fetch_summary_info, 'name': 'Fetch summary', 'show_in_list':False, 'link':False, 'reads':[], 'writes':['core.structure', 'core.pdb_title', 'core.assembly_count', 'core.unique_chain_count', 'core.unique_chain_count_name', 'core.chain_count', 'core.authors'], 'fingerprint':False, 'execution':'thread', 'next':'fetch_structure'},
+        'fetch_structure':{'action':get_pdbe_structures, 'name':'Fetch structure', 'show_in_list':False, 'link':False, 'reads':['core.assembly_count', 'core.assemblies'], 'writes':['core.assemblies'], 'execution':'thread', 'next':'fetch_publications'},
+        'fetch_publications':{'action':fetch_publication_info, 'name': 'Fetch publications', 'show_in_list':False, 'link':False, 'reads':[], 'writes':['core.publication', 'core.doi', 'core.associated_structures'], 'fingerprint':False, 'execution':'thread', 'next':'fetch_doi_url'},
+        'fetch_doi_url':{'action':fetch_doi_url, 'name': 'Fetch DOI url', 'show_in_list':False, 'link':False, 'reads':['core.doi'], 'writes':['core.resolved_doi_url'], 'execution':'thread', 'next':'fetch_experiment'},
+        'fetch_experiment':{'action':fetch_experiment_info, 'name': 'Fetch experiment information', 'show_in_list':False, 'link':False, 'reads':[], 'writes':['core.resolution', 'core.crystallography'], 'fingerprint':False, 'execution':'thread', 'next':'assign_chains'},
+        'assign_chains':{'action':assign_chains, 'name': 'Assign chains', 'show_in_list':False, 'link':False, 'reads':['core.peptide'], 'writes':['chains', 'core.peptide', 'core.organism'], 'execution':'thread', 'next':'assign_complex_type'},
+        'assign_complex_type':{'action':assign_complex_type, 'name': 'Assign complex type', 'show_in_list':False, 'link':False, 'reads':['core.unique_chain_count', 'chains'], 'writes':['core.complex'], 'execution':'thread', 'next':'match_chains'},
+        'match_chains':{'action':match_chains, 'name': 'Match to MHC sequences', 'show_in_list':False, 'link':False, 'reads':['core.organism', 'chains'], 'writes':['allele_match', 'core.class', 'core.classical', 'core.locus', 'core.allele', 'core.allele_group'], 'execution':'thread', 'next':'match_peptide'},
+        'match_peptide':{'action':api_match_peptide, 'name': 'Match peptide', 'link':False, 'reads':['core.peptide'], 'writes':['peptide_matches', 'core.peptide'], 'execution':'thread', 'next':'map_pockets'},
+        'map_pockets':{'action':map_pockets, 'name': 'Map pockets', 'link':False, 'reads':['core.organism', 'chains'], 'writes':['pockets'], 'execution':'thread', 'next':'align'},
+        'align': {'action':align_structures, 'name': 'Align structures', 'link':False, 'reads':['core.class', 'core.assemblies', 'chains'], 'writes':['aligned', 'core.aligned'], 'execution':'process', 'next':'peptide_neighbours'},
+        'peptide_neighbours': {'action':peptide_neighbours, 'name': 'Find peptide neighbours', 'link':False, 'reads':['core.complex', 'core.assemblies', 'chains'], 'writes':['peptide_neighbours'], 'execution':'process', 'next':'peptide_features'},
+        'peptide_features': {'action':peptide_features, 'name': 'Define peptide features', 'link':False, 'reads':['peptide_neighbours'], 'writes':['sets.features'], 'execution':'thread', 'next':'extract_peptides'},
+        'extract_peptides': {'action':extract_peptides, 'name': 'Extract peptides', 'link':False, 'reads':['aligned', 'chains'], 'writes':['peptide_structures'], 'execution':'process', 'next':'extract_abds'},
+        'extract_abds': {'action':extract_abds, 'name': 'Extract antigen binding domains', 'link':False, 'reads':['aligned', 'chains'], 'writes':['abd_structures'], 'execution':'process', 'next':'measure_peptide_angles'},
+        'measure_peptide_angles': {'action':measure_peptide_angles, 'name': 'Measure peptide angles', 'link':False, 'reads':['peptide_structures'], 'writes':['peptide_angles'], 'execution':'process', 'next':'measure_cleft_angles'},
+        'measure_cleft_angles': {'action':measure_cleft_angles, 'name': 'Measure cleft angles', 'link':False, 'reads':['aligned', 'chains'], 'writes':['peptide_contact_position_angles', 'cleft_torsion_angles'], 'execution':'process', 'next':'measure_distances'},
+        'measure_distances': {'action':measure_distances, 'name': 'Measure C alpha distances', 'link':False, 'reads':['aligned', 'chains'], 'writes':['c_alpha_distances'], 'execution':'process', 'next':'index_to_algolia'},
+        'index_to_algolia': {'action':index_to_algolia, 'name': 'Index to Algolia', 'link':False, 'reads':['core'], 'writes':[], 'execution':'thread', 'next':'view'},
+        'fused': {'action':run_fused, 'next':None, 'name':'Fused run (all steps)', 'show_in_list':False, 'link':False, 'execution':'thread'},
+        'scheduled': {'action':run_scheduled, 'next':None, 'name':'Scheduled run (independent steps concurrently)', 'show_in_list':False, 'link':False, 'execution':'thread'}
 
         # TODO re-implement/refactor these actions
 #        'peptide_positions': {'action':peptide_positions, 'blocks':['peptide_positions']},
@@ -121,6 +143,200 @@ pipeline_actions = {
 exclude_pdb_codes = ['5cnz','6la7','472d']
 
 
+def fetch_set_page(set_context:str, set_slug:str, page:Optional[int], page_size:int=default_page_size) -> Tuple[Dict, List, Dict]:
+    """
+    This function fetches a page of a set and separates the members to run from those which are excluded
+
+    Args:
+        set_context (str): the context for the set
+        set_slug (str): the slug for the set
+        page (int): the page number, or None for the first page
+        page_size (int): the number of members per page
+
+    Returns:
+        Dict: the itemset
+        List: the pdb codes to run the action on
+        Dict: errors for the excluded pdb codes, keyed by pdb code
+    """
+    members = []
+    errordict = {}
+    itemset, success, errors = itemSet(set_slug, set_context).get(page_number=page, page_size=page_size)
+    for pdb_code in itemset['members']:
+        pdb_code = pdb_code.lower()
+        if pdb_code in exclude_pdb_codes:
+            errordict[pdb_code] = ['file_excluded_obsolete']
+        else:
+            members.append(pdb_code)
+    return itemset, members, errordict
+
+
+def set_run_summary(mhc_class:str, route:str, itemset:Dict, set_context:str, set_slug:str, members:List, successes:List, errordict:Dict, skipped:Optional[List]=None) -> Dict:
+    """
+    This function rolls up the results of running an action over a page of a set into the variables for the structures/set template
+
+    Args:
+        mhc_class (str): a string describing the mhc_class that this set relates to, e.g. class_i
+        route (str): the route to the action e.g. fetch_structure
+        itemset (Dict): the page of the set
+        set_context (str): the context for the set
+        set_slug (str): the slug for the set
+        members (List): the pdb codes the action was run on
+        successes (List): the pdb codes for which the action returned data
+        errordict (Dict): a dictionary of error lists keyed by pdb code
+        skipped (List): the pdb codes for which the action was skipped as its inputs were unchanged
+
+    Returns:
+        Dict: the stats, errors and next action for the template
+    """
+    if pipeline_actions[mhc_class][route]['next']:
+        next = pipeline_actions[mhc_class][route]['next']
+        next_action = {
+            'name': pipeline_actions[mhc_class][next]['name'],
+            'slug': next
+        }
+    else:
+        next_action = None
+    action_name = pipeline_actions[mhc_class][route]['name']
+    stats, collated_errors = roll_up_stats(errordict, members, successes, action_name)
+    if skipped is None:
+        skipped = []
+    recomputed = [pdb_code for pdb_code in successes if pdb_code not in skipped]
+    stats['skipped'] = {'pdb_codes':skipped, 'count':len(skipped)}
+    stats['recomputed'] = {'pdb_codes':recomputed, 'count':len(recomputed)}
+    if len(errordict) > 0:
+        has_errors = True
+    else:
+        has_errors = False
+    return {
+        'stats':stats,
+        'collated_errors':collated_errors,
+        'has_errors':has_errors,
+        'name':action_name, 
+        'route':route,
+        'next_action':next_action, 
+        'mhc_class':mhc_class, 
+        'set_name': itemset['metadata']['title'],
+        'set_context': set_context,
+        'set_slug': set_slug,
+        'pagination':itemset['pagination']
+    }
+
+
+def resume_settings(mhc_class:str, route:str, set_context:str, set_slug:str, page:Optional[int], resume:bool, fresh:bool=False, page_size:int=default_page_size) -> Tuple[Dict, Optional[int]]:
+    """
+    This function loads the run manifest for an action over a set and works out which page to run
+
+    When resuming, the page comes from the cursor in the manifest (and the page size from the manifest). A fresh manifest replaces the stored one only when one is asked for, otherwise the page is added to the stored manifest (or a new one if there isn't one yet).
+
+    Args:
+        mhc_class (str): a string describing the mhc_class that this set relates to, e.g. class_i
+        route (str): the route to the action e.g. fetch_structure
+        set_context (str): the context for the set
+        set_slug (str): the slug for the set
+        page (int): the page number requested, or None for the first page
+        resume (bool): whether to continue from the manifest
+        fresh (bool): whether to start a fresh manifest, replacing the stored one
+        page_size (int): the number of members per page, for a new manifest
+
+    Returns:
+        Dict: the manifest
+        int: the page number to run
+    """
+    aws_config = current_app.config['AWS_CONFIG']
+    if fresh:
+        manifest = new_manifest(mhc_class, route, set_context, set_slug, page_size=page_size)
+        save_manifest(manifest, aws_config)
+    else:
+        manifest = load_manifest(mhc_class, route, set_context, set_slug, aws_config, page_size=page_size)
+    if resume:
+        page = manifest['cursor']['page']
+    return manifest, page
+
+
+def checkpoint_set_page(manifest:Dict, itemset:Dict, page:Optional[int], members:List, successes:List, errordict:Dict, skipped:Optional[List]=None) -> Dict:
+    """
+    This function records the outcome of running an action on a page of a set in the stored run manifest, see manifests.checkpoint_page
+
+    Args:
+        manifest (Dict): the manifest the page was started with
+        itemset (Dict): the page of the set
+        page (int): the page number, or None for the first page
+        members (List): the pdb codes the action was run on
+        successes (List): the pdb codes for which the action returned data
+        errordict (Dict): a dictionary of error lists keyed by pdb code
+        skipped (List): the pdb codes for which the action was skipped as its inputs were unchanged
+
+    Returns:
+        Dict: a summary of the manifest for the template
+    """
+    if page is None:
+        page = 1
+    last_page = len(itemset['members']) < manifest['page_size']
+    manifest = checkpoint_page(manifest, page, members, successes, errordict, current_app.config['AWS_CONFIG'], skipped=skipped, last_page=last_page)
+    return {
+        'status':manifest['status'],
+        'cursor':manifest['cursor'],
+        'completed':len(manifest['completed']),
+        'errors':len(manifest['errors']),
+        'updated':manifest['updated']
+    }
+
+
+def page_settings(mhc_class:str, route:str, variables:Dict, max_workers:int, adaptive:bool=True) -> Dict:
+    """
+    This function decides how many members of a set to run an action on in one request
+
+    The page is sized to fit the PIPELINE_PAGE_BUDGET setting in the app config (seconds of wall time, defaulting to 20), using an estimate of the wall time per structure from the recent runs of the action. A 'page_size' request variable overrides this, so that the following steps can run over the same members.
+
+    Args:
+        mhc_class (str): a string describing the mhc_class that this set relates to, e.g. class_i
+        route (str): the route to the action e.g. fetch_structure
+        variables (Dict): the request variables
+        max_workers (int): the size of the worker pool
+        adaptive (bool): whether to size the page from the run history, otherwise the default page size is used
+
+    Returns:
+        Dict: the page size, the estimated seconds per structure, the budget and whether the page size was chosen adaptively
+    """
+    budget = current_app.config.get('PIPELINE_PAGE_BUDGET', 20)
+    paging = {'page_size':default_page_size, 'estimate':None, 'budget':budget, 'adaptive':False}
+    if variables.get('page_size') is not None:
+        paging['page_size'] = int(variables['page_size'])
+    elif adaptive:
+        runs = load_history(mhc_class, route, current_app.config['AWS_CONFIG'])
+        paging['estimate'] = estimate_cost(runs, workers=max_workers)
+        paging['page_size'] = adaptive_page_size(paging['estimate'], budget)
+        paging['adaptive'] = True
+    return paging
+
+
+def execution_settings(pipeline_action:Dict, variables:Dict) -> Tuple[str, int]:
+    """
+    This function decides how the members of a page of a set should be run for a pipeline action
+
+    The pool size comes from the PIPELINE_WORKERS setting in the app config (defaulting to 1, i.e. serial), and can be overridden with a 'workers' request variable. 
+    
+    The kind of pool comes from the 'execution' key of the pipeline action, and can be overridden with an 'execution' request variable.
+
+    Args:
+        pipeline_action (Dict): the entry in the pipeline_actions dictionary for the action
+        variables (Dict): the request variables
+
+    Returns:
+        str: the execution mode, one of 'serial', 'thread' or 'process'
+        int: the maximum number of workers
+    """
+    max_workers = current_app.config.get('PIPELINE_WORKERS', 1)
+    if variables.get('workers') is not None:
+        max_workers = int(variables['workers'])
+    execution = pipeline_action.get('execution', 'thread')
+    if variables.get('execution') in execution_modes:
+        execution = variables['execution']
+    if max_workers <= 1:
+        execution = 'serial'
+    return execution, max_workers
+
+
 @structure_pipeline_views.get('/')
 @check_user
 @requires_privilege('users')
@@ -200,53 +416,235 @@ def pipeline_set_handler(userobj, mhc_class, route, set_context, set_slug):
         Dict: a dictionary containing the user object, data aboutt the action performed and the next action in the pipeline
 
     """
-    variables = request_variables(None, ['page'])
+    variables = request_variables(None, ['page', 'page_size', 'workers', 'execution', 'force', 'resume', 'fresh'])
     if 'page' in variables:
         page = int(variables['page'])
     else:
         page = None
-    successes = []
-    members = []
-    errordict = {}
-    itemset, success, errors = itemSet(set_slug, set_context).get(page_number=page, page_size=100)
-    for pdb_code in itemset['members']:
-        pdb_code = pdb_code.lower()
-        if pdb_code in exclude_pdb_codes:
-            errordict[pdb_code] = ['file_excluded_obsolete']
-        else:
-            members.append(pdb_code)
-            data, success, errors = pipeline_actions[mhc_class][route]['action'](pdb_code, current_app.config['AWS_CONFIG'])
-            if data:
-                successes.append(pdb_code)
-            if errors:
-                errordict[pdb_code] = errors
-    if pipeline_actions[mhc_class][route]['next']:
-        next = pipeline_actions[mhc_class][route]['next']
-        next_action = {
-            'name': pipeline_actions[mhc_class][next]['name'],
-            'slug': next
-        }
+    force = variables.get('force') in ['true', 'True', '1']
+    resume = variables.get('resume') in ['true', 'True', '1']
+    fresh = variables.get('fresh') in ['true', 'True', '1']
+    execution, max_workers = execution_settings(pipeline_actions[mhc_class][route], variables)
+    paging = page_settings(mhc_class, route, variables, max_workers)
+    manifest, page = resume_settings(mhc_class, route, set_context, set_slug, page, resume, fresh=fresh, page_size=paging['page_size'])
+    paging['page_size'] = manifest['page_size']
+    itemset, members, errordict = fetch_set_page(set_context, set_slug, page, page_size=paging['page_size'])
+    if resume:
+        members = remaining_members(manifest, members)
+    start = time.perf_counter()
+    action = fingerprinted(pipeline_actions[mhc_class][route], route)
+    # a read-through cache of the JSON blocks for the run, written straight through to S3 (steps run in a process pool get one per structure, see run_members)
+    with runContext(current_app.config['AWS_CONFIG'], defer_writes=False, cache_formats=['json'], coalesce_updates=True) as context:
+        successes, member_errors, timings, skipped = run_members(action, members, current_app.config['AWS_CONFIG'], execution=execution, max_workers=max_workers, force=force)
+    errordict.update(member_errors)
+    response = set_run_summary(mhc_class, route, itemset, set_context, set_slug, members, successes, errordict, skipped=skipped)
+    response['manifest'] = checkpoint_set_page(manifest, itemset, page, members, successes, errordict, skipped=skipped)
+    response['userobj'] = userobj
+    response['execution'] = {'mode':execution, 'workers':max_workers}
+    response['timings'] = summarise_timings(timings, time.perf_counter() - start)
+    record_run(mhc_class, route, len(members), response['timings']['wall_time'], execution, max_workers, current_app.config['AWS_CONFIG'])
+    response['paging'] = paging
+    response['cache'] = context.stats
+    return response
+
+
+@structure_pipeline_views.get('/<string:mhc_class>/<string:route>/retry')
+@requires_privilege('users')
+@templated('structures/set')
+def pipeline_retry_handler(userobj, mhc_class, route):
+    """
+    This handler re-runs a structure pipeline action only on the members of its autogenerated error sets ('<action> | <error>')
+
+    The members which now succeed are removed from the error sets, so repeating the request works through the remaining failures a page at a time.
+
+    Args: 
+        userobj (Dict): a dictionary describing the currently logged in user with the correct privileges
+        mhc_class (str): a string describing the mhc_class that this set relates to, e.g. class_i
+        route (str): the route to the action e.g. fetch_structure. This is the key in the pipeline_actions dictionary for that action
+
+    Returns:
+        Dict: the same dictionary as the pipeline_set_handler, along with the members removed from each error set
+
+    """
+    variables = request_variables(None, ['error_types', 'page_size', 'workers', 'execution', 'force'])
+    force = variables.get('force') in ['true', 'True', '1']
+    error_types = variables['error_types'].split(',') if variables.get('error_types') else None
+    aws_config = current_app.config['AWS_CONFIG']
+    step = pipeline_actions[mhc_class][route]
+    execution, max_workers = execution_settings(step, variables)
+    paging = page_settings(mhc_class, route, variables, max_workers)
+    failing, by_error = fetch_error_members(step['name'], aws_config, error_types=error_types)
+    members = [pdb_code for pdb_code in failing if pdb_code not in exclude_pdb_codes][:paging['page_size']]
+    start = time.perf_counter()
+    with runContext(aws_config, defer_writes=False, cache_formats=['json'], coalesce_updates=True) as context:
+        successes, errordict, timings, skipped = run_members(fingerprinted(step, route), members, aws_config, execution=execution, max_workers=max_workers, force=force)
+    itemset = {
+        'metadata':{'title':f'Retry of errors ({", ".join(by_error.keys())})'},
+        'pagination':{'current_page':1},
+        'members':members
+    }
+    response = set_run_summary(mhc_class, route, itemset, error_set_context, None, members, successes, errordict, skipped=skipped)
+    response['next_action'] = None
+    response['resolved'] = clear_resolved_errors(step['name'], by_error, members, errordict)
+    response['remaining'] = len(failing) - len(members)
+    response['userobj'] = userobj
+    response['execution'] = {'mode':execution, 'workers':max_workers}
+    response['timings'] = summarise_timings(timings, time.perf_counter() - start)
+    response['paging'] = paging
+    response['cache'] = context.stats
+    return response
+
+
+@structure_pipeline_views.post('/<string:mhc_class>/<string:route>/set/<path:set_context>/<path:set_slug>')
+@requires_privilege('users')
+def pipeline_set_job_handler(userobj, mhc_class, route, set_context, set_slug):
+    """
+    This handler queues a structure pipeline action on a page of a set of structures, to be run by background workers
+
+    Args: 
+        userobj (Dict): a dictionary describing the currently logged in user with the correct privileges
+        mhc_class (str): a string describing the mhc_class that this set relates to, e.g. class_i
+        route (str): the route to the action e.g. fetch_structure. This is the key in the pipeline_actions dictionary for that action
+        set_context (str): the context for the set
+        set_slug (str): the slug for the set 
+
+    Returns:
+        Dict: a dictionary containing the job id and the urls for its progress and its completed stats
+
+    """
+    variables = request_variables(None, ['page', 'page_size', 'force', 'resume', 'fresh'])
+    if variables.get('page') is not None:
+        page = int(variables['page'])
     else:
-        next_action = None
-    action_name = pipeline_actions[mhc_class][route]['name']
-    stats, collated_errors = roll_up_stats(errordict, members, successes, action_name)
-    if len(errordict) > 0:
-        has_errors = True
+        page = None
+    force = variables.get('force') in ['true', 'True', '1']
+    resume = variables.get('resume') in ['true', 'True', '1']
+    fresh = variables.get('fresh') in ['true', 'True', '1']
+    # queued jobs aren't bound by the time budget for a request, so aren't sized adaptively
+    paging = page_settings(mhc_class, route, variables, jobs.max_workers, adaptive=False)
+    manifest, page = resume_settings(mhc_class, route, set_context, set_slug, page, resume, fresh=fresh, page_size=paging['page_size'])
+    paging['page_size'] = manifest['page_size']
+    itemset, members, excluded = fetch_set_page(set_context, set_slug, page, page_size=paging['page_size'])
+    if resume:
+        members = remaining_members(manifest, members)
+
+    def on_complete(job):
+        result = set_run_summary(mhc_class, route, itemset, set_context, set_slug, job['members'], job['successes'], job['errors'], skipped=job['skipped'])
+        result['manifest'] = checkpoint_set_page(manifest, itemset, page, job['members'], job['successes'], job['errors'], skipped=job['skipped'])
+        result['paging'] = paging
+        return result
+
+    metadata = {'mhc_class':mhc_class, 'route':route, 'set_context':set_context, 'set_slug':set_slug, 'page':page, 'page_size':paging['page_size'], 'force':force, 'resume':resume, 'fresh':fresh}
+    jobs.max_workers = current_app.config.get('PIPELINE_JOB_WORKERS', jobs.max_workers)
+    action = fingerprinted(pipeline_actions[mhc_class][route], route)
+    job_id = jobs.enqueue(current_app._get_current_object(), action, members, current_app.config['AWS_CONFIG'], metadata, excluded=excluded, on_complete=on_complete, force=force)
+    return {
+        'job_id':job_id,
+        'progress_url':f'/structures/jobs/{job_id}',
+        'complete_url':f'/structures/jobs/{job_id}/complete'
+    }, 202
+
+
+@structure_pipeline_views.post('/<string:mhc_class>/recompute/<string:route>/<path:set_context>/<path:set_slug>')
+@requires_privilege('users')
+def pipeline_recompute_handler(userobj, mhc_class, route, set_context, set_slug):
+    """
+    This handler queues the minimal recomputations downstream of a step whose output has changed, for a page of a set of structures
+
+    Only the downstream steps which are stale for each structure are run (see lineage.plan_recomputation), with the structures needing the same steps queued together as one job.
+
+    Args: 
+        userobj (Dict): a dictionary describing the currently logged in user with the correct privileges
+        mhc_class (str): a string describing the mhc_class that this set relates to, e.g. class_i
+        route (str): the route to the step whose output has changed e.g. assign_chains
+        set_context (str): the context for the set
+        set_slug (str): the slug for the set 
+
+    Returns:
+        Dict: a dictionary containing the downstream steps, the plan for each structure and the queued jobs
+
+    """
+    if route not in pipeline_actions[mhc_class] or 'writes' not in pipeline_actions[mhc_class][route]:
+        return {'errors':['no_such_step']}, 404
+    variables = request_variables(None, ['page', 'page_size', 'dry_run'])
+    if variables.get('page') is not None:
+        page = int(variables['page'])
     else:
-        has_errors = False
+        page = None
+    paging = page_settings(mhc_class, route, variables, jobs.max_workers, adaptive=False)
+    itemset, members, excluded = fetch_set_page(set_context, set_slug, page, page_size=paging['page_size'])
+    aws_config = current_app.config['AWS_CONFIG']
+    actions = pipeline_actions[mhc_class]
+    downstream = downstream_steps(actions, route)
+    lineage = lineage_graph(actions)
+    plan = plan_recomputation(actions, route, members, aws_config)
+    queued = []
+    if variables.get('dry_run') not in ['true', 'True', '1']:
+        jobs.max_workers = current_app.config.get('PIPELINE_JOB_WORKERS', jobs.max_workers)
+        for routes, pdb_codes in group_plan(plan).items():
+            action = partial(run_fused, mhc_class=mhc_class, routes=list(routes))
+            metadata = {'mhc_class':mhc_class, 'route':'fused', 'recompute_after':route, 'routes':list(routes), 'set_context':set_context, 'set_slug':set_slug, 'page':page}
+            job_id = jobs.enqueue(current_app._get_current_object(), action, pdb_codes, aws_config, metadata)
+            queued.append({'job_id':job_id, 'routes':list(routes), 'members':pdb_codes, 'progress_url':f'/structures/jobs/{job_id}'})
     return {
-        'stats':stats,
-        'collated_errors':collated_errors,
-        'has_errors':has_errors,
-        'name':action_name, 
-        'next_action':next_action, 
-        'mhc_class':mhc_class, 
-        'userobj': userobj,
-        'set_name': itemset['metadata']['title'],
-        'set_context': set_context,
-        'set_slug': set_slug,
-        'pagination':itemset['pagination']
-    }
+        'recompute_after':route,
+        'downstream':downstream,
+        'lineage':{downstream_route:lineage[downstream_route] for downstream_route in downstream},
+        'plan':plan,
+        'jobs':queued
+    }, 202
+
+
+@structure_pipeline_views.get('/jobs/<string:job_id>')
+@requires_privilege('users')
+def pipeline_job_progress_handler(userobj, job_id):
+    """
+    This handler returns the progress of a queued set action as JSON
+
+    Args: 
+        userobj (Dict): a dictionary describing the currently logged in user with the correct privileges
+        job_id (str): the id of the job
+
+    Returns:
+        Dict: a dictionary of the status of the job and its done/failed/remaining counts
+
+    """
+    progress = jobs.progress(job_id)
+    if progress is None:
+        return {'job_id':job_id, 'errors':['no_such_job']}, 404
+    return progress
+
+
+@structure_pipeline_views.get('/jobs/<string:job_id>/complete')
+@requires_privilege('users')
+@templated('structures/set')
+def pipeline_job_complete_handler(userobj, job_id):
+    """
+    This handler shows the stats for a queued set action once it is complete
+
+    Args: 
+        userobj (Dict): a dictionary describing the currently logged in user with the correct privileges
+        job_id (str): the id of the job
+
+    Returns:
+        Dict: the same dictionary as the pipeline_set_handler, or the progress of the job as JSON if it is not yet complete, has no summary (e.g. a recomputation) or its summary couldn't be built
+
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return {'job_id':job_id, 'errors':['no_such_job']}, 404
+    if job['status'] != 'complete':
+        return jobs.progress(job_id), 202
+    if job['result'] is None:
+        return jobs.progress(job_id)
+    if 'errors' in job['result']:
+        return {**jobs.progress(job_id), 'errors':job['result']['errors']}, 500
+    response = dict(job['result'])
+    response['userobj'] = userobj
+    response['execution'] = {'mode':'job', 'workers':jobs.max_workers}
+    response['timings'] = summarise_timings(job['timings'], job['wall_time'])
+    response['cache'] = job['cache']
+    return response
 
 
 @structure_pipeline_views.get('/<string:mhc_class>/<string:route>/<string:pdb_code>')
@@ -0,0 +1,112 @@
+from functools import partial
+
+import argparse
+import sys
+
+from settings import create_pipeline_app, settings_file
+from storage import replay_journal, build_inventory, save_inventory
+
+from .batch import fetch_set_members, read_pdb_codes, run_chain, run_fused_chain, run_scheduled_chain, run_recomputation, run_retry, run_compression_migration, run_parser_benchmark, print_parser_benchmark, run_storage_benchmark, print_storage_benchmark, print_report, print_compression_report, print_storage_report, console
+from .workers import execution_modes
+from .alignment import run_batch_alignment, print_alignment_summary
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(prog='python -m structure_pipeline', description='Run a chain of structure pipeline steps over a set, a file of pdb codes or a single structure')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--set', help='a set as context/slug e.g. search_query/class_i_pdbefold_query')
+    source.add_argument('--file', help='a file of pdb codes, one per line or comma separated')
+    source.add_argument('--pdb-code', help='a single pdb code')
+    source.add_argument('--retry', help='re-run this step only on the members of its error sets e.g. align')
+    source.add_argument('--build-inventory', action='store_true', help='list the bucket and save the storage inventory used to check whether blocks and files exist')
+    source.add_argument('--replay-journal', action='store_true', help='write the blocks saved to the local journal after failed writes to S3')
+    parser.add_argument('--mhc-class', default='class_i', help='the class of MHC molecule (default class_i)')
+    parser.add_argument('--start', default='initialise', help='the first step to run (default initialise)')
+    parser.add_argument('--end', default=None, help='the last step to run (default the end of the pipeline)')
+    parser.add_argument('--workers', type=int, default=1, help='the size of the worker pool (default 1, serial)')
+    parser.add_argument('--execution', choices=execution_modes, default=None, help='override the execution mode declared by each step')
+    parser.add_argument('--force', action='store_true', help='passed through to every step')
+    parser.add_argument('--fused', action='store_true', help='run the whole chain for each structure in turn, sharing state between the steps')
+    parser.add_argument('--scheduled', action='store_true', help='run the steps for each structure in the order given by the facets they read and write, with independent steps at the same time')
+    parser.add_argument('--step-workers', type=int, default=4, help='the number of steps to run at the same time for each structure with --scheduled (default 4)')
+    parser.add_argument('--resume', action='store_true', help='with --set, continue from the run manifests of an earlier run rather than starting again')
+    parser.add_argument('--recompute-after', default=None, help='recompute only the stale steps downstream of this step e.g. assign_chains or align')
+    parser.add_argument('--compress-existing', action='store_true', help='compress the blocks and files already stored for the structures, with the codecs in the COMPRESSION settings, rather than running steps')
+    parser.add_argument('--benchmark-parsers', action='store_true', help='time parsing the split CIF files of the structures with MMCIFParser and the streaming _atom_site parser, rather than running steps')
+    parser.add_argument('--benchmark-storage', action='store_true', help='time reading the core blocks of the structures with a storage client per read and with a shared client, on a pool of --workers threads, rather than running steps')
+    parser.add_argument('--batch-align', action='store_true', help='align every assembly of the structures against the canonical structure, loaded once, and store a summary of the RMSDs, rather than running steps')
+    parser.add_argument('--dry-run', action='store_true', help='with --recompute-after, only print the steps which would be recomputed')
+    parser.add_argument('--error-types', default=None, help='with --retry, a comma separated list of the error types to retry (default all)')
+    parser.add_argument('--config', default=settings_file, help='the path to the settings file (default config.toml)')
+    parser.add_argument('--local-s3', action='store_true', default=None, help='use the local (MinIO) S3 settings')
+    parser.add_argument('--local-storage', default=None, help='read and write the blocks and files in this directory rather than S3')
+    return parser.parse_args(arguments)
+
+
+def run_structures(args, aws_config):
+    set_context = set_slug = None
+    if args.set:
+        set_context, set_slug = args.set.split('/', 1)
+        pdb_codes = fetch_set_members(set_context, set_slug)
+    elif args.file:
+        pdb_codes = read_pdb_codes(args.file)
+    else:
+        pdb_codes = [args.pdb_code.lower()]
+    console.print(f'{len(pdb_codes)} structures to process')
+    if args.compress_existing:
+        migrated = run_compression_migration(args.mhc_class, pdb_codes, aws_config)
+        console.print(f"{migrated['compressed']} objects compressed, {migrated['skipped']} skipped, {len(migrated['failed'])} failed, {migrated['bytes_saved']} bytes saved")
+        return {}
+    if args.benchmark_parsers:
+        print_parser_benchmark(run_parser_benchmark(pdb_codes, aws_config))
+        return {}
+    if args.benchmark_storage:
+        print_storage_benchmark(run_storage_benchmark(pdb_codes, aws_config, max_workers=max(args.workers, 1)))
+        return {}
+    if args.batch_align:
+        aligned = run_batch_alignment(args.mhc_class, pdb_codes, aws_config, max_workers=args.workers, execution=args.execution, force=args.force, set_context=set_context, set_slug=set_slug)
+        if aligned:
+            print_alignment_summary(aligned['summary'])
+            return aligned['report']
+        return {}
+    if args.recompute_after:
+        return run_recomputation(args.mhc_class, args.recompute_after, pdb_codes, aws_config, max_workers=args.workers, execution=args.execution, force=args.force, dry_run=args.dry_run)
+    if args.scheduled:
+        run = partial(run_scheduled_chain, step_workers=args.step_workers)
+    elif args.fused:
+        run = run_fused_chain
+    else:
+        run = run_chain
+    return run(args.mhc_class, pdb_codes, aws_config, start=args.start, end=args.end, max_workers=args.workers, execution=args.execution, force=args.force, set_context=set_context, set_slug=set_slug, resume=args.resume)
+
+
+def main(arguments=None):
+    args = parse_arguments(arguments)
+    app = create_pipeline_app(args.config, use_local_s3=args.local_s3)
+    if args.local_storage:
+        app.config['AWS_CONFIG']['storage_backend'] = 'local'
+        app.config['AWS_CONFIG']['local_storage_path'] = args.local_storage
+    if args.replay_journal:
+        replayed = replay_journal(app.config['AWS_CONFIG'])
+        console.print(f'{replayed["replayed"]} writes replayed, {len(replayed["failed"])} failed')
+        return 0 if len(replayed['failed']) == 0 else 1
+    if args.build_inventory:
+        inventory = build_inventory(app.config['AWS_CONFIG'])
+        console.print(f"{inventory['objects']} objects for {inventory['structures']} structures, {inventory['bytes']} bytes")
+        return 0 if inventory['saved'] else 1
+    with app.app_context():
+        if args.retry:
+            error_types = args.error_types.split(',') if args.error_types else None
+            report = run_retry(args.mhc_class, args.retry, app.config['AWS_CONFIG'], error_types=error_types, max_workers=args.workers, execution=args.execution, force=args.force)
+        else:
+            report = run_structures(args, app.config['AWS_CONFIG'])
+    save_inventory(app.config['AWS_CONFIG'])
+    if report:
+        print_report(report)
+    print_compression_report()
+    print_storage_report()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+from typing import Dict, List, Optional
+
+from rich.table import Table
+
+from storage import storageProvider
+
+from .batch import run_step, console
+from .pipeline_actions.align_structures import canonical_reference, batch_align_structures, start_id, end_id
+
+import datetime
+import logging
+import numpy as np
+
+
+def alignment_summary_key(mhc_class:str, set_context:Optional[str], set_slug:Optional[str]) -> str:
+    """
+    This function returns the key of the RMSD summary block for a batch alignment of a set, or of the latest batch alignment of a list of structures
+    """
+    return f'pipeline/alignment/{mhc_class}/{set_context or "runs"}/{set_slug or "latest"}.json'
+
+
+def summarise_alignments(outputs:Dict, pdb_codes:List, outlier_factor:float=1.5, bins:int=20) -> Dict:
+    """
+    This function summarises the RMSDs of the assemblies aligned against the canonical structure, and the reasons the others weren't aligned
+
+    Outliers are the assemblies with an RMSD more than outlier_factor times the interquartile range above the upper quartile.
+
+    Args:
+        outputs (Dict): the output of batch_align_structures for each structure, keyed by pdb code
+        pdb_codes (List): the pdb codes of the structures
+        outlier_factor (float): the multiple of the interquartile range above the upper quartile for an outlier
+        bins (int): the number of bins in the histogram of RMSDs
+
+    Returns:
+        Dict: the summary, with the 'rmsd' distribution, the 'outliers' and the 'failures' grouped by reason
+    """
+    rmsds = []
+    identifiers = []
+    failures = {}
+    for pdb_code in pdb_codes:
+        output = outputs.get(pdb_code)
+        if not output:
+            failures.setdefault('unable_to_align_structure', []).append(pdb_code)
+            continue
+        alignments = output.get('alignments') or {}
+        if len(alignments) == 0:
+            failures.setdefault('no_chains_to_align', []).append(pdb_code)
+        for assembly_id in alignments:
+            identifier = f'{pdb_code}_{assembly_id}'
+            if 'rmsd' in alignments[assembly_id]:
+                rmsds.append(alignments[assembly_id]['rmsd'])
+                identifiers.append(identifier)
+            else:
+                failures.setdefault(alignments[assembly_id]['error'], []).append(identifier)
+    summary = {
+        'created':datetime.datetime.now().isoformat(),
+        'start':start_id,
+        'end':end_id,
+        'structures':len(pdb_codes),
+        'aligned':len(rmsds),
+        'rmsd':None,
+        'outliers':[],
+        'failures':{reason:{'count':len(failures[reason]), 'members':failures[reason]} for reason in sorted(failures)}
+    }
+    if len(rmsds) > 0:
+        values = np.array(rmsds)
+        lower_quartile, median, upper_quartile = np.percentile(values, [25, 50, 75])
+        threshold = upper_quartile + outlier_factor * (upper_quartile - lower_quartile)
+        counts, edges = np.histogram(values, bins=bins)
+        summary['rmsd'] = {
+            'mean':float(np.mean(values)),
+            'standard_deviation':float(np.std(values)),
+            'min':float(np.min(values)),
+            'lower_quartile':float(lower_quartile),
+            'median':float(median),
+            'upper_quartile':float(upper_quartile),
+            'max':float(np.max(values)),
+            'histogram':{'edges':[float(edge) for edge in edges], 'counts':[int(count) for count in counts]}
+        }
+        summary['outlier_threshold'] = float(threshold)
+        summary['outliers'] = sorted([{'identifier':identifier, 'rmsd':rmsd} for identifier, rmsd in zip(identifiers, rmsds) if rmsd > threshold], key=lambda outlier: -outlier['rmsd'])
+    return summary
+
+
+def run_batch_alignment(mhc_class:str, pdb_codes:List, aws_config:Dict, max_workers:int=1, execution:Optional[str]=None, force:bool=False, set_context:Optional[str]=None, set_slug:Optional[str]=None) -> Dict:
+    """
+    This function aligns every assembly of every structure against the canonical structure, which is loaded and has its C alpha coordinates extracted once, rather than once per structure, and stores a summary of the RMSDs
+
+    The aligned structures and the aligned block for each structure are written as by the align step.
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        pdb_codes (List): the pdb codes of the structures
+        aws_config (Dict): the configuration details for AWS for the current app
+        max_workers (int): the size of the worker pool, a value of 1 runs serially
+        execution (str): one of 'serial', 'thread' or 'process' (the default), processes forked from this one start with the canonical structure loaded
+        force (bool): passed through to align_structures
+        set_context (str): the context of the set the structures come from, for the key of the summary
+        set_slug (str): the slug of the set the structures come from
+
+    Returns:
+        Dict: the stats, errors and timings for the alignment keyed by 'batch_align', and the RMSD summary
+    """
+    if canonical_reference(aws_config) is None:
+        logging.warn('UNABLE TO LOAD THE CANONICAL STRUCTURE')
+        return {}
+    outputs = {}
+    step = run_step(batch_align_structures, 'Batch align structures', pdb_codes, aws_config, execution=execution or 'process', max_workers=max_workers, force=force, outputs=outputs)
+    summary = summarise_alignments(outputs, pdb_codes)
+    summary['set_context'] = set_context
+    summary['set_slug'] = set_slug
+    payload, success, errors = storageProvider(aws_config).put(alignment_summary_key(mhc_class, set_context, set_slug), summary)
+    if not success:
+        logging.warn('UNABLE TO SAVE THE ALIGNMENT SUMMARY')
+    return {'report':{'batch_align':step}, 'summary':summary}
+
+
+def print_alignment_summary(summary:Dict):
+    """
+    This function prints the RMSD distribution, the outliers and the failures by reason of a batch alignment
+    """
+    console.print(f"{summary['aligned']} assemblies of {summary['structures']} structures aligned on residues {summary['start']}-{summary['end']}")
+    if summary['rmsd'] is not None:
+        rmsd = summary['rmsd']
+        console.print(f"RMSD: mean {round(rmsd['mean'], 3)}, median {round(rmsd['median'], 3)}, quartiles {round(rmsd['lower_quartile'], 3)}-{round(rmsd['upper_quartile'], 3)}, range {round(rmsd['min'], 3)}-{round(rmsd['max'], 3)}")
+        console.print(f"{len(summary['outliers'])} outliers above {round(summary['outlier_threshold'], 3)}")
+        for outlier in summary['outliers'][:10]:
+            console.print(f"  {outlier['identifier']} {round(outlier['rmsd'], 3)}")
+    if summary['failures']:
+        table = Table(title='Not aligned')
+        for column in ['Reason', 'Count', 'Examples']:
+            table.add_column(column)
+        for reason in summary['failures']:
+            table.add_row(reason, str(summary['failures'][reason]['count']), ', '.join(summary['failures'][reason]['members'][:5]))
+        console.print(table)
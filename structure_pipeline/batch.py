@@ -0,0 +1,512 @@
+from typing import Callable, Dict, List, Optional
+
+from Bio.PDB import MMCIFParser
+from io import StringIO
+from rich.console import Console
+from rich.table import Table
+
+from common.providers import awsKeyProvider
+
+from storage import runContext, storageProvider, storage_backend, reset_backends, fetch_core, migrate_keys, compression_report, backend_stats, process_structures, atom_table, parse_atom_site
+
+from . import pipeline_actions, exclude_pdb_codes, roll_up_stats
+from .sets import fetch_set_members, fetch_error_members, clear_resolved_errors
+from .workers import run_members, summarise_timings, execution_modes, build_chain
+from .fused import run_fused
+from .scheduler import run_scheduled
+from .fingerprints import fingerprinted
+from .lineage import plan_recomputation, group_plan
+from .manifests import load_manifest, new_manifest, save_manifest, record_members, advance_cursor, remaining_members
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import logging
+import numpy as np
+import time
+
+
+console = Console()
+
+
+def read_pdb_codes(filename:str) -> List:
+    """
+    This function reads pdb codes from a text file, either one per line or separated by commas/whitespace
+
+    Args:
+        filename (str): the path to the file
+
+    Returns:
+        List: the pdb codes in the file
+    """
+    with open(filename, 'r') as pdb_code_file:
+        text = pdb_code_file.read()
+    return [pdb_code.strip().lower() for pdb_code in text.replace(',', ' ').split() if len(pdb_code.strip()) > 0]
+
+
+def open_manifest(mhc_class:str, route:str, set_context:Optional[str], set_slug:Optional[str], aws_config:Dict, resume:bool=False) -> Optional[Dict]:
+    """
+    This function returns the run manifest for a step over a set, continuing the stored one when resuming and starting a fresh one otherwise
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        route (str): the route of the step e.g. 'align'
+        set_context (str): the context of the set, or None if the structures don't come from a set
+        set_slug (str): the slug of the set
+        aws_config (Dict): the configuration details for AWS for the current app
+        resume (bool): whether to continue from the stored manifest
+
+    Returns:
+        Dict: the manifest, or None if the structures don't come from a set
+    """
+    if set_context is None:
+        return None
+    if resume:
+        return load_manifest(mhc_class, route, set_context, set_slug, aws_config)
+    return new_manifest(mhc_class, route, set_context, set_slug)
+
+
+def run_step(action:Callable, action_name:str, pdb_codes:List, aws_config:Dict, execution:str='serial', max_workers:int=1, force:bool=False, manifest:Optional[Dict]=None, resume:bool=False, outputs:Optional[Dict]=None) -> Dict:
+    """
+    This function runs one pipeline action over a list of structures and rolls up the stats, errors and throughput
+
+    With a run manifest the structures are run a page at a time, and the manifest is stored after each page so that a run which dies part way through can be resumed. When resuming, the structures already completed or errored in the manifest are not run again.
+
+    Args:
+        action (Callable): the pipeline action function e.g. align_structures
+        action_name (str): the display name of the action
+        pdb_codes (List): the pdb codes of the structures
+        aws_config (Dict): the configuration details for AWS for the current app
+        execution (str): one of 'serial', 'thread' or 'process'
+        max_workers (int): the size of the worker pool, a value of 1 runs serially
+        force (bool): passed through to the action
+        manifest (Dict): the run manifest for the step over a set, see open_manifest
+        resume (bool): whether to skip the structures already run according to the manifest
+        outputs (Dict): a dictionary to collect the output of the action for each structure in, keyed by pdb code
+
+    Returns:
+        Dict: the stats, errors, timings and throughput for the step
+    """
+    members = [pdb_code for pdb_code in pdb_codes if pdb_code not in exclude_pdb_codes]
+    excluded = {pdb_code:['file_excluded_obsolete'] for pdb_code in pdb_codes if pdb_code in exclude_pdb_codes}
+    if manifest is not None and resume:
+        members = remaining_members(manifest, members)
+    if max_workers <= 1:
+        execution = 'serial'
+    console.print(f'[bold]{action_name}[/bold] : {len(members)} structures, {execution} with {max_workers} worker(s)')
+    if manifest is not None:
+        pages = [members[i:i + manifest['page_size']] for i in range(0, len(members), manifest['page_size'])]
+    else:
+        pages = [members]
+    successes = []
+    errordict = {}
+    timings = {}
+    skipped = []
+    start_time = time.perf_counter()
+    context = runContext(aws_config, defer_writes=False, cache_formats=['json'], coalesce_updates=True)
+    for page_members in pages:
+        # a read-through cache of the JSON blocks for the page, written straight through to S3 apart from the updates to each block, which are coalesced and written once at the end of each step
+        with context:
+            page_successes, page_errors, page_timings, page_skipped = run_members(action, page_members, aws_config, execution=execution, max_workers=max_workers, force=force, outputs=outputs)
+        context.blocks = {}
+        successes += page_successes
+        errordict.update(page_errors)
+        timings.update(page_timings)
+        skipped += page_skipped
+        if manifest is not None and len(page_members) > 0:
+            record_members(manifest, page_members, page_successes, page_errors, skipped=page_skipped)
+            advance_cursor(manifest, 1, pdb_codes.index(page_members[-1]) + 1)
+            save_manifest(manifest, aws_config)
+    if manifest is not None:
+        manifest['status'] = 'complete'
+        save_manifest(manifest, aws_config)
+    wall_time = time.perf_counter() - start_time
+    errordict.update(excluded)
+    stats, collated_errors = roll_up_stats(errordict, members, successes, action_name)
+    stats['skipped'] = {'pdb_codes':skipped, 'count':len(skipped)}
+    step = {
+        'name':action_name,
+        'stats':stats,
+        'collated_errors':collated_errors,
+        'timings':summarise_timings(timings, wall_time),
+        'throughput':throughput(len(members), wall_time),
+        'cache':context.stats
+    }
+    console.print(f'  {stats["success"]["count"]} succeeded ({stats["skipped"]["count"]} skipped as unchanged), {stats["minor_errors"]["count"]} with errors, {step["throughput"]} structures/min')
+    return step
+
+
+def run_chain(mhc_class:str, pdb_codes:List, aws_config:Dict, start:str='initialise', end:Optional[str]=None, max_workers:int=1, execution:Optional[str]=None, force:bool=False, set_context:Optional[str]=None, set_slug:Optional[str]=None, resume:bool=False) -> Dict:
+    """
+    This function runs a chain of pipeline actions over a list of structures without a web request, step by step
+
+    Each step is run over all of the structures before the next step starts, in the same way as following the 'next' links in the web interface
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        pdb_codes (List): the pdb codes of the structures
+        aws_config (Dict): the configuration details for AWS for the current app
+        start (str): the route of the first step e.g. 'initialise'
+        end (str): the route of the last step, defaults to the end of the pipeline
+        max_workers (int): the size of the worker pool, a value of 1 runs serially
+        execution (str): overrides the 'execution' mode declared by each step
+        force (bool): passed through to every step
+        set_context (str): the context of the set the structures come from, used for the run manifests
+        set_slug (str): the slug of the set the structures come from
+        resume (bool): whether to continue from the run manifests rather than starting again
+
+    Returns:
+        Dict: the stats, errors and timings for each step, keyed by route
+    """
+    report = {}
+    for route in build_chain(pipeline_actions[mhc_class], start=start, end=end):
+        step_execution = execution if execution in execution_modes else pipeline_actions[mhc_class][route].get('execution', 'thread')
+        action = fingerprinted(pipeline_actions[mhc_class][route], route)
+        manifest = open_manifest(mhc_class, route, set_context, set_slug, aws_config, resume=resume)
+        report[route] = run_step(action, pipeline_actions[mhc_class][route]['name'], pdb_codes, aws_config, execution=step_execution, max_workers=max_workers, force=force, manifest=manifest, resume=resume)
+    return report
+
+
+def run_fused_chain(mhc_class:str, pdb_codes:List, aws_config:Dict, start:str='initialise', end:Optional[str]=None, max_workers:int=1, execution:Optional[str]=None, force:bool=False, set_context:Optional[str]=None, set_slug:Optional[str]=None, resume:bool=False) -> Dict:
+    """
+    This function runs a chain of pipeline actions over a list of structures, running the whole chain for each structure in turn with a shared run context (see run_fused)
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        pdb_codes (List): the pdb codes of the structures
+        aws_config (Dict): the configuration details for AWS for the current app
+        start (str): the route of the first step e.g. 'initialise'
+        end (str): the route of the last step, defaults to the end of the pipeline
+        max_workers (int): the size of the worker pool, a value of 1 runs serially
+        execution (str): overrides the 'execution' mode declared for the fused run
+        force (bool): passed through to every step
+        set_context (str): the context of the set the structures come from, used for the run manifests
+        set_slug (str): the slug of the set the structures come from
+        resume (bool): whether to continue from the run manifests rather than starting again
+
+    Returns:
+        Dict: the stats, errors and timings for the run, keyed by 'fused'
+    """
+    action = partial(run_fused, mhc_class=mhc_class, start=start, end=end)
+    if execution not in execution_modes:
+        execution = pipeline_actions[mhc_class]['fused']['execution']
+    manifest = open_manifest(mhc_class, 'fused', set_context, set_slug, aws_config, resume=resume)
+    return {'fused':run_step(action, pipeline_actions[mhc_class]['fused']['name'], pdb_codes, aws_config, execution=execution, max_workers=max_workers, force=force, manifest=manifest, resume=resume)}
+
+
+def run_scheduled_chain(mhc_class:str, pdb_codes:List, aws_config:Dict, start:str='initialise', end:Optional[str]=None, max_workers:int=1, execution:Optional[str]=None, force:bool=False, set_context:Optional[str]=None, set_slug:Optional[str]=None, resume:bool=False, step_workers:int=4) -> Dict:
+    """
+    This function runs a chain of pipeline actions over a list of structures, running independent steps for each structure at the same time (see run_scheduled)
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        pdb_codes (List): the pdb codes of the structures
+        aws_config (Dict): the configuration details for AWS for the current app
+        start (str): the route of the first step e.g. 'initialise'
+        end (str): the route of the last step, defaults to the end of the pipeline
+        max_workers (int): the number of structures to run at the same time
+        execution (str): overrides the 'execution' mode declared for the scheduled run
+        force (bool): passed through to every step
+        set_context (str): the context of the set the structures come from, used for the run manifests
+        set_slug (str): the slug of the set the structures come from
+        resume (bool): whether to continue from the run manifests rather than starting again
+        step_workers (int): the number of steps to run at the same time for each structure
+
+    Returns:
+        Dict: the stats, errors and timings for the run, keyed by 'scheduled'
+    """
+    action = partial(run_scheduled, mhc_class=mhc_class, start=start, end=end, max_workers=step_workers)
+    if execution not in execution_modes:
+        execution = pipeline_actions[mhc_class]['scheduled']['execution']
+    manifest = open_manifest(mhc_class, 'scheduled', set_context, set_slug, aws_config, resume=resume)
+    return {'scheduled':run_step(action, pipeline_actions[mhc_class]['scheduled']['name'], pdb_codes, aws_config, execution=execution, max_workers=max_workers, force=force, manifest=manifest, resume=resume)}
+
+
+def run_retry(mhc_class:str, route:str, aws_config:Dict, error_types:Optional[List]=None, max_workers:int=1, execution:Optional[str]=None, force:bool=False) -> Dict:
+    """
+    This function re-runs a step only on the members of its error sets, and removes the members which now succeed from those sets
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        route (str): the route of the step e.g. 'align'
+        aws_config (Dict): the configuration details for AWS for the current app
+        error_types (List): only retry the members of the error sets for these error types, defaults to all of them
+        max_workers (int): the size of the worker pool, a value of 1 runs serially
+        execution (str): overrides the 'execution' mode declared by the step
+        force (bool): passed through to the step
+
+    Returns:
+        Dict: the stats, errors and timings for the step, keyed by route
+    """
+    step = pipeline_actions[mhc_class][route]
+    members, by_error = fetch_error_members(step['name'], aws_config, error_types=error_types)
+    console.print(f'{len(members)} structures in {len(by_error)} error set(s) for {step["name"]}')
+    if execution not in execution_modes:
+        execution = step.get('execution', 'thread')
+    report = {route:run_step(fingerprinted(step, route), step['name'], members, aws_config, execution=execution, max_workers=max_workers, force=force)}
+    errordict = report[route]['collated_errors']['by_pdb_code']
+    resolved = clear_resolved_errors(step['name'], by_error, members, errordict)
+    for error_type in resolved:
+        console.print(f'  {len(resolved[error_type])} removed from {step["name"]} | {error_type}')
+    return report
+
+
+def run_recomputation(mhc_class:str, changed:str, pdb_codes:List, aws_config:Dict, max_workers:int=1, execution:Optional[str]=None, force:bool=False, dry_run:bool=False) -> Dict:
+    """
+    This function recomputes only the steps downstream of a changed step which are stale for each structure (see lineage.plan_recomputation)
+
+    The structures needing the same steps are run together, with the steps for each structure run in chain order in a shared run context.
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        changed (str): the route of the step whose output has changed e.g. 'assign_chains'
+        pdb_codes (List): the pdb codes of the structures the step has been re-run on
+        aws_config (Dict): the configuration details for AWS for the current app
+        max_workers (int): the size of the worker pool, a value of 1 runs serially
+        execution (str): overrides the 'execution' mode declared for the fused run
+        force (bool): passed through to every step
+        dry_run (bool): only print the plan, don't run it
+
+    Returns:
+        Dict: the stats, errors and timings for each group of structures, keyed by the steps run
+    """
+    plan = plan_recomputation(pipeline_actions[mhc_class], changed, pdb_codes, aws_config)
+    groups = group_plan(plan)
+    console.print(f'{len(plan)} of {len(pdb_codes)} structures have stale steps downstream of {changed}')
+    for routes in groups:
+        console.print(f'  {", ".join(routes)} : {len(groups[routes])} structures')
+    report = {}
+    if dry_run:
+        return report
+    if execution not in execution_modes:
+        execution = pipeline_actions[mhc_class]['fused']['execution']
+    for routes in groups:
+        action = partial(run_fused, mhc_class=mhc_class, routes=list(routes))
+        report[' > '.join(routes)] = run_step(action, f'Recompute {", ".join(routes)}', groups[routes], aws_config, execution=execution, max_workers=max_workers, force=force)
+    return report
+
+
+cif_types = ['split', 'aligned', 'alpha_and_hetatoms', 'alpha', 'abd', 'peptide_and_hetatoms', 'peptide']
+
+
+def structure_keys(mhc_class:str, pdb_code:str, aws_config:Dict) -> List:
+    """
+    This function lists the keys of the blocks and files stored for a structure, the blocks written by the steps of the pipeline and the CIF files for each assembly
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        List: a list of (key, data_format) tuples
+    """
+    facets = ['core', 'fingerprints', 'bundle']
+    for step in pipeline_actions[mhc_class].values():
+        facets += [facet for facet in step.get('writes', []) if '.' not in facet and facet not in facets]
+    keys = [(awsKeyProvider().block_key(pdb_code, facet, 'info'), 'json') for facet in facets]
+    core, success, errors = fetch_core(pdb_code, aws_config)
+    if success and core and core.get('assemblies'):
+        for assembly_id in core['assemblies']['files']:
+            keys += [(awsKeyProvider().cif_file_key(f'{pdb_code}_{assembly_id}', cif_type), 'cif') for cif_type in cif_types]
+    return keys
+
+
+def run_compression_migration(mhc_class:str, pdb_codes:List, aws_config:Dict) -> Dict:
+    """
+    This function compresses the blocks and files stored for structures before compression was turned on
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        pdb_codes (List): the pdb codes of the structures
+        aws_config (Dict): the configuration details for AWS for the current app, with a 'compression' table
+
+    Returns:
+        Dict: the numbers of objects compressed, skipped and failed and the bytes saved, see migrate_keys
+    """
+    report = {'compressed':0, 'skipped':0, 'failed':[], 'raw_bytes':0, 'stored_bytes':0, 'bytes_saved':0}
+    for pdb_code in pdb_codes:
+        migrated = migrate_keys(structure_keys(mhc_class, pdb_code, aws_config), aws_config)
+        report['compressed'] += len(migrated['compressed'])
+        report['skipped'] += len(migrated['skipped'])
+        report['failed'] += migrated['failed']
+        for counter in ['raw_bytes', 'stored_bytes', 'bytes_saved']:
+            report[counter] += migrated[counter]
+    return report
+
+
+def run_parser_benchmark(pdb_codes:List, aws_config:Dict, cif_type:str='split') -> Dict:
+    """
+    This function times parsing the CIF files for the assemblies of structures with MMCIFParser (as load_cif does) and with the streaming _atom_site parser, and checks that both give the same atom table
+
+    Args:
+        pdb_codes (List): the pdb codes of the structures
+        aws_config (Dict): the configuration details for AWS for the current app
+        cif_type (str): the type of CIF file e.g. 'split' or 'aligned'
+
+    Returns:
+        Dict: the number of files and atoms, the time taken by each parser, and the files whose tables differ
+    """
+    report = {'files':0, 'atoms':0, 'mmcif_parser_time':0.0, 'streaming_time':0.0, 'different':[], 'missing':[]}
+    s3 = storageProvider(aws_config)
+    for pdb_code in pdb_codes:
+        core, success, errors = fetch_core(pdb_code, aws_config)
+        if not success or not core or not core.get('assemblies'):
+            report['missing'].append(pdb_code)
+            continue
+        for assembly_id in core['assemblies']['files']:
+            identifier = f'{pdb_code}_{assembly_id}'
+            key = awsKeyProvider().cif_file_key(identifier, cif_type)
+            cif_data, success, errors = s3.get(key, data_format='cif')
+            if not success or not cif_data:
+                report['missing'].append(identifier)
+                continue
+            start = time.perf_counter()
+            structure = MMCIFParser(QUIET=True).get_structure(identifier, StringIO(cif_data))
+            report['mmcif_parser_time'] += time.perf_counter() - start
+            start = time.perf_counter()
+            table = parse_atom_site(cif_data)
+            report['streaming_time'] += time.perf_counter() - start
+            if not np.array_equal(table, atom_table(structure)):
+                report['different'].append(identifier)
+            report['files'] += 1
+            report['atoms'] += len(table)
+    return report
+
+
+def print_parser_benchmark(report:Dict):
+    """
+    This function prints the times taken by MMCIFParser and the streaming _atom_site parser
+    """
+    table = Table(title='Parsing CIF files')
+    for column in ['Parser', 'Files', 'Atoms', 'Time (s)', 'ms/file', 'Atoms/s']:
+        table.add_column(column)
+    for name, counter in [('MMCIFParser (load_cif)', 'mmcif_parser_time'), ('Streaming _atom_site', 'streaming_time')]:
+        elapsed = report[counter]
+        table.add_row(name, str(report['files']), str(report['atoms']), str(round(elapsed, 3)), str(round(elapsed * 1000 / report['files'], 2)) if report['files'] else '-', str(int(report['atoms'] / elapsed)) if elapsed else '-')
+    console.print(table)
+    if report['streaming_time'] > 0:
+        console.print(f"Streaming parser {round(report['mmcif_parser_time'] / report['streaming_time'], 1)}x faster, {len(report['different'])} files with different atom tables, {len(report['missing'])} missing")
+    for identifier in report['different']:
+        console.print(f'Different atom table for {identifier}')
+
+
+def run_storage_benchmark(pdb_codes:List, aws_config:Dict, max_workers:int=10, rounds:int=3) -> List:
+    """
+    This function times reading the core block of each structure from the storage backend on a pool of threads, with a client created for every read (as before clients were shared, see storage_backend), with a shared client and the default connection pool, and with a shared client and a connection pool the size of the thread pool
+
+    The blocks are read straight from the storage backend, bypassing the run context and the process wide cache, and the best of several rounds is kept for each.
+
+    Args:
+        pdb_codes (List): the pdb codes of the structures
+        aws_config (Dict): the configuration details for AWS for the current app
+        max_workers (int): the size of the thread pool
+        rounds (int): the number of times to read the blocks with each configuration
+
+    Returns:
+        List: the name, number of reads and failures, best wall time and reads per second for each configuration
+    """
+    keys = [awsKeyProvider().block_key(pdb_code, 'core', 'info') for pdb_code in pdb_codes]
+    configurations = [
+        ('A client per read (STORAGE_POOL = false)', {'storage_pool':False}),
+        ('Shared client, 10 connections', {'storage_pool':True, 'max_connections':10}),
+        (f'Shared client, {max_workers} connections', {'storage_pool':True, 'max_connections':max_workers})
+    ]
+    report = []
+    for name, settings in configurations:
+        config = {**aws_config, **settings}
+        reset_backends()
+        best = None
+        failed = 0
+        for round_number in range(rounds):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(lambda key: storage_backend(config).get(key), keys))
+            elapsed = time.perf_counter() - start
+            failed = len([result for result in results if not result[1]])
+            best = elapsed if best is None else min(best, elapsed)
+        report.append({'name':name, 'reads':len(keys), 'failed':failed, 'wall_time':round(best, 3), 'reads_per_second':round(len(keys) / best, 1) if best else None})
+    reset_backends()
+    return report
+
+
+def print_storage_benchmark(report:List):
+    """
+    This function prints the times taken to read the core blocks with each storage client configuration
+    """
+    table = Table(title='Reading core blocks')
+    for column in ['Clients', 'Reads', 'Failed', 'Wall time (s)', 'Reads/s']:
+        table.add_column(column)
+    for row in report:
+        table.add_row(row['name'], str(row['reads']), str(row['failed']), str(row['wall_time']), str(row['reads_per_second']))
+    console.print(table)
+
+
+def throughput(count:int, wall_time:float) -> Optional[float]:
+    """
+    This function returns the number of structures processed per minute
+
+    Args:
+        count (int): the number of structures processed
+        wall_time (float): the wall time in seconds
+
+    Returns:
+        float: structures per minute, or None if no time elapsed
+    """
+    if wall_time <= 0:
+        return None
+    return round(count / (wall_time / 60), 2)
+
+
+def print_report(report:Dict):
+    """
+    This function prints a table of the throughput of each step of a chain run
+
+    Args:
+        report (Dict): the output of run_chain
+    """
+    table = Table(title='Pipeline throughput')
+    for column in ['Step', 'Structures', 'Success', 'Skipped', 'Errors', 'Wall time (s)', 'Mean (s)', 'Structures/min', 'Cache hits/misses', 'Unchanged writes skipped']:
+        table.add_column(column)
+    for route in report:
+        step = report[route]
+        table.add_row(
+            step['name'],
+            str(step['stats']['members']['count']),
+            str(step['stats']['success']['count']),
+            str(step['stats']['skipped']['count']),
+            str(step['stats']['minor_errors']['count']),
+            str(step['timings']['wall_time']),
+            str(step['timings']['mean']),
+            str(step['throughput']),
+            f"{step['cache']['hits']}/{step['cache']['misses']}",
+            str(step['cache'].get('skipped_writes', 0))
+        )
+    console.print(table)
+
+
+def print_compression_report():
+    """
+    This function prints a table of the bytes saved by compression and the time spent compressing and decompressing, for each data format
+    """
+    report = compression_report()
+    if len(report) == 0:
+        return
+    table = Table(title='Compression')
+    for column in ['Format', 'Objects written', 'Bytes written', 'Bytes stored', 'Bytes saved', 'Ratio', 'Encode (ms)', 'Objects read', 'Decode (ms)']:
+        table.add_column(column)
+    for data_format in report:
+        stats = report[data_format]
+        table.add_row(data_format, str(stats['objects']), str(stats['raw_bytes']), str(stats['stored_bytes']), str(stats['bytes_saved']), str(stats['ratio']), str(stats['encode_ms']), str(stats['decoded']), str(stats['decode_ms']))
+    console.print(table)
+
+
+def print_storage_report():
+    """
+    This function prints the number of storage clients created and reused by the run, and the time spent creating them, and how well the structure cache worked
+    """
+    stats = backend_stats()
+    console.print(f"Storage clients: {stats['created']} created, {stats['reused']} reused, {stats['setup_time']}s setup")
+    structures = process_structures.report()
+    if structures['hits'] + structures['misses'] > 0:
+        console.print(f"Structure cache: {structures['hits']} hits, {structures['misses']} misses, {structures['evictions']} evictions, {structures['structures']} structures ({structures['bytes'] // (1024 * 1024)}MB of {structures['max_bytes'] // (1024 * 1024)}MB)")
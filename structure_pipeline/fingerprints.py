@@ -0,0 +1,182 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from storage import fetch_facet, update_block
+
+from functools import partial, lru_cache
+
+import datetime
+import hashlib
+import inspect
+import json
+import logging
+
+
+@lru_cache(maxsize=None)
+def source_hash(filename:str) -> str:
+    """
+    This function returns a hash of a source file, used as the code version of a step
+    """
+    with open(filename, 'rb') as source_file:
+        return hashlib.sha256(source_file.read()).hexdigest()[:12]
+
+
+def step_version(step:Dict) -> str:
+    """
+    This function returns the code version of a pipeline step
+
+    The version is a hash of the source file for the step's action, so that changing the code of a step invalidates its fingerprints. A 'version' key in the step's entry in pipeline_actions is added to it, so that a step can be invalidated by hand.
+
+    Args:
+        step (Dict): the entry in the pipeline_actions dictionary for the step
+
+    Returns:
+        str: the code version
+    """
+    try:
+        version = source_hash(inspect.getsourcefile(step['action']))
+    except (TypeError, OSError):
+        version = step['action'].__name__
+    if 'version' in step:
+        version = f'{step["version"]}-{version}'
+    return version
+
+
+def hash_data(data) -> str:
+    """
+    This function returns a hash of some JSON serialisable data
+    """
+    serialised = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(serialised.encode('utf-8')).hexdigest()
+
+
+def input_hashes(pdb_code:str, reads:List, aws_config:Dict) -> Dict:
+    """
+    This function computes a hash of each of the facets a step reads for a structure
+
+    Facets are block names e.g. 'chains', or dotted paths into a block e.g. 'core.assemblies'. The keys of the structure files a step loads are held in the blocks it reads (e.g. the assemblies in the core block, the aligned files in the aligned block), so a change to the files a step consumes changes the hashes.
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        reads (List): the facets the step reads
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the hash of each facet, keyed by facet
+    """
+    blocks = {}
+    hashes = {}
+    for facet in reads:
+        path = facet.split('.')
+        if path[0] not in blocks:
+            block, success, errors = fetch_facet(pdb_code, path[0], aws_config)
+            blocks[path[0]] = block if success else None
+        value = blocks[path[0]]
+        for key in path[1:]:
+            value = value.get(key) if isinstance(value, dict) else None
+        hashes[facet] = hash_data(value)
+    return hashes
+
+
+def fingerprint_inputs(pdb_code:str, reads:List, version:str, aws_config:Dict, hashes:Optional[Dict]=None) -> str:
+    """
+    This function computes the fingerprint of the inputs to a step for a structure, a hash of the facets the step reads along with its code version
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        reads (List): the facets the step reads
+        version (str): the code version of the step
+        aws_config (Dict): the configuration details for AWS for the current app
+        hashes (Dict): the hashes of the facets if they have already been computed, see input_hashes
+
+    Returns:
+        str: the fingerprint
+    """
+    if hashes is None:
+        hashes = input_hashes(pdb_code, reads, aws_config)
+    return hash_data({'version':version, 'inputs':hashes})
+
+
+def stored_fingerprint(pdb_code:str, route:str, aws_config:Dict) -> Optional[Dict]:
+    """
+    This function returns the fingerprint recorded for a step the last time it ran successfully on a structure
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        route (str): the route of the step e.g. 'align'
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the fingerprint, code version and date it was recorded, or None
+    """
+    fingerprints, success, errors = fetch_facet(pdb_code, 'fingerprints', aws_config)
+    if not success or not fingerprints:
+        return None
+    return fingerprints.get(route)
+
+
+def run_if_stale(action:Callable, route:str, reads:List, version:str, pdb_code:str, aws_config:Dict, force:bool=False) -> Tuple[Dict, bool, List]:
+    """
+    This function runs a step on a structure, unless the step's inputs are unchanged since it last ran successfully
+
+    When the step runs successfully, the fingerprint of its inputs is recorded in the structure's fingerprints block, along with the hash of each facet it read (its lineage, see lineage.py). The fingerprint is computed after the run, so steps which update one of the facets they read (e.g. match_peptide updating the peptide in the core block) are fresh on the next run.
+
+    Args:
+        action (Callable): the pipeline action function e.g. align_structures
+        route (str): the route of the step e.g. 'align'
+        reads (List): the facets the step reads
+        version (str): the code version of the step
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+        force (bool): run the step regardless of its fingerprint, also passed through to the action
+
+    Returns:
+        Dict: the output of the action, or a note that the step was skipped (output)
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    if not force:
+        stored = stored_fingerprint(pdb_code, route, aws_config)
+        if stored and stored['fingerprint'] == fingerprint_inputs(pdb_code, reads, version, aws_config):
+            output = {
+                'action':{'skipped':True, 'fingerprint':stored},
+                'core':None
+            }
+            return output, True, []
+    output, success, errors = action(pdb_code, aws_config, force)
+    if success and not errors:
+        hashes = input_hashes(pdb_code, reads, aws_config)
+        fingerprint = {
+            'fingerprint':fingerprint_inputs(pdb_code, reads, version, aws_config, hashes=hashes),
+            'inputs':hashes,
+            'version':version,
+            'recorded':datetime.datetime.now().isoformat()
+        }
+        data, recorded, record_errors = update_block(pdb_code, 'fingerprints', 'info', {route:fingerprint}, aws_config)
+        if not recorded:
+            logging.warn(f'UNABLE TO RECORD FINGERPRINT FOR {route} {pdb_code}')
+    return output, success, errors
+
+
+def fingerprinted(step:Dict, route:str) -> Callable:
+    """
+    This function returns the action for a step wrapped so that it is skipped when its inputs are unchanged (see run_if_stale)
+
+    Steps which don't declare the facets they read, or which set 'fingerprint' to False, are returned unwrapped. The wrapped action can be pickled, so it can be run in a process pool.
+
+    Args:
+        step (Dict): the entry in the pipeline_actions dictionary for the step
+        route (str): the route of the step e.g. 'align'
+
+    Returns:
+        Callable: an action with the same signature and return values as a pipeline action
+    """
+    if 'reads' not in step or not step.get('fingerprint', True):
+        return step['action']
+    return partial(run_if_stale, step['action'], route, step['reads'], step_version(step))
+
+
+def is_skipped(data:Optional[Dict]) -> bool:
+    """
+    This function checks whether the output of an action is from a step skipped by run_if_stale
+    """
+    return bool(data) and isinstance(data.get('action'), dict) and data['action'].get('skipped') == True
@@ -0,0 +1,72 @@
+from typing import Dict, List, Optional, Tuple
+
+from storage import runContext
+
+from .workers import run_member, build_chain
+from .fingerprints import fingerprinted, is_skipped
+
+import structure_pipeline
+import time
+
+
+def run_fused(pdb_code:str, aws_config:Dict, force:bool=False, mhc_class:str='class_i', start:str='initialise', end:Optional[str]=None, routes:Optional[List]=None) -> Tuple[Dict, bool, List]:
+    """
+    This function runs a chain of pipeline actions over a single structure in one go, sharing a run context between the steps
+
+    The core, chains and aligned blocks are read once, each structure file is parsed once, and all of the blocks and files written are flushed to S3 at the end of the run.
+
+    It has the same signature and return values as a pipeline action, so it can be run over a set with run_members.
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+        force (bool): passed through to every step
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        start (str): the route of the first step e.g. 'initialise'
+        end (str): the route of the last step, defaults to the end of the pipeline
+        routes (List): only run these steps of the chain e.g. the stale steps found by lineage.plan_recomputation
+
+    Returns:
+        Dict: A dictionary of the output of each step, the timings and the run context stats (output)
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    # the pipeline actions are looked up when the run starts, as this step is itself one of the pipeline actions
+    pipeline_actions = structure_pipeline.pipeline_actions
+    if pdb_code in structure_pipeline.exclude_pdb_codes:
+        return {'action':{'error':'in exclusion list'}, 'core':{'error':'in exclusion list'}}, False, ['file_excluded_obsolete']
+    step_errors = []
+    steps = {}
+    core = None
+    start_time = time.perf_counter()
+    with runContext(aws_config) as context:
+        for route in build_chain(pipeline_actions[mhc_class], start=start, end=end):
+            if routes is not None and route not in routes:
+                continue
+            action = fingerprinted(pipeline_actions[mhc_class][route], route)
+            pdb_code, data, errors, elapsed = run_member(action, pdb_code, aws_config, force)
+            steps[route] = {
+                'name':pipeline_actions[mhc_class][route]['name'],
+                'errors':errors,
+                'skipped':is_skipped(data),
+                'time':round(elapsed, 3)
+            }
+            if errors:
+                step_errors += [f'{route}__{error}' if isinstance(error, str) else error for error in errors]
+            if data and data.get('core'):
+                core = data['core']
+        flush_start = time.perf_counter()
+    flush_time = time.perf_counter() - flush_start
+    for error in context.errors:
+        step_errors.append(f'flush__{error["key"]}')
+    action = {
+        'steps':steps,
+        'flush_time':round(flush_time, 3),
+        'wall_time':round(time.perf_counter() - start_time, 3),
+        'context':context.stats
+    }
+    output = {
+        'action':action,
+        'core':core
+    }
+    return output, len(context.errors) == 0, step_errors
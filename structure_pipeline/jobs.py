@@ -0,0 +1,218 @@
+from typing import Callable, Dict, List, Optional
+from flask import Flask
+
+from storage import runContext
+
+from .workers import run_member
+from .fingerprints import is_skipped
+
+import datetime
+import logging
+import queue
+import threading
+import time
+import uuid
+
+
+class jobQueue():
+    """
+    An in-process queue of set runs, drained by a pool of local worker threads
+
+    Each job is a pipeline action run over the members of a page of a set. The members are queued individually so that progress can be reported as they complete.
+
+    Jobs are held in memory, so progress is only available from the process which accepted the job. Once a job is complete only its progress and result are kept, and it is removed after completed_ttl seconds, or when there are more than max_completed complete jobs, oldest first.
+    """
+    def __init__(self, max_workers:int=4, completed_ttl:float=3600, max_completed:int=100):
+        self.max_workers = max_workers
+        self.completed_ttl = completed_ttl
+        self.max_completed = max_completed
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.workers = []
+
+
+    def start(self, app:Flask):
+        """
+        This function starts the worker threads if they are not already running
+
+        Args:
+            app (Flask): the app whose context the workers run in, so that shared models can read the app config
+        """
+        with self.lock:
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            while len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self.work, args=(app,), daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+
+    def enqueue(self, app:Flask, action:Callable, members:List, aws_config:Dict, metadata:Dict, excluded:Optional[Dict]=None, on_complete:Optional[Callable]=None, force:bool=False) -> str:
+        """
+        This function creates a job and queues its members
+
+        Args:
+            app (Flask): the app whose context the workers run in
+            action (Callable): the pipeline action function e.g. align_structures
+            members (List): the pdb codes to run the action on
+            aws_config (Dict): the configuration details for AWS for the current app
+            metadata (Dict): details of the job to return with its progress, e.g. the set and route
+            excluded (Dict): errors for members which are not being run, keyed by pdb code
+            on_complete (Callable): a function called with the job once all of its members are done
+            force (bool): passed through to the action
+
+        Returns:
+            str: the job id
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id':job_id,
+            'metadata':metadata,
+            'status':'queued',
+            'members':members,
+            'successes':[],
+            'skipped':[],
+            'errors':dict(excluded) if excluded else {},
+            'timings':{},
+            'cache':{'reads':0, 'hits':0, 'misses':0, 'skipped_writes':0},
+            'done':0,
+            'created':datetime.datetime.now().isoformat(),
+            'started':None,
+            'completed':None,
+            'start_time':time.perf_counter(),
+            'result':None,
+            'action':action,
+            'aws_config':aws_config,
+            'force':force,
+            'on_complete':on_complete
+        }
+        self.expire()
+        with self.lock:
+            self.jobs[job_id] = job
+        if len(members) == 0:
+            self.complete(job)
+        for pdb_code in members:
+            self.queue.put((job_id, pdb_code))
+        self.start(app)
+        return job_id
+
+
+    def work(self, app:Flask):
+        """
+        This function is the loop run by each worker thread, taking members off the queue and running the job's action on them
+
+        Args:
+            app (Flask): the app whose context the worker runs in
+        """
+        with app.app_context():
+            while True:
+                job_id, pdb_code = self.queue.get()
+                job = self.jobs[job_id]
+                with self.lock:
+                    if job['status'] == 'queued':
+                        job['status'] = 'running'
+                        job['started'] = datetime.datetime.now().isoformat()
+                with runContext(job['aws_config'], defer_writes=False, cache_formats=['json'], coalesce_updates=True) as context:
+                    pdb_code, data, errors, elapsed = run_member(job['action'], pdb_code, job['aws_config'], job['force'])
+                with self.lock:
+                    for counter in ['reads', 'hits', 'misses', 'skipped_writes']:
+                        job['cache'][counter] += context.stats[counter]
+                    if data:
+                        job['successes'].append(pdb_code)
+                    if is_skipped(data):
+                        job['skipped'].append(pdb_code)
+                    if errors:
+                        job['errors'][pdb_code] = errors
+                    job['timings'][pdb_code] = round(elapsed, 3)
+                    job['done'] += 1
+                    finished = job['done'] == len(job['members'])
+                if finished:
+                    self.complete(job)
+                self.queue.task_done()
+
+
+    def complete(self, job:Dict):
+        """
+        This function marks a job as complete and runs its completion function
+
+        If the completion function fails, the job's result holds the error instead, so that the job still ends. Jobs without a completion function have no result, only their progress.
+
+        Args:
+            job (Dict): the job
+        """
+        # keep the successes in the same order as the members
+        job['successes'] = [pdb_code for pdb_code in job['members'] if pdb_code in job['successes']]
+        if job['on_complete']:
+            try:
+                job['result'] = job['on_complete'](job)
+            except Exception as e:
+                logging.warn(f'UNABLE TO COMPLETE JOB {job["job_id"]}')
+                logging.warn(e)
+                job['result'] = {'errors':[f'unable_to_complete_job__{type(e).__name__.lower()}']}
+        job['wall_time'] = time.perf_counter() - job['start_time']
+        job['completed'] = datetime.datetime.now().isoformat()
+        job['completed_time'] = time.monotonic()
+        # drop what was only needed to run the job, so that a complete job holds just its progress and result
+        for field in ['action', 'aws_config', 'on_complete']:
+            job[field] = None
+        job['status'] = 'complete'
+
+
+    def expire(self):
+        """
+        This function removes the complete jobs which finished more than completed_ttl seconds ago, and the oldest complete jobs beyond max_completed
+        """
+        now = time.monotonic()
+        with self.lock:
+            completed = sorted([job for job in self.jobs.values() if job['status'] == 'complete'], key=lambda job: job['completed_time'])
+            for position, job in enumerate(completed):
+                if now - job['completed_time'] > self.completed_ttl or len(completed) - position > self.max_completed:
+                    del self.jobs[job['job_id']]
+
+
+    def get(self, job_id:str) -> Optional[Dict]:
+        """
+        This function returns a job
+
+        Args:
+            job_id (str): the job id
+
+        Returns:
+            Dict: the job, or None if there is no job with that id
+        """
+        return self.jobs.get(job_id)
+
+
+    def progress(self, job_id:str) -> Optional[Dict]:
+        """
+        This function returns the progress of a job as a JSON serialisable dictionary
+
+        Args:
+            job_id (str): the job id
+
+        Returns:
+            Dict: the status and done/failed/remaining counts for the job, or None if there is no job with that id
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            failed = [pdb_code for pdb_code in job['members'] if pdb_code in job['errors']]
+            return {
+                'job_id':job_id,
+                'status':job['status'],
+                'metadata':job['metadata'],
+                'total':len(job['members']),
+                'done':job['done'],
+                'succeeded':len(job['successes']),
+                'cache':job['cache'],
+                'skipped':len(job['skipped']),
+                'failed':len(failed),
+                'remaining':len(job['members']) - job['done'],
+                'created':job['created'],
+                'started':job['started'],
+                'completed':job['completed']
+            }
+
+
+jobs = jobQueue()
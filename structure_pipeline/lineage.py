@@ -0,0 +1,136 @@
+from typing import Dict, List, Optional, Set
+
+from storage import fetch_facet
+
+from .workers import build_chain
+from .scheduler import any_conflict, build_dag
+from .fingerprints import input_hashes, step_version
+
+
+def lineage_graph(actions:Dict, steps:Optional[List]=None) -> Dict:
+    """
+    This function builds the lineage of each step, the upstream step each of the facets it reads is derived from
+
+    Args:
+        actions (Dict): the pipeline actions for a class of MHC molecule e.g. pipeline_actions['class_i']
+        steps (List): the routes of the steps in chain order, defaults to the whole chain
+
+    Returns:
+        Dict: for each route, the route of the latest earlier step writing each facet it reads (or None), keyed by facet
+    """
+    if steps is None:
+        steps = build_chain(actions)
+    graph = {}
+    for position, route in enumerate(steps):
+        if 'reads' not in actions[route]:
+            continue
+        graph[route] = {}
+        for facet in actions[route]['reads']:
+            graph[route][facet] = None
+            for earlier in reversed(steps[:position]):
+                if any_conflict([facet], actions[earlier].get('writes', [])):
+                    graph[route][facet] = earlier
+                    break
+    return graph
+
+
+def downstream_steps(actions:Dict, changed:str, steps:Optional[List]=None) -> List:
+    """
+    This function returns the steps derived, directly or through other steps, from the blocks written by a step
+
+    Args:
+        actions (Dict): the pipeline actions for a class of MHC molecule e.g. pipeline_actions['class_i']
+        changed (str): the route of the step whose output has changed e.g. 'assign_chains'
+        steps (List): the routes of the steps in chain order, defaults to the whole chain
+
+    Returns:
+        List: the routes of the downstream steps in chain order
+    """
+    if steps is None:
+        steps = build_chain(actions)
+    changed_writes = list(actions[changed].get('writes', []))
+    downstream = []
+    for route in steps[steps.index(changed) + 1:]:
+        if 'reads' not in actions[route]:
+            continue
+        if any_conflict(actions[route]['reads'], changed_writes):
+            downstream.append(route)
+            changed_writes += actions[route]['writes']
+    return downstream
+
+
+def stale_steps(actions:Dict, changed:str, pdb_code:str, aws_config:Dict, steps:Optional[List]=None) -> List:
+    """
+    This function works out which of the steps downstream of a changed step need to be recomputed for a structure
+
+    A downstream step is stale if it has no lineage recorded for the structure, if its code version has changed, if any of the facets it read has changed since it ran, or if a step it depends on is stale.
+
+    Args:
+        actions (Dict): the pipeline actions for a class of MHC molecule e.g. pipeline_actions['class_i']
+        changed (str): the route of the step whose output has changed e.g. 'assign_chains'
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+        steps (List): the routes of the steps in chain order, defaults to the whole chain
+
+    Returns:
+        List: the routes of the stale steps in chain order
+    """
+    if steps is None:
+        steps = build_chain(actions)
+    dag = build_dag(actions, steps)
+    fingerprints, success, errors = fetch_facet(pdb_code, 'fingerprints', aws_config)
+    if not success or not fingerprints:
+        fingerprints = {}
+    stale = []
+    for route in downstream_steps(actions, changed, steps=steps):
+        recorded = fingerprints.get(route)
+        if recorded is None or 'inputs' not in recorded:
+            stale.append(route)
+        elif recorded['version'] != step_version(actions[route]):
+            stale.append(route)
+        elif any(upstream in stale for upstream in dag[route]):
+            stale.append(route)
+        elif input_hashes(pdb_code, actions[route]['reads'], aws_config) != recorded['inputs']:
+            stale.append(route)
+    return stale
+
+
+def plan_recomputation(actions:Dict, changed:str, pdb_codes:List, aws_config:Dict) -> Dict:
+    """
+    This function works out the minimal set of step and structure recomputations after a change to the output of a step
+
+    Args:
+        actions (Dict): the pipeline actions for a class of MHC molecule e.g. pipeline_actions['class_i']
+        changed (str): the route of the step whose output has changed e.g. 'align'
+        pdb_codes (List): the pdb codes of the structures the step has been re-run on
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the stale routes for each structure, keyed by pdb code (structures with nothing stale are left out)
+    """
+    steps = build_chain(actions)
+    plan = {}
+    for pdb_code in pdb_codes:
+        stale = stale_steps(actions, changed, pdb_code, aws_config, steps=steps)
+        if len(stale) > 0:
+            plan[pdb_code] = stale
+    return plan
+
+
+def group_plan(plan:Dict) -> Dict:
+    """
+    This function groups the structures in a recomputation plan by the steps they need, so that each group can be run as one job
+
+    Args:
+        plan (Dict): the output of plan_recomputation
+
+    Returns:
+        Dict: the pdb codes needing each set of steps, keyed by a tuple of routes
+    """
+    groups = {}
+    for pdb_code in plan:
+        routes = tuple(plan[pdb_code])
+        if routes not in groups:
+            groups[routes] = []
+        groups[routes].append(pdb_code)
+    return groups
@@ -0,0 +1,199 @@
+from typing import Dict, List, Optional
+
+from storage import storageProvider
+
+import datetime
+import logging
+import threading
+
+
+_manifest_locks = {}
+_manifest_locks_lock = threading.Lock()
+
+
+def manifest_key(mhc_class:str, route:str, set_context:str, set_slug:str) -> str:
+    """
+    This function returns the key of the run manifest for an action over a set
+    """
+    return f'pipeline/manifests/{mhc_class}/{route}/{set_context}/{set_slug}.json'
+
+
+def new_manifest(mhc_class:str, route:str, set_context:str, set_slug:str, page_size:int=100) -> Dict:
+    """
+    This function returns an empty run manifest for an action over a set
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        route (str): the route of the action e.g. 'align'
+        set_context (str): the context of the set e.g. 'search_query'
+        set_slug (str): the slug of the set e.g. 'class_i_pdbefold_query'
+        page_size (int): the number of members per page of the set
+
+    Returns:
+        Dict: the manifest
+    """
+    return {
+        'mhc_class':mhc_class,
+        'route':route,
+        'set_context':set_context,
+        'set_slug':set_slug,
+        'status':'running',
+        'page_size':page_size,
+        'cursor':{'page':1, 'position':0},
+        'pages':[],
+        'last_page':None,
+        'completed':[],
+        'skipped':[],
+        'errors':{},
+        'started':datetime.datetime.now().isoformat(),
+        'updated':None
+    }
+
+
+def load_manifest(mhc_class:str, route:str, set_context:str, set_slug:str, aws_config:Dict, page_size:int=100) -> Dict:
+    """
+    This function loads the run manifest for an action over a set, or returns an empty one if there isn't one
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        route (str): the route of the action e.g. 'align'
+        set_context (str): the context of the set e.g. 'search_query'
+        set_slug (str): the slug of the set e.g. 'class_i_pdbefold_query'
+        aws_config (Dict): the configuration details for AWS for the current app
+        page_size (int): the number of members per page of the set, used for a new manifest
+
+    Returns:
+        Dict: the manifest
+    """
+    key = manifest_key(mhc_class, route, set_context, set_slug)
+    manifest, success, errors = storageProvider(aws_config).get(key)
+    if not success or not manifest:
+        manifest = new_manifest(mhc_class, route, set_context, set_slug, page_size=page_size)
+    return manifest
+
+
+def save_manifest(manifest:Dict, aws_config:Dict) -> bool:
+    """
+    This function stores a run manifest
+
+    Args:
+        manifest (Dict): the manifest
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        bool: A boolean of True or False (success)
+    """
+    manifest['updated'] = datetime.datetime.now().isoformat()
+    key = manifest_key(manifest['mhc_class'], manifest['route'], manifest['set_context'], manifest['set_slug'])
+    data, success, errors = storageProvider(aws_config).put(key, manifest)
+    if not success:
+        logging.warn(f'UNABLE TO SAVE MANIFEST {key}')
+    return success
+
+
+def record_members(manifest:Dict, members:List, successes:List, errordict:Dict, skipped:Optional[List]=None) -> Dict:
+    """
+    This function records the outcome of running an action on some members of a set in its run manifest
+
+    A member which succeeds is removed from the errors recorded for it on an earlier run.
+
+    Args:
+        manifest (Dict): the manifest
+        members (List): the pdb codes the action was run on
+        successes (List): the pdb codes for which the action returned data
+        errordict (Dict): a dictionary of error lists keyed by pdb code
+        skipped (List): the pdb codes for which the action was skipped as its inputs were unchanged
+
+    Returns:
+        Dict: the updated manifest
+    """
+    for pdb_code in members:
+        if pdb_code in successes and pdb_code not in manifest['completed']:
+            manifest['completed'].append(pdb_code)
+        if skipped and pdb_code in skipped and pdb_code not in manifest['skipped']:
+            manifest['skipped'].append(pdb_code)
+        if pdb_code in errordict:
+            manifest['errors'][pdb_code] = errordict[pdb_code]
+        elif pdb_code in successes:
+            manifest['errors'].pop(pdb_code, None)
+    return manifest
+
+
+def advance_cursor(manifest:Dict, page:int, position:int) -> Dict:
+    """
+    This function moves the cursor of a run manifest on, to the page and position within the page of the next member to run
+
+    Args:
+        manifest (Dict): the manifest
+        page (int): the page number
+        position (int): the position within the page of the next member to run
+
+    Returns:
+        Dict: the updated manifest
+    """
+    if position >= manifest['page_size']:
+        page += position // manifest['page_size']
+        position = position % manifest['page_size']
+    manifest['cursor'] = {'page':page, 'position':position}
+    return manifest
+
+
+def remaining_members(manifest:Dict, members:List) -> List:
+    """
+    This function returns the members which haven't yet been run, neither completed nor errored, according to a run manifest
+
+    Args:
+        manifest (Dict): the manifest
+        members (List): the pdb codes of the members
+
+    Returns:
+        List: the pdb codes still to run, in the order given
+    """
+    return [pdb_code for pdb_code in members if pdb_code not in manifest['completed'] and pdb_code not in manifest['errors']]
+
+
+def manifest_lock(key:str) -> threading.Lock:
+    """
+    This function returns the lock for the run manifest stored under a key, so that the pages of a set finishing at the same time in this process are recorded one after the other
+    """
+    with _manifest_locks_lock:
+        if key not in _manifest_locks:
+            _manifest_locks[key] = threading.Lock()
+        return _manifest_locks[key]
+
+
+def checkpoint_page(manifest:Dict, page:int, members:List, successes:List, errordict:Dict, aws_config:Dict, skipped:Optional[List]=None, last_page:bool=False) -> Dict:
+    """
+    This function records the outcome of running an action on a page of a set in the stored run manifest
+
+    The stored manifest is loaded again and the page merged into it, rather than the manifest loaded when the page was started being saved over it, so that pages run at the same time (e.g. as queued jobs) don't overwrite each other's records. The cursor is moved to the first page which hasn't been run, and the manifest is complete once every page up to the last one has been.
+
+    Args:
+        manifest (Dict): the manifest the page was started with, identifying the stored manifest
+        page (int): the page number
+        members (List): the pdb codes the action was run on
+        successes (List): the pdb codes for which the action returned data
+        errordict (Dict): a dictionary of error lists keyed by pdb code
+        aws_config (Dict): the configuration details for AWS for the current app
+        skipped (List): the pdb codes for which the action was skipped as its inputs were unchanged
+        last_page (bool): whether this is the last page of the set
+
+    Returns:
+        Dict: the updated manifest
+    """
+    key = manifest_key(manifest['mhc_class'], manifest['route'], manifest['set_context'], manifest['set_slug'])
+    with manifest_lock(key):
+        stored = load_manifest(manifest['mhc_class'], manifest['route'], manifest['set_context'], manifest['set_slug'], aws_config, page_size=manifest['page_size'])
+        stored = record_members(stored, members, successes, errordict, skipped=skipped)
+        pages = set(stored.get('pages') or []) | {page}
+        stored['pages'] = sorted(pages)
+        if last_page:
+            stored['last_page'] = page
+        next_page = 1
+        while next_page in pages:
+            next_page += 1
+        stored = advance_cursor(stored, next_page, 0)
+        if stored.get('last_page') is not None and next_page > stored['last_page']:
+            stored['status'] = 'complete'
+        save_manifest(stored, aws_config)
+    return stored
@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional
+
+from storage import storageProvider
+
+import datetime
+import logging
+import numpy as np
+
+
+default_page_size = 100
+minimum_page_size = 1
+maximum_page_size = 500
+history_length = 20
+
+
+def history_key(mhc_class:str, route:str) -> str:
+    """
+    This function returns the key of the run history for an action
+    """
+    return f'pipeline/history/{mhc_class}/{route}.json'
+
+
+def load_history(mhc_class:str, route:str, aws_config:Dict) -> List:
+    """
+    This function loads the recent runs of an action over pages of sets
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        route (str): the route of the action e.g. 'align'
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        List: the recent runs, oldest first
+    """
+    history, success, errors = storageProvider(aws_config).get(history_key(mhc_class, route))
+    if not success or not history:
+        return []
+    return history.get('runs', [])
+
+
+def record_run(mhc_class:str, route:str, members:int, wall_time:float, execution:str, workers:int, aws_config:Dict) -> List:
+    """
+    This function adds a run of an action over a page of a set to the action's run history, keeping the most recent runs
+
+    Args:
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        route (str): the route of the action e.g. 'align'
+        members (int): the number of structures run
+        wall_time (float): the wall time for the page in seconds
+        execution (str): the execution mode, one of 'serial', 'thread' or 'process'
+        workers (int): the size of the worker pool
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        List: the updated run history
+    """
+    if members == 0:
+        return load_history(mhc_class, route, aws_config)
+    runs = load_history(mhc_class, route, aws_config)
+    runs.append({
+        'members':members,
+        'wall_time':round(wall_time, 3),
+        'per_structure':round(wall_time / members, 3),
+        'execution':execution,
+        'workers':workers,
+        'recorded':datetime.datetime.now().isoformat()
+    })
+    runs = runs[-history_length:]
+    data, success, errors = storageProvider(aws_config).put(history_key(mhc_class, route), {'runs':runs})
+    if not success:
+        logging.warn(f'UNABLE TO RECORD RUN HISTORY FOR {route}')
+    return runs
+
+
+def estimate_cost(runs:List, workers:Optional[int]=None) -> Optional[float]:
+    """
+    This function estimates the wall time per structure for an action from its recent runs
+
+    The estimate is the median of the wall time per structure of the recent runs, preferring runs with the same number of workers as it affects the wall time per structure.
+
+    Args:
+        runs (List): the recent runs, see load_history
+        workers (int): the size of the worker pool for the next run
+
+    Returns:
+        float: the estimated seconds per structure, or None if there are no recent runs
+    """
+    if workers is not None:
+        matching = [run for run in runs if run['workers'] == workers]
+        if len(matching) > 0:
+            runs = matching
+    if len(runs) == 0:
+        return None
+    return round(float(np.median([run['per_structure'] for run in runs])), 3)
+
+
+def adaptive_page_size(estimate:Optional[float], budget:float) -> int:
+    """
+    This function sizes a page of a set to fit in a wall time budget
+
+    Args:
+        estimate (float): the estimated seconds per structure, or None if there are no recent runs
+        budget (float): the wall time budget in seconds
+
+    Returns:
+        int: the page size
+    """
+    if estimate is None:
+        return default_page_size
+    if estimate <= 0:
+        return maximum_page_size
+    return max(minimum_page_size, min(maximum_page_size, int(budget / estimate)))
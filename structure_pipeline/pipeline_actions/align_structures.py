@@ -1,75 +1,130 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import Bio.PDB
 from Bio.PDB.mmcifio import MMCIFIO
 from io import StringIO, TextIOWrapper
 import datetime
+import numpy as np
+import threading
 
 
-from common.providers import s3Provider, awsKeyProvider, PDBeProvider
-from common.helpers import update_block, fetch_core, load_cif, save_cif
+from common.providers import awsKeyProvider, PDBeProvider
+from storage import storageProvider, fetch_core, fetch_facet, update_block, load_cif, save_derived_file, recorded_file, save_atom_table
 import logging
 
 # Don't start at 1 as many structures start at 2 or 3 due to disorder of the first few residues
 start_id = 3
 end_id   = 180
 
-def align_structure(target, canonical, target_chain_id, assembly_identifier, mhc_class, aws_config):
+canonical_key = 'structures/canonical/class_i.cif'
+
+_references = {}
+_references_lock = threading.Lock()
+
+def kabsch(reference, coords) -> Tuple:
+    """
+    This function finds the rotation and translation which superimpose one set of coordinates on another with the least RMSD (the Kabsch algorithm), with the same steps as Bio.SVDSuperimposer so that the results are identical
+
+    Args:
+        reference (np.ndarray): the coordinates to superimpose on, an N x 3 array
+        coords (np.ndarray): the coordinates to move, an N x 3 array
+
+    Returns:
+        np.ndarray: the right multiplying rotation matrix
+        np.ndarray: the translation
+        float: the RMSD after superimposing
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    coords = np.asarray(coords, dtype=np.float64)
+    count = coords.shape[0]
+    reference_centroid = np.sum(reference, axis=0) / count
+    centroid = np.sum(coords, axis=0) / count
+    correlation = np.dot(np.transpose(coords - centroid), reference - reference_centroid)
+    u, d, vt = np.linalg.svd(correlation)
+    rotation = np.transpose(np.dot(np.transpose(vt), np.transpose(u)))
+    # check for a reflection
+    if np.linalg.det(rotation) < 0:
+        vt[2] = -vt[2]
+        rotation = np.transpose(np.dot(np.transpose(vt), np.transpose(u)))
+    translation = reference_centroid - np.dot(centroid, rotation)
+    difference = np.dot(coords, rotation) + translation - reference
+    rmsd = np.sqrt(sum(sum(difference * difference)) / count)
+    return rotation, translation, rmsd
+
+
+def ca_coordinates(model, chain_id:str, residues_to_be_aligned) -> Tuple[np.ndarray, List, List]:
+    """
+    This function collects the coordinates of the C alpha atoms of the residues in a range, for a chain of a model
+
+    Returns:
+        np.ndarray: the coordinates, an N x 3 array
+        List: the residue numbers
+        List: the residue names
+    """
+    coords = []
+    residue_ids = []
+    residue_names = []
+    for chain in model:
+        if chain.id == chain_id:
+            for residue in chain:
+                if residue.get_id()[1] in residues_to_be_aligned:
+                    residue_ids.append(residue.get_id()[1])
+                    residue_names.append(residue.resname)
+                    coords.append(residue['CA'].get_coord())
+    return np.array(coords, dtype=np.float64).reshape(-1, 3), residue_ids, residue_names
+
+
+def moved_atoms(model) -> List:
+    """
+    This function lists the atoms which Superimposer.apply(model.get_atoms()) moves, every location of a disordered atom if DisorderedAtom.transform moves them all (in newer versions of Biopython), otherwise only the selected one
+    """
+    atoms = []
+    for atom in model.get_atoms():
+        if atom.is_disordered():
+            if hasattr(type(atom), 'transform'):
+                atoms += atom.disordered_get_list()
+            else:
+                atoms.append(atom.selected_child)
+        else:
+            atoms.append(atom)
+    return atoms
+
+
+def transform_atoms(atoms:List, rotation, translation):
+    """
+    This function rotates and translates the coordinates of atoms with one matrix multiplication, in single precision as Superimposer.apply does
+    """
+    if len(atoms) == 0:
+        return
+    coords = np.array([atom.coord for atom in atoms], dtype=np.float32)
+    # a stack of (1 x 3) by (3 x 3) products, which rounds each atom as Atom.transform does, where one (N x 3) by (3 x 3) product may not
+    transformed = np.matmul(coords[:, np.newaxis, :], rotation.astype(np.float32))[:, 0, :] + translation.astype(np.float32)
+    for atom, coord in zip(atoms, transformed):
+        atom.coord = coord
+
+
+def align_structure(target, canonical, target_chain_id, assembly_identifier, mhc_class, aws_config, previous=None, canonical_atoms=None):
     logging.warn('-----')
     logging.warn(assembly_identifier)
     logging.warn(target_chain_id)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     residues_to_be_aligned = range(start_id, end_id + 1)
-    
-    i = 0
-    for model in canonical:
-        if i == 0:
-            canonical_model = model
-        i+=1
 
-    canonical_atoms = []
-    canonical_res_ids = []
-    canonical_res_aa = []
+    # the C alpha coordinates of the canonical structure can be passed in when aligning many structures
+    if canonical_atoms is None:
+        canonical_atoms, canonical_res_ids, canonical_res_aa = ca_coordinates(next(iter(canonical)), 'A', residues_to_be_aligned)
 
     target_model = target[0]
-    target_atoms = []
-    target_res_ids = []
-    target_res_aa = []
-
-    # Iterate of all chains in the canonical model in order to find chain to match on
-    for canonical_chain in canonical_model:
-        if canonical_chain.id == 'A':
-            # Iterate through the residues in the chosen chain
-            for canonical_residues in canonical_chain:
-                # Check if residue number ( .get_id() ) is in the list
-                if canonical_residues.get_id()[1] in residues_to_be_aligned:
-                    canonical_res_ids.append(canonical_residues.get_id()[1])
-                    canonical_res_aa.append(canonical_residues.resname)
-                    # Append CA atom to list
-                    canonical_atoms.append(canonical_residues['CA'])
-
-
-    # Do the same for the target structure
-    for target_chain in target_model:
-        if target_chain.id == target_chain_id:
-            for target_residues in target_chain:
-                if target_residues.get_id()[1] in residues_to_be_aligned:
-                    target_res_ids.append(target_residues.get_id()[1])
-                    target_res_aa.append(target_residues.resname)
-                    target_atoms.append(target_residues['CA'])
-    
-    
-    
+    target_atoms, target_res_ids, target_res_aa = ca_coordinates(target_model, target_chain_id, residues_to_be_aligned)
+
     rmsd = None
     errors = None
     if len(canonical_atoms) == len(target_atoms):
         try:
-            super_imposer = Bio.PDB.Superimposer()
-            super_imposer.set_atoms(canonical_atoms, target_atoms)
-            super_imposer.apply(target_model.get_atoms())
-            rmsd = super_imposer.rms
+            rotation, translation, rmsd = kabsch(canonical_atoms, target_atoms)
+            transform_atoms(moved_atoms(target_model), rotation, translation)
             errors = None
-        except Bio.PDB.PDBExceptions.PDBException as e:
+        except np.linalg.LinAlgError as e:
             logging.warn('UNABLE TO ALIGN')
             logging.warn(len(canonical_atoms))
             logging.warn(len(target_atoms))
@@ -86,17 +141,17 @@ def align_structure(target, canonical, target_chain_id, assembly_identifier, mhc
         io.set_structure(target) 
         io.save(target_cif_file)
         target_cif_key = awsKeyProvider().cif_file_key(assembly_identifier, 'aligned')
-        cif_data, success, errors = s3.put(target_cif_key, target_cif_file.getvalue().encode('utf-8'), data_format='txt')
+        files, success, errors = save_derived_file(target_cif_key, target_cif_file.getvalue().encode('utf-8'), aws_config, data_format='txt', previous=previous)
+        if aws_config.get('atom_tables') and success:
+            # MMCIFIO writes the coordinates to 3 decimal places
+            save_atom_table(files['file_key'], target, aws_config, decimals=3)
         aligned = {
             'aligned_on': mhc_class,
             'aligned_chain': target_chain_id,
             'rmsd': rmsd,
             'start': start_id,
             'end': end_id,
-            'files': {
-                'file_key':target_cif_key,
-                'last_updated': datetime.datetime.now().isoformat()
-            }
+            'files': files
         }
         errors = None
     else:
@@ -115,12 +170,33 @@ def align_structure(target, canonical, target_chain_id, assembly_identifier, mhc
 
 
 
-def align_structures(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
+def canonical_reference(aws_config:Dict) -> Optional[Dict]:
+    """
+    This function loads the canonical structure and the C alpha coordinates of its residues to be aligned once per process, for aligning many structures (see batch_align_structures)
+
+    Args:
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        Dict: the canonical 'structure' and its C alpha coordinates ('atoms'), or None if it can't be loaded
+    """
+    store = (aws_config.get('storage_backend'), aws_config.get('local_storage_path'), aws_config.get('s3_bucket'))
+    with _references_lock:
+        if store not in _references:
+            canonical = load_cif(canonical_key, 'class_i', aws_config)
+            if canonical is None:
+                return None
+            canonical_atoms, canonical_res_ids, canonical_res_aa = ca_coordinates(next(iter(canonical)), 'A', range(start_id, end_id + 1))
+            _references[store] = {'structure':canonical, 'atoms':canonical_atoms}
+        return _references[store]
+
+
+def align_structures(pdb_code:str, aws_config:Dict, force:bool=False, reference:Optional[Dict]=None) -> Dict:
     logging.warn('-----')
     logging.warn(pdb_code)
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     chains_key = awsKeyProvider().block_key(pdb_code, 'chains', 'info')
     chains, success, errors = s3.get(chains_key)
     mhc_class = core['class']
@@ -131,31 +207,46 @@ def align_structures(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
                 chain_ids = chains[chain]['chains']
     action = {'aligned':{'files':{}}}
     update = {}
+    previous_aligned, previous_success, previous_errors = fetch_facet(pdb_code, 'aligned', aws_config)
+    # the outcome for each assembly, the rmsd or the reason it wasn't aligned
+    alignments = {}
     if chain_ids:
         i = 0
+        if reference is not None:
+            canonical = reference['structure']
+            canonical_atoms = reference['atoms']
+        else:
+            canonical = load_cif(canonical_key, 'class_i', aws_config)
+            canonical_atoms = None
         for assembly_id in core['assemblies']['files']:
-            canonical_key = 'structures/canonical/class_i.cif'
             cif_key = core['assemblies']['files'][assembly_id]['files']['file_key']
             assembly_identifier = f'{pdb_code}_{assembly_id}'
             structure = load_cif(cif_key, assembly_identifier, aws_config)
-            canonical = load_cif(canonical_key, 'class_i', aws_config)
             if structure and canonical:
                 if len(chain_ids) > 0:
                     try:
                         chain_id = chain_ids[i]
-                        alignment, errors = align_structure(structure, canonical, chain_id, assembly_identifier, mhc_class, aws_config)
+                        previous = recorded_file(previous_aligned, ['aligned', 'files', assembly_id, 'files'])
+                        alignment, errors = align_structure(structure, canonical, chain_id, assembly_identifier, mhc_class, aws_config, previous=previous, canonical_atoms=canonical_atoms)
                         if not errors:
                             action['aligned']['files'][assembly_id] = alignment
+                            # align_structure returns no alignment and no errors when the numbers of C alpha atoms differ
+                            alignments[assembly_id] = {'rmsd':float(alignment['rmsd'])} if alignment else {'error':'length_mismatch'}
                         else:
                             step_errors.append(errors)
+                            alignments[assembly_id] = {'error':errors}
                     except:
                        step_errors.append('missing_chain_id') 
+                       alignments[assembly_id] = {'error':'missing_chain_id'}
                        logging.warn('MISSING CHAIN ID')
                        logging.warn(i)
                        logging.warn(chain_ids)
                        logging.warn(assembly_id)
                 else:
                     logging.warn("ZERO LENGTH CHAIN_IDS")
+                    alignments[assembly_id] = {'error':'zero_length_chain_ids'}
+            else:
+                alignments[assembly_id] = {'error':'missing_structure'}
             i += 1
         if len(step_errors) == 0:
             update['aligned'] = action['aligned']
@@ -165,6 +256,17 @@ def align_structures(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
             data, success, errors = s3.put(aligned_key, action, data_format='json')
     output = {
         'action':action,
-        'core':core
+        'core':core,
+        'alignments':alignments
     }
     return output, success, step_errors
+
+
+def batch_align_structures(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
+    """
+    This function aligns the assemblies of a structure against the canonical structure loaded once for the process, see canonical_reference
+    """
+    reference = canonical_reference(aws_config)
+    if reference is None:
+        return None, False, ['missing_canonical_structure']
+    return align_structures(pdb_code, aws_config, force=force, reference=reference)
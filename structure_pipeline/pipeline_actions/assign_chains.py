@@ -1,10 +1,11 @@
 from typing import List, Dict, Tuple, Union
-from common.providers import s3Provider, awsKeyProvider, PDBeProvider, rcsbProvider
+from common.providers import awsKeyProvider, PDBeProvider, rcsbProvider
 from common.models import itemSet
 
-from common.helpers import fetch_constants, fetch_core, update_block, slugify, levenshtein_ratio_and_distance
+from common.helpers import slugify, levenshtein_ratio_and_distance
 
 from common.models import itemSet
+from storage import storageProvider, fetch_core, update_block, fetch_constants
 
 
 from rich import print
@@ -215,7 +216,7 @@ def assign_chains(pdb_code, aws_config, force=False):
     if 'unmatched' in found_chains:
         step_errors.append('unmatched_chain')
     print (action)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     chains_key = awsKeyProvider().block_key(pdb_code, 'chains', 'info')
     s3.put(chains_key, action)
     data, success, errors = update_block(pdb_code, 'core', 'info', update, aws_config)
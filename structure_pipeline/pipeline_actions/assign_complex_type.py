@@ -1,9 +1,10 @@
 from typing import Dict, Tuple, Union, List
 
-from common.providers import s3Provider, awsKeyProvider, PDBeProvider
+from common.providers import awsKeyProvider, PDBeProvider
 from common.models import itemSet
 
-from common.helpers import fetch_constants, fetch_core, update_block, slugify
+from common.helpers import fetch_constants, slugify
+from storage import storageProvider, fetch_core, update_block
 
 import logging
 
@@ -364,7 +365,7 @@ def assign_complex_type(pdb_code:str, aws_config:Dict, force:bool=False) -> Tupl
     set_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
     action = {}
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     chains_key = awsKeyProvider().block_key(pdb_code, 'chains', 'info')
     chains, success, errors = s3.get(chains_key)
     found_chains = []
@@ -1,10 +1,11 @@
 from typing import Dict, List, Tuple
 
 
-from common.providers import s3Provider, awsKeyProvider, PDBeProvider
-from common.helpers import update_block, slugify
+from common.providers import awsKeyProvider, PDBeProvider
+from common.helpers import slugify
 
 from common.models import itemSet
+from storage import storageProvider, update_block
 
 
 def fetch_experiment_info(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
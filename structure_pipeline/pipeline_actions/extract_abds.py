@@ -6,17 +6,26 @@ from io import StringIO, TextIOWrapper
 import datetime
 
 
-from common.providers import s3Provider, awsKeyProvider, PDBeProvider
-from common.helpers import load_pdb, update_block, fetch_core, fetch_facet, load_cif, save_cif, SelectChains, NonHetSelect, SelectResidues
+from common.providers import awsKeyProvider, PDBeProvider
+from common.helpers import SelectChains, NonHetSelect, SelectResidues
+from storage import storageProvider, fetch_core, fetch_facet, update_block, load_pdb, save_derived_files, recorded_file
 import logging
 
 
+def parse_cif(cif_file:StringIO, identifier:str):
+    """
+    This function parses an mmCIF file written by MMCIFIO back into a structure, without a round trip to storage
+    """
+    return Bio.PDB.MMCIFParser(QUIET=True).get_structure(identifier, StringIO(cif_file.getvalue()))
+
+
 def extract_abds(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     aligned, success, errors = fetch_facet(pdb_code, 'aligned', aws_config)
     chains, success, errors = fetch_facet(pdb_code, 'chains', aws_config)
+    previous_abds, previous_success, previous_errors = fetch_facet(pdb_code, 'abd_structures', aws_config)
     chain_ids = None
     for chain in chains:
         if chains[chain]['best_match']['match'] == 'class_i_alpha':
@@ -38,27 +47,30 @@ def extract_abds(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
                     for model in structure:
                         for chain in model:
                             if chain.get_id() == chain_id:
+                                # each file is derived from the one before, so they're parsed back from memory and then the three are written at once
                                 alpha_cif_file = StringIO()
                                 io = MMCIFIO()
                                 io.set_structure(structure)
                                 io.save(alpha_cif_file, SelectChains(chain_id))
                                 alpha_cif_key = awsKeyProvider().cif_file_key(assembly_identifier, 'alpha_and_hetatoms')
-                                cif_data = save_cif(alpha_cif_key, alpha_cif_file, aws_config)
-                                action['abd_structures'][assembly_id]['alpha_and_hetatoms']['files'] = {'file_key':alpha_cif_key, 'last_updated':datetime.datetime.now().isoformat()}
-                                alpha_strucuture = load_cif(alpha_cif_key, assembly_identifier, aws_config)
+                                alpha_strucuture = parse_cif(alpha_cif_file, assembly_identifier)
                                 io.set_structure(alpha_strucuture)
                                 alpha_only_cif_file = StringIO()
                                 io.save(alpha_only_cif_file, NonHetSelect())
                                 alpha_only_cif_key = awsKeyProvider().cif_file_key(assembly_identifier, 'alpha')
-                                cif_data = save_cif(alpha_only_cif_key, alpha_only_cif_file, aws_config)
-                                action['abd_structures'][assembly_id]['alpha']['files'] = {'file_key':alpha_only_cif_key, 'last_updated':datetime.datetime.now().isoformat()}
-                                alpha_only_strucuture = load_cif(alpha_only_cif_key, assembly_identifier, aws_config)
+                                alpha_only_strucuture = parse_cif(alpha_only_cif_file, assembly_identifier)
                                 io.set_structure(alpha_only_strucuture)
                                 abd_cif_file = StringIO()
                                 io.save(abd_cif_file, SelectResidues(1,181))
                                 abd_cif_key = awsKeyProvider().cif_file_key(assembly_identifier, 'abd')
-                                cif_data = save_cif(abd_cif_key, abd_cif_file, aws_config)
-                                action['abd_structures'][assembly_id]['abd']['files'] = {'file_key':abd_cif_key, 'last_updated':datetime.datetime.now().isoformat()}
+                                cif_files = [('alpha_and_hetatoms', alpha_cif_key, alpha_cif_file), ('alpha', alpha_only_cif_key, alpha_only_cif_file), ('abd', abd_cif_key, abd_cif_file)]
+                                written = save_derived_files([(cif_key, cif_file.getvalue(), 'cif', recorded_file(previous_abds, [assembly_id, cif_type, 'files'])) for cif_type, cif_key, cif_file in cif_files], aws_config)
+                                for cif_type, cif_key, cif_file in cif_files:
+                                    files, cif_success, cif_errors = written[cif_key]
+                                    if cif_success:
+                                        action['abd_structures'][assembly_id][cif_type]['files'] = files
+                                    else:
+                                        step_errors.append(f'unable_to_store_{cif_type}')
                 else:
                     step_errors.append('missing_aligned_structure')
             i += 1
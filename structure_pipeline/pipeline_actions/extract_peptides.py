@@ -6,16 +6,18 @@ from io import StringIO, TextIOWrapper
 import datetime
 
 
-from common.providers import s3Provider, awsKeyProvider, PDBeProvider
-from common.helpers import load_pdb, update_block, fetch_core, fetch_facet, load_cif, save_cif, SelectChains, NonHetSelect
+from common.providers import awsKeyProvider, PDBeProvider
+from common.helpers import SelectChains, NonHetSelect
+from storage import storageProvider, fetch_core, fetch_facet, update_block, load_pdb, save_derived_files, recorded_file
 import logging
 
 
 def extract_peptides(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     aligned, success, errors = fetch_facet(pdb_code, 'aligned', aws_config)
+    previous_peptides, previous_success, previous_errors = fetch_facet(pdb_code, 'peptide_structures', aws_config)
     chains, success, errors = fetch_facet(pdb_code, 'chains', aws_config)
     chain_ids = None
     for chain in chains:
@@ -48,16 +50,21 @@ def extract_peptides(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
                                     io = MMCIFIO()
                                     io.set_structure(structure)
                                     io.save(peptide_and_hetatoms_cif_file, SelectChains(chain_id))
-                                    cif_key = awsKeyProvider().cif_file_key(assembly_identifier, 'peptide_and_hetatoms')
-                                    cif_data = save_cif(cif_key, peptide_and_hetatoms_cif_file, aws_config)
-                                    action['peptide_structures'][assembly_id]['peptide_and_hetatoms']['files'] = {'file_key':cif_key, 'last_updated':datetime.datetime.now().isoformat()}
-                                    peptide_structure = load_cif(cif_key, assembly_identifier, aws_config)
+                                    peptide_and_hetatoms_cif_key = awsKeyProvider().cif_file_key(assembly_identifier, 'peptide_and_hetatoms')
+                                    # the peptide only file is derived from the peptide and hetatoms file, parsed back from memory, and then both are written at once
+                                    peptide_structure = Bio.PDB.MMCIFParser(QUIET=True).get_structure(assembly_identifier, StringIO(peptide_and_hetatoms_cif_file.getvalue()))
                                     io.set_structure(peptide_structure)
                                     peptide_cif_file = StringIO()
                                     io.save(peptide_cif_file, NonHetSelect())
-                                    cif_key = awsKeyProvider().cif_file_key(assembly_identifier, 'peptide')
-                                    cif_data = save_cif(cif_key, peptide_cif_file, aws_config)
-                                    action['peptide_structures'][assembly_id]['peptide_only']['files'] = {'file_key':cif_key, 'last_updated':datetime.datetime.now().isoformat()}
+                                    peptide_cif_key = awsKeyProvider().cif_file_key(assembly_identifier, 'peptide')
+                                    cif_files = [('peptide_and_hetatoms', peptide_and_hetatoms_cif_key, peptide_and_hetatoms_cif_file), ('peptide_only', peptide_cif_key, peptide_cif_file)]
+                                    written = save_derived_files([(cif_key, cif_file.getvalue(), 'cif', recorded_file(previous_peptides, [assembly_id, cif_type, 'files'])) for cif_type, cif_key, cif_file in cif_files], aws_config)
+                                    for cif_type, cif_key, cif_file in cif_files:
+                                        files, cif_success, cif_errors = written[cif_key]
+                                        if cif_success:
+                                            action['peptide_structures'][assembly_id][cif_type]['files'] = files
+                                        else:
+                                            step_errors.append(f'unable_to_store_{cif_type}')
                     else:
                         step_errors.append('missing_chain_id_' + str(i))
                 else:
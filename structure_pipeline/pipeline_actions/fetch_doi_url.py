@@ -1,4 +1,4 @@
-from common.helpers import update_block, fetch_core
+from storage import fetch_core, update_block
 
 import logging
 
@@ -2,8 +2,9 @@ from typing import Dict, List, Tuple
 
 from datetime import datetime
 
-from common.providers import s3Provider, httpProvider, awsKeyProvider
-from common.helpers import fetch_core, update_block, process_step_errors
+from common.providers import httpProvider, awsKeyProvider
+from common.helpers import process_step_errors
+from storage import storageProvider, fetch_core, update_block, atom_table_key, store_atom_table, parse_atom_site
 
 import logging
 
@@ -22,12 +23,35 @@ def build_assembly_block(key):
             }
 
 
+def save_split_atom_table(key:str, cif_data, aws_config:Dict) -> bool:
+    """
+    This function stores the atom table for a split structure file, so that the steps which read the table (e.g. peptide_neighbours) never have to build it
+
+    Args:
+        key (str): the key of the split structure file
+        cif_data: the contents of the file, or None to load it
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        bool: whether the table was stored
+    """
+    s3 = storageProvider(aws_config)
+    if cif_data is None:
+        if s3.exists(atom_table_key(key), data_format='binary'):
+            return True
+        cif_data, success, errors = s3.get(key, data_format='cif')
+        if not success or not cif_data:
+            logging.warn(f'UNABLE TO LOAD {key}')
+            return False
+    return store_atom_table(key, parse_atom_site(cif_data), aws_config)
+
+
 def get_pdbe_structures(pdb_code:str, aws_config: Dict, force:bool=False):
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
     if errors:
         step_errors.append(errors)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     action = {'assemblies':{'files':{}}}
     has_updates = False
     if core['assembly_count'] is not None:
@@ -35,17 +59,19 @@ def get_pdbe_structures(pdb_code:str, aws_config: Dict, force:bool=False):
         while assembly_id <= core['assembly_count']:
             assembly_identifier = f'{pdb_code}_{assembly_id}'
             key = awsKeyProvider().cif_file_key(assembly_identifier, 'split')
-            # get the local file
-            cif_data, success, errors = s3.get(key, data_format='cif')
-            # if the local file is not there
-            if not success:
+            # check the inventory for the local file, rather than downloading it
+            if not s3.exists(key, data_format='cif'):
                 has_updates = True
                 cif_data = download_cif_file(pdb_code, assembly_id)
                 data, success, errors = s3.put(key, cif_data, data_format='cif')
                 if success:
                     action['assemblies']['files'][str(assembly_id)] = build_assembly_block(key)
                     print (f'FILE DOWNLOADED FOR {assembly_identifier}')
+                    if aws_config.get('atom_tables'):
+                        save_split_atom_table(key, cif_data, aws_config)
             else:
+                if aws_config.get('atom_tables'):
+                    save_split_atom_table(key, None, aws_config)
                 if 'files' in core['assemblies']:
                     if str(assembly_id) in core['assemblies']['files']:
                         action['assemblies']['files'][str(assembly_id)] = core['assemblies']['files'][str(assembly_id)]
@@ -1,14 +1,15 @@
 from typing import Dict, List, Tuple
-from flask import current_app
 
 import json
 import time
     
 
-from common.providers import s3Provider, awsKeyProvider, algoliaProvider
-from common.helpers import update_block, fetch_core
+from common.providers import awsKeyProvider, algoliaProvider
 
 from common.models import itemSet
+from storage import storageProvider, fetch_core, update_block
+
+from settings import get_setting
 
 
 def index_to_algolia(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
@@ -31,7 +32,7 @@ def index_to_algolia(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
                 index = True
 
     if index:
-        algolia = algoliaProvider(current_app.config['ALGOLIA_APPLICATION_ID'], current_app.config['ALGOLIA_KEY'])
+        algolia = algoliaProvider(get_setting('ALGOLIA_APPLICATION_ID'), get_setting('ALGOLIA_KEY'))
         data, success, errors = algolia.index_item(pdb_code, 'core', core)
         time.sleep(5)
         data, success, errors = algolia.search('core', [pdb_code], 1)
@@ -1,7 +1,8 @@
 from typing import Dict, Tuple, List, Optional, Union
 
-from common.providers import s3Provider, awsKeyProvider
+from common.providers import awsKeyProvider
 from common.helpers import process_step_errors
+from storage import storageProvider
 
 import json
 
@@ -77,7 +78,7 @@ def initialise(pdb_code: str, aws_config: Dict, force:bool=False) -> Tuple[Dict,
         List: A list of error strings (errors)
     """
     step_errors = []
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     key = awsKeyProvider().block_key(pdb_code, 'core', 'info')
     data, success, errors = s3.get(key)
     if errors:
@@ -1,8 +1,9 @@
 from typing import List, Dict, Tuple, Union
-from common.providers import s3Provider, awsKeyProvider, PDBeProvider, rcsbProvider
+from common.providers import awsKeyProvider, PDBeProvider, rcsbProvider
 from common.models import itemSet
 
-from common.helpers import fetch_constants, fetch_core, update_block, slugify, one_letter_to_three
+from common.helpers import fetch_constants, slugify, one_letter_to_three
+from storage import storageProvider, fetch_core, update_block
 
 
 
@@ -11,7 +12,7 @@ direct_mapping = ['homo_sapiens','macaca_mulatta','equus_caballus','felis_catus'
 
 
 def map_pockets(pdb_code, aws_config, force=False):
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     mhc_pockets = fetch_constants('pockets')['class_i']
     step_errors = []
     sequence = None
@@ -1,6 +1,7 @@
-from common.providers import s3Provider, awsKeyProvider
-from common.helpers import fetch_constants, update_block, levenshtein_ratio_and_distance, slugify
+from common.providers import awsKeyProvider
+from common.helpers import levenshtein_ratio_and_distance, slugify
 from common.models import itemSet
+from storage import storageProvider, update_block, fetch_constants
 
 import logging
 
@@ -144,7 +145,7 @@ classical = ['HLA-A', 'HLA-B', 'HLA-C','H2-K','H2-D','H2-L']
 
 def match_chains(pdb_code, aws_config, force=False):
     step_errors = []
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     chains_to_match = {}
     members = [pdb_code]
     best_match = None
@@ -156,10 +157,7 @@ def match_chains(pdb_code, aws_config, force=False):
         organism = slugify(core['organism']['scientific_name'])
     except:
         organism = None
-    species = fetch_constants('species')
-    allele_match = None
-    core_key = awsKeyProvider().block_key(pdb_code, 'core', 'info')
-    data, success, errors = s3.get(core_key)
+    data = core
     species = fetch_constants('species')
     scientific_names = [scientific for scientific in species]
     print (scientific_names)
@@ -187,15 +185,16 @@ def match_chains(pdb_code, aws_config, force=False):
                                     }
                     if mhc_class and len(chains_to_match) > 0:
                         loci = {}
+                        all_loci = fetch_constants('loci')
                         for chain in chains_to_match:
                             this_chain = chains_to_match[chain]
                             if this_chain['length'] < 200:
                                 break
                             else:
-                                for locus in fetch_constants('loci')[organism][mhc_class][chain]:
-                                    sequence_key = awsKeyProvider().sequence_key(mhc_class, locus)
-                                    sequence_data, success, errors = s3.get(sequence_key)
-                                    loci[locus] = sequence_data
+                                sequence_keys = {locus:awsKeyProvider().sequence_key(mhc_class, locus) for locus in all_loci[organism][mhc_class][chain]}
+                                sequences = s3.get_many(list(sequence_keys.values()))
+                                for locus in sequence_keys:
+                                    loci[locus] = sequences[sequence_keys[locus]][0]
                                 for this_locus in loci:
                                     best_match = exact_match(mhc_class, loci[this_locus], this_chain)
                                     if best_match:
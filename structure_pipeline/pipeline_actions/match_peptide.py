@@ -1,8 +1,9 @@
 from typing import Dict, Tuple, List, Optional, Union
 
-from common.providers import s3Provider, awsKeyProvider, httpProvider
-from common.helpers import update_block, fetch_constants, slugify
+from common.providers import awsKeyProvider, httpProvider
+from common.helpers import fetch_constants, slugify
 from common.models import itemSet
+from storage import storageProvider, update_block
 
 import csv
 
@@ -30,7 +31,7 @@ def api_match_peptide(pdb_code:str, aws_config: Dict, force: bool=False) -> Tupl
     results = []
     step_errors = [] 
     success = False
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     core_key = awsKeyProvider().block_key(pdb_code, 'core', 'info')
     core, success, errors = s3.get(core_key)
     peptide_matches = []
@@ -1,13 +1,22 @@
 from typing import Dict, List, Tuple
 
 import Bio.PDB
+from Bio.Data.PDBData import protein_letters_3to1
+from Bio.PDB import ic_data
 
-from common.providers import s3Provider, awsKeyProvider
-from common.helpers import update_block, fetch_core, load_cif
+from common.providers import awsKeyProvider
+from storage import storageProvider, fetch_core, update_block, load_cif, load_atom_table, residue_rows
 import logging
+import numpy as np
 
 peptide_contact_positions = [5,7,9,24,25,33,34,45,59,62,63,64,65,66,67,68,69,70,72,73,74,75,76,77,78,80,81,84,95,97,99,114,116,123,124,133,139,140,142,143,144,146,147,152,155,156,157,158,159,160,163,164,167,168,171]
 
+# the atoms of the side chain torsion angles of each amino acid, as defined for Bio.PDB internal coordinates
+chi_atoms = {three:{entry[4]:entry[:4] for entry in ic_data.ic_data_sidechains.get(one, []) if len(entry) == 5} for three, one in protein_letters_3to1.items()}
+
+# the longest C-N distance in Angstroms for a peptide bond, beyond which the chain is broken, as in Bio.PDB internal coordinates
+max_peptide_bond = 1.4
+
 
 def cleft_torsion_angles(structure, chain_id, peptide_contacts=True):
     structure.atom_to_internal_coordinates()
@@ -37,10 +46,107 @@ def cleft_torsion_angles(structure, chain_id, peptide_contacts=True):
 
 
 
+def dihedral_angle(p0, p1, p2, p3):
+    """
+    This function returns the dihedral angle in degrees defined by four points, or None if any of them is missing
+    """
+    if any(point is None for point in [p0, p1, p2, p3]):
+        return None
+    b0 = p0 - p1
+    b1 = (p2 - p1) / np.linalg.norm(p2 - p1)
+    b2 = p3 - p2
+    v = b0 - np.dot(b0, b1) * b1
+    w = b2 - np.dot(b2, b1) * b1
+    return float(np.degrees(np.arctan2(np.dot(np.cross(b1, v), w), np.dot(v, w))))
+
+
+def bond_angle(p0, p1, p2):
+    """
+    This function returns the angle in degrees at the second of three points, or None if any of them is missing
+    """
+    if any(point is None for point in [p0, p1, p2]):
+        return None
+    a = p0 - p1
+    b = p2 - p1
+    return float(np.degrees(np.arccos(np.clip(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)), -1, 1))))
+
+
+def peptide_bonded(previous, residue):
+    """
+    This function checks whether a residue continues the chain from the residue before it, with the same rules as Bio.PDB internal coordinates
+    """
+    if previous['residue'] not in protein_letters_3to1 or 'N' not in residue['atoms']:
+        return False
+    if any(atom_name not in previous['atoms'] for atom_name in ['N', 'CA', 'C']):
+        return False
+    return np.sum((residue['atoms']['N'] - previous['atoms']['C']) ** 2) <= max_peptide_bond ** 2
+
+
+def table_cleft_torsion_angles(table, chain_id):
+    """
+    This function measures the same torsion angles as cleft_torsion_angles, from the atom table of the first model of the structure rather than the internal coordinates built by Bio.PDB
+
+    The angles are the same as those from Bio.PDB, except for atoms with alternate locations, where Bio.PDB measures the first location and the table holds the one with the highest occupancy, and for files with more than one model, where cleft_torsion_angles keeps the angles of the last model.
+
+    Args:
+        table (np.ndarray): the atom table of the structure
+        chain_id (str): the id of the class I alpha chain
+
+    Returns:
+        Dict: the angles of the residues which contact the peptide, keyed by residue number
+        Dict: the angles of all of the residues in the cleft, keyed by residue number
+    """
+    in_chain = (table['chain_id'] == chain_id) & ~table['hetero']
+    residues = []
+    for residue_index, rows in residue_rows(table).items():
+        rows = rows[in_chain[rows]]
+        if len(rows) > 0:
+            residues.append({
+                'number':int(table['residue_number'][rows[0]]),
+                'residue':str(table['residue_name'][rows[0]]),
+                'atoms':{str(table['atom_name'][row]):table['coord'][row].astype(np.float64) for row in rows},
+                'next':None
+            })
+    # link the residues into chains, restarting after each break from a residue with its backbone
+    previous = None
+    for residue in residues:
+        residue['previous'] = previous if previous is not None and peptide_bonded(previous, residue) else None
+        residue['built'] = residue['previous'] is not None or all(atom_name in residue['atoms'] for atom_name in ['N', 'CA', 'C'])
+        if residue['previous'] is not None:
+            residue['previous']['next'] = residue
+        previous = residue if residue['built'] else None
+
+    peptide_contact_angles = {}
+    all_cleft_angles = {}
+    for residue in residues:
+        i = residue['number']
+        if i < 180:
+            angle_info = {'residue':residue['residue']}
+            for angle_name in ['phi', 'psi', 'omg', 'cb:ca:c', 'chi1', 'chi2', 'chi3', 'chi4']:
+                angle_info[angle_name] = None
+            if residue['built'] and residue['residue'] in protein_letters_3to1:
+                atoms = residue['atoms']
+                previous = residue['previous']['atoms'] if residue['previous'] is not None else None
+                following = residue['next']['atoms'] if residue['next'] is not None and residue['next']['residue'] in protein_letters_3to1 else None
+                if previous is not None:
+                    angle_info['phi'] = dihedral_angle(previous.get('C'), atoms.get('N'), atoms.get('CA'), atoms.get('C'))
+                    angle_info['omg'] = dihedral_angle(previous.get('CA'), previous.get('C'), atoms.get('N'), atoms.get('CA'))
+                if following is not None:
+                    angle_info['psi'] = dihedral_angle(atoms.get('N'), atoms.get('CA'), atoms.get('C'), following.get('N'))
+                angle_info['cb:ca:c'] = bond_angle(atoms.get('CB'), atoms.get('CA'), atoms.get('C'))
+                for chi, atom_names in chi_atoms[residue['residue']].items():
+                    if chi in angle_info:
+                        angle_info[chi] = dihedral_angle(*[atoms.get(atom_name) for atom_name in atom_names])
+            if i in peptide_contact_positions:
+                peptide_contact_angles[i] = angle_info
+            all_cleft_angles[i] = angle_info
+    return peptide_contact_angles, all_cleft_angles
+
+
 def measure_cleft_angles(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     aligned_key = awsKeyProvider().block_key(pdb_code, 'aligned', 'info')
     aligned, success, errors = s3.get(aligned_key)
     action = {'peptide_contact_position_angles':{},'cleft_torsion_angles':{}}
@@ -58,8 +164,12 @@ def measure_cleft_angles(pdb_code:str, aws_config:Dict, force:bool=False) -> Dic
             assembly_identifier = f'{pdb_code}_{assembly_id}'
             if aligned['aligned']['files'][assembly_id] is not None:
                 cif_key = aligned['aligned']['files'][assembly_id]['files']['file_key']
-                structure = load_cif(cif_key, assembly_identifier, aws_config)
-                peptide_contact_angles, all_cleft_angles = cleft_torsion_angles(structure, chain_ids[i])
+                if aws_config.get('atom_tables'):
+                    table = load_atom_table(cif_key, aws_config)
+                    peptide_contact_angles, all_cleft_angles = table_cleft_torsion_angles(table, chain_ids[i])
+                else:
+                    structure = load_cif(cif_key, assembly_identifier, aws_config)
+                    peptide_contact_angles, all_cleft_angles = cleft_torsion_angles(structure, chain_ids[i])
                 action['peptide_contact_position_angles'][assembly_id] = peptide_contact_angles
                 action['cleft_torsion_angles'][assembly_id] = all_cleft_angles
             else:
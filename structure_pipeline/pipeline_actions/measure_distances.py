@@ -4,8 +4,8 @@ import numpy as np
 
 import Bio.PDB
 
-from common.providers import s3Provider, awsKeyProvider
-from common.helpers import update_block, fetch_core, load_cif
+from common.providers import awsKeyProvider
+from storage import storageProvider, fetch_core, update_block, load_cif, load_atom_table, residue_rows
 import logging
 
 
@@ -75,10 +75,76 @@ def build_c_alpha_set(structure, class_i_alpha_chain, peptide_chain):
     return c_alpha_set
 
 
+def build_table_residue_dictionary(table, rows):
+    c_alphas = rows[table['atom_name'][rows] == 'CA']
+    if len(c_alphas) == 0:
+        return None
+    atom = table[c_alphas[0]]
+    return {
+        'residue_id':int(atom['residue_number']),
+        'chain': str(atom['chain_id']),
+        'residue_name':str(atom['residue_name']),
+        'coords': [str(coord) for coord in atom['coord']],
+        'typed_coords':atom['coord']
+    }
+
+
+def build_c_alpha_set_from_table(table, class_i_alpha_chain, peptide_chain):
+    """
+    This function builds the same C alpha distances as build_c_alpha_set, from the atom table of the first model of the structure
+
+    It fails in the same way too: a residue without a C alpha leaves the set as None, and the next pair measured raises, so measure_distances records the same errors for both
+    """
+    c_alpha_set = {
+        'peptide':{}
+    }
+    selected_residues = {
+        'class_i_alpha':[],
+        'peptide':[]
+    }
+    for residue_index, rows in residue_rows(table).items():
+        first = table[rows[0]]
+        if first['hetero']:
+            continue
+        if first['chain_id'] == class_i_alpha_chain and first['residue_number'] in peptide_contact_positions:
+            selected_residues['class_i_alpha'].append(rows)
+        elif first['chain_id'] == peptide_chain:
+            selected_residues['peptide'].append(rows)
+
+    for peptide_rows in selected_residues['peptide']:
+        for class_i_alpha_rows in selected_residues['class_i_alpha']:
+            pair = {}
+            pair['from'] = build_table_residue_dictionary(table, peptide_rows)
+            pair['to'] = build_table_residue_dictionary(table, class_i_alpha_rows)
+            if pair['from'] is not None and pair['to'] is not None:
+                pair['distance'] = float(np.sqrt(np.sum(pow(pair['from']['typed_coords'] - pair['to']['typed_coords'],2))))
+
+                del pair['from']['typed_coords']
+                del pair['to']['typed_coords']
+
+                res_id = pair['from']['residue_id']
+                if res_id not in c_alpha_set['peptide']:
+                    c_alpha_set['peptide'][res_id] = {
+                        'best_pair':{},
+                        'best_distance':0,
+                        'pairs':[]
+                    }
+                c_alpha_set['peptide'][res_id]['pairs'].append(pair)
+                if c_alpha_set['peptide'][res_id]['best_distance'] == 0:
+                    c_alpha_set['peptide'][res_id]['best_pair'] = pair
+                    c_alpha_set['peptide'][res_id]['best_distance'] = pair['distance']
+                elif pair['distance'] < c_alpha_set['peptide'][res_id]['best_distance']:
+                    c_alpha_set['peptide'][res_id]['best_pair'] = pair
+                    c_alpha_set['peptide'][res_id]['best_distance'] = pair['distance']
+            else:
+                c_alpha_set = None
+    return c_alpha_set
+
+
 def measure_distances(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     aligned_key = awsKeyProvider().block_key(pdb_code, 'aligned', 'info')
     aligned, success, errors = s3.get(aligned_key)
     chains_key = awsKeyProvider().block_key(pdb_code, 'chains', 'info')
@@ -95,9 +161,13 @@ def measure_distances(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
             assembly_identifier = f'{pdb_code}_{assembly_id}'
             if aligned['aligned']['files'][assembly_id] is not None:
                 cif_key = aligned['aligned']['files'][assembly_id]['files']['file_key']
-                structure = load_cif(cif_key, assembly_identifier, aws_config)
                 try:
-                    c_alpha_set = build_c_alpha_set(structure, chain_ids['class_i_alpha'][i], chain_ids['peptide'][i])
+                    if aws_config.get('atom_tables'):
+                        table = load_atom_table(cif_key, aws_config)
+                        c_alpha_set = build_c_alpha_set_from_table(table, chain_ids['class_i_alpha'][i], chain_ids['peptide'][i])
+                    else:
+                        structure = load_cif(cif_key, assembly_identifier, aws_config)
+                        c_alpha_set = build_c_alpha_set(structure, chain_ids['class_i_alpha'][i], chain_ids['peptide'][i])
                 except:
                     c_alpha_set = None
                     step_errors.append('unable_to_build_calpha_set')
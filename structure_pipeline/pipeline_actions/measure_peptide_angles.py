@@ -2,8 +2,8 @@ from typing import Dict, List, Tuple
 
 import Bio.PDB
 
-from common.providers import s3Provider, awsKeyProvider
-from common.helpers import update_block, fetch_core, load_cif
+from common.providers import awsKeyProvider
+from storage import storageProvider, fetch_core, update_block, load_cif
 import logging
 
 
@@ -33,7 +33,7 @@ def peptide_angles(structure):
 def measure_peptide_angles(pdb_code:str, aws_config:Dict, force:bool=False) -> Dict:
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     peptide_structures_key = awsKeyProvider().block_key(pdb_code, 'peptide_structures', 'info')
     peptide_structures, success, errors = s3.get(peptide_structures_key)
     action = {'peptide_angles':{}}
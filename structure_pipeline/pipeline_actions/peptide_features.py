@@ -1,9 +1,10 @@
 from typing import Dict, List, Tuple
 
-from common.providers import s3Provider, awsKeyProvider
-from common.helpers import fetch_core, slugify
+from common.providers import awsKeyProvider
+from common.helpers import slugify
 
 from common.models import itemSet
+from storage import storageProvider, fetch_core
 
 import logging
 
@@ -11,7 +12,7 @@ import logging
 def peptide_features(pdb_code:str, aws_config:Dict, force:bool=False) -> Tuple[Dict,bool,List]:
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     peptide_key = awsKeyProvider().block_key(pdb_code, 'peptide_neighbours', 'info')
     sorted_peptide, success, errors = s3.get(peptide_key)
     
@@ -2,18 +2,63 @@ from typing import Dict, List, Tuple
 
 import Bio.PDB
 
-from common.providers import s3Provider, awsKeyProvider
-from common.helpers import update_block, fetch_core, load_cif
+from common.providers import awsKeyProvider
+from storage import storageProvider, fetch_core, update_block, load_cif, load_atom_table
 import logging
 
 import json
+import numpy as np
+
+
+def table_residue_pairs(table, chain_a, chain_b, cutoff=5):
+    """
+    This function finds the pairs of standard residues in two chains with atoms within the cutoff distance of each other, from the atom table of a structure, as Bio.PDB.NeighborSearch.search_all(cutoff, level='R') does
+
+    Args:
+        table (np.ndarray): the atom table of the structure
+        chain_a (str): the id of the first chain
+        chain_b (str): the id of the second chain
+        cutoff (float): the distance in Angstroms
+
+    Returns:
+        List: the pairs of residues in the order of the residues in the file, as the rows of the first atom of the residue in each chain
+    """
+    standard = ~table['hetero']
+    rows_a = np.nonzero(standard & (table['chain_id'] == chain_a))[0]
+    rows_b = np.nonzero(standard & (table['chain_id'] == chain_b))[0]
+    if len(rows_a) == 0 or len(rows_b) == 0:
+        return []
+    coords_a = table['coord'][rows_a].astype(np.float64)
+    coords_b = table['coord'][rows_b].astype(np.float64)
+    distances = np.sum((coords_a[:, np.newaxis, :] - coords_b[np.newaxis, :, :]) ** 2, axis=2)
+    atoms_a, atoms_b = np.nonzero(distances <= cutoff ** 2)
+    residues, first_rows = np.unique(table['residue_index'], return_index=True)
+    first_row = dict(zip(residues.tolist(), first_rows.tolist()))
+    pairs = sorted(set(zip(table['residue_index'][rows_a[atoms_a]].tolist(), table['residue_index'][rows_b[atoms_b]].tolist())))
+    return [(first_row[residue_a], first_row[residue_b]) for residue_a, residue_b in pairs]
+
+
+def record_contact(contacts, class_i_alpha, class_i_peptide, class_i_details, peptide_details):
+    #TODO offset the peptide and MHC residue ids if needed
+
+    class_i_residue_id = class_i_details['position']
+    peptide_residue_id = peptide_details['position']
+
+    if class_i_residue_id not in contacts[class_i_alpha]:
+        contacts[class_i_alpha][class_i_residue_id] = {'position':class_i_residue_id, 'residue':class_i_details['residue'], 'neighbours':[] }
+    contacts[class_i_alpha][class_i_residue_id]['neighbours'].append(peptide_details)
+
+    if peptide_residue_id not in contacts[class_i_peptide]:
+        contacts[class_i_peptide][peptide_residue_id] = {'position':peptide_residue_id, 'residue':peptide_details['residue'], 'neighbours':[] }
+    if class_i_details not in contacts[class_i_peptide][peptide_residue_id]['neighbours']:
+        contacts[class_i_peptide][peptide_residue_id]['neighbours'].append(class_i_details)
 
 
 def peptide_neighbours(pdb_code:str, aws_config:Dict, force:bool=False) -> Tuple[Dict,bool,List]:
     logging.warn(pdb_code)
     step_errors = []
     core, success, errors = fetch_core(pdb_code, aws_config)
-    s3 = s3Provider(aws_config)
+    s3 = storageProvider(aws_config)
     chains_key = awsKeyProvider().block_key(pdb_code, 'chains', 'info')
     chains, success, errors = s3.get(chains_key)
     mhc_class = None
@@ -41,9 +86,34 @@ def peptide_neighbours(pdb_code:str, aws_config:Dict, force:bool=False) -> Tuple
                 peptide_neighbours[assembly_id] = {}
                 cif_key = core['assemblies']['files'][assembly_id]['files']['file_key']
                 assembly_identifier = f'{pdb_code}_{assembly_id}'
+                if aws_config.get('atom_tables'):
+                    table = load_atom_table(cif_key, aws_config)
+                    if table is not None:
+                        for chain_id in dict.fromkeys(table['chain_id'].tolist()):
+                            if chain_id in chains_to_test:
+                                if chain_id in peptide_chains:
+                                    class_i_peptide = chain_id
+                                else:
+                                    class_i_alpha = chain_id
+                                contacts[chain_id] = {}
+                        try:
+                            for class_i_row, peptide_row in table_residue_pairs(table, class_i_alpha, class_i_peptide):
+                                class_i_details = {'residue':str(table['residue_name'][class_i_row]), 'position':int(table['residue_number'][class_i_row])}
+                                peptide_details = {'residue':str(table['residue_name'][peptide_row]), 'position':int(table['residue_number'][peptide_row])}
+                                record_contact(contacts, class_i_alpha, class_i_peptide, class_i_details, peptide_details)
+                        except:
+                            step_errors.append('unknown_biopython_neighbour_exception')
+                            class_i_peptide = None
+                            sorted_peptide = None
+                        if class_i_peptide:
+                            sorted_peptide = dict(sorted(contacts[class_i_peptide].items()))
+                    if sorted_peptide:
+                        sorted_peptides[assembly_id] = sorted_peptide
+                    continue
                 structure = load_cif(cif_key, assembly_identifier, aws_config)
                 if structure:
                     all_atoms = []
+                    residue_order = {}
                     for chain in structure.get_chains():
                         if chain.get_id() in chains_to_test:
                             if chain.get_id() in peptide_chains:
@@ -53,11 +123,13 @@ def peptide_neighbours(pdb_code:str, aws_config:Dict, force:bool=False) -> Tuple
                             contacts[chain.get_id()] = {}
                             for residue in chain:
                                 if residue.id[0] == ' ':
+                                    residue_order[residue.get_full_id()] = len(residue_order)
                                     for atom in residue:
                                         all_atoms.append(atom)
                     try:                    
                         neighbor = Bio.PDB.NeighborSearch(all_atoms)
                         neighbours = neighbor.search_all(5, level='R')
+                        residue_pairs = []
                         for residue_pair in neighbours:
                             residue_1 = residue_pair[0]
                             residue_2 = residue_pair[1]
@@ -65,27 +137,14 @@ def peptide_neighbours(pdb_code:str, aws_config:Dict, force:bool=False) -> Tuple
                                 chain_pair = [residue_1.get_parent().id, residue_2.get_parent().id]
                                 if class_i_peptide in chain_pair and class_i_alpha in chain_pair:
                                     if residue_1.get_parent().id == class_i_alpha:
-                                        class_i_details = {'residue':residue_1.resname, 'position':residue_1.get_id()[1]}
-                                        peptide_details = {'residue':residue_2.resname, 'position':residue_2.get_id()[1]}
+                                        residue_pairs.append((residue_1, residue_2))
                                     else:
-                                        peptide_details = {'residue':residue_1.resname, 'position':residue_1.get_id()[1]}
-                                        class_i_details = {'residue':residue_2.resname, 'position':residue_2.get_id()[1]}
-            
-
-                                    #TODO offset the peptide and MHC residue ids if needed
-                                    
-                                    class_i_residue_id = class_i_details['position']
-                                    peptide_residue_id = peptide_details['position']
-
-
-                                    if class_i_residue_id not in contacts[class_i_alpha]:
-                                        contacts[class_i_alpha][class_i_residue_id] = {'position':class_i_residue_id, 'residue':class_i_details['residue'], 'neighbours':[] }
-                                    contacts[class_i_alpha][class_i_residue_id]['neighbours'].append(peptide_details)
-
-                                    if peptide_residue_id not in contacts[class_i_peptide]:
-                                        contacts[class_i_peptide][peptide_residue_id] = {'position':peptide_residue_id, 'residue':peptide_details['residue'], 'neighbours':[] }
-                                    if class_i_details not in contacts[class_i_peptide][peptide_residue_id]['neighbours']:
-                                        contacts[class_i_peptide][peptide_residue_id]['neighbours'].append(class_i_details)
+                                        residue_pairs.append((residue_2, residue_1))
+                        # search_all returns the pairs in the order of a set, which changes from process to process, so the contacts are recorded in the order of the residues in the file, as they are from the atom table
+                        for class_i_residue, peptide_residue in sorted(residue_pairs, key=lambda pair: (residue_order[pair[0].get_full_id()], residue_order[pair[1].get_full_id()])):
+                            class_i_details = {'residue':class_i_residue.resname, 'position':class_i_residue.get_id()[1]}
+                            peptide_details = {'residue':peptide_residue.resname, 'position':peptide_residue.get_id()[1]}
+                            record_contact(contacts, class_i_alpha, class_i_peptide, class_i_details, peptide_details)
                     except:
                         step_errors.append('unknown_biopython_neighbour_exception')
                         class_i_peptide = None
@@ -1,9 +1,10 @@
 from typing import Dict, List, Tuple
 
-from common.providers import s3Provider, awsKeyProvider, PDBeProvider
-from common.helpers import process_step_errors, update_block, fetch_core, slugify
+from common.providers import awsKeyProvider, PDBeProvider
+from common.helpers import process_step_errors, slugify
 
 from common.models import itemSet
+from storage import storageProvider, fetch_core, update_block
 
 import logging
 
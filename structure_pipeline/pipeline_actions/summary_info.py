@@ -1,9 +1,10 @@
 from typing import Dict, List, Tuple
 
 from common.providers import PDBeProvider
-from common.helpers import update_block, fetch_core, process_step_errors, slugify
+from common.helpers import process_step_errors, slugify
 
 from common.models import itemSet
+from storage import fetch_core, update_block
 
 import datetime
 
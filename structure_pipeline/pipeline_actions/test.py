@@ -1,6 +1,7 @@
 from typing import Dict, Tuple, List, Optional, Union
 
-from common.providers import s3Provider, awsKeyProvider
+from common.providers import awsKeyProvider
+from storage import storageProvider
 
 import logging
 
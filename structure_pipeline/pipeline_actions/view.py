@@ -1,7 +1,6 @@
 from typing import Dict, Tuple, List, Optional, Union
 
-from common.providers import s3Provider, awsKeyProvider
-from common.helpers import fetch_core
+from storage import fetch_facets
 
 import logging
 
@@ -20,14 +19,10 @@ def view(pdb_code:str, aws_config: Dict, force: bool=False) -> Tuple[Dict, bool,
         List: A list of error strings (errors)
     """
     blocks = ['chains', 'allele_match', 'peptide_matches', 'peptide_neighbours', 'peptide_structures', 'peptide_angles', 'cleft_angles', 'c_alpha_distances']
-    core, success, errors = fetch_core(pdb_code, aws_config)
+    facets, success, errors = fetch_facets(pdb_code, ['core'] + blocks, aws_config)
+    core = facets['core']
     core['pdb_code'] = pdb_code
-    core['facets'] = {}
-    s3 = s3Provider(aws_config)
-    for block in blocks:
-        block_key = awsKeyProvider().block_key(pdb_code, block, 'info')
-        block_data, success, errors = s3.get(block_key)
-        core['facets'][block] = block_data
+    core['facets'] = {block:facets[block] for block in blocks}
     output = {
         'action': core,
         'core': None
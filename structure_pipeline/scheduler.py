@@ -0,0 +1,161 @@
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from storage import runContext
+
+from .workers import run_member, build_chain
+from .fingerprints import fingerprinted, is_skipped
+
+import contextvars
+import structure_pipeline
+import time
+
+
+def facets_conflict(first:str, second:str) -> bool:
+    """
+    This function checks whether two facets overlap, either because they are the same or because one contains the other
+
+    Facets are block names e.g. 'chains', or dotted paths to keys within a block e.g. 'core.peptide'. So 'core' overlaps 'core.peptide', but 'core.peptide' doesn't overlap 'core.organism'
+
+    Args:
+        first (str): the first facet
+        second (str): the second facet
+
+    Returns:
+        bool: True if the facets overlap
+    """
+    return first == second or first.startswith(f'{second}.') or second.startswith(f'{first}.')
+
+
+def any_conflict(firsts:List, seconds:List) -> bool:
+    """
+    This function checks whether any facet in one list overlaps any facet in another
+    """
+    return any(facets_conflict(first, second) for first in firsts for second in seconds)
+
+
+def build_dag(actions:Dict, steps:List) -> Dict:
+    """
+    This function builds the dependencies between a chain of steps from the facets each step reads and writes
+
+    A step depends on an earlier step in the chain if it reads something the earlier step writes, or writes something the earlier step reads or writes. Steps which don't declare their reads and writes depend on every earlier step, and every later step depends on them.
+
+    Args:
+        actions (Dict): the pipeline actions for a class of MHC molecule e.g. pipeline_actions['class_i']
+        steps (List): the routes of the steps in chain order, as returned by build_chain
+
+    Returns:
+        Dict: the set of routes each step depends on, keyed by route
+    """
+    dag = {}
+    for position, route in enumerate(steps):
+        dag[route] = set()
+        step = actions[route]
+        for earlier in steps[:position]:
+            earlier_step = actions[earlier]
+            if 'reads' not in step or 'reads' not in earlier_step:
+                dag[route].add(earlier)
+            elif any_conflict(step['reads'], earlier_step['writes']):
+                dag[route].add(earlier)
+            elif any_conflict(step['writes'], earlier_step['reads'] + earlier_step['writes']):
+                dag[route].add(earlier)
+    return dag
+
+
+def dag_levels(dag:Dict) -> List:
+    """
+    This function groups the steps of a dependency graph into levels, where each step only depends on steps in earlier levels
+
+    The steps within a level can all run at the same time
+
+    Args:
+        dag (Dict): the dependencies of each step, as returned by build_dag
+
+    Returns:
+        List: a list of lists of routes
+    """
+    levels = []
+    placed = set()
+    while len(placed) < len(dag):
+        level = [route for route in dag if route not in placed and dag[route] <= placed]
+        levels.append(level)
+        placed.update(level)
+    return levels
+
+
+def run_scheduled(pdb_code:str, aws_config:Dict, force:bool=False, mhc_class:str='class_i', start:str='initialise', end:Optional[str]=None, max_workers:int=4) -> Tuple[Dict, bool, List]:
+    """
+    This function runs a chain of pipeline actions over a single structure, running steps which don't depend on each other at the same time
+
+    The order of the steps comes from the facets each step declares that it reads and writes (see build_dag) rather than from the 'next' links. As with run_fused, the steps share a run context, so blocks are read and structures are parsed once and everything written is flushed at the end of the run.
+
+    It has the same signature and return values as a pipeline action, so it can be run over a set with run_members, which runs structures at the same time as well.
+
+    Args:
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+        force (bool): passed through to every step
+        mhc_class (str): the class of MHC molecule e.g. 'class_i'
+        start (str): the route of the first step e.g. 'initialise'
+        end (str): the route of the last step, defaults to the end of the pipeline
+        max_workers (int): the number of steps to run at the same time
+
+    Returns:
+        Dict: A dictionary of the output of each step, the levels of the graph, the timings and the run context stats (output)
+        bool: A boolean of True or False (success)
+        List: A list of error strings (errors)
+    """
+    # the pipeline actions are looked up when the run starts, as this step is itself one of the pipeline actions
+    actions = structure_pipeline.pipeline_actions[mhc_class]
+    if pdb_code in structure_pipeline.exclude_pdb_codes:
+        return {'action':{'error':'in exclusion list'}, 'core':{'error':'in exclusion list'}}, False, ['file_excluded_obsolete']
+    steps_in_order = build_chain(actions, start=start, end=end)
+    dag = build_dag(actions, steps_in_order)
+    step_errors = []
+    steps = {}
+    outputs = {}
+    start_time = time.perf_counter()
+    with runContext(aws_config) as context:
+        done = set()
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            while len(done) < len(steps_in_order):
+                for route in steps_in_order:
+                    if route not in done and route not in running.values() and dag[route] <= done:
+                        # each step runs in a copy of this context, so the app context and the run context are available to it
+                        future = executor.submit(contextvars.copy_context().run, run_member, fingerprinted(actions[route], route), pdb_code, aws_config, force)
+                        running[future] = route
+                finished, pending = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    route = running.pop(future)
+                    pdb_code, data, errors, elapsed = future.result()
+                    steps[route] = {
+                        'name':actions[route]['name'],
+                        'errors':errors,
+                        'skipped':is_skipped(data),
+                        'time':round(elapsed, 3)
+                    }
+                    if errors:
+                        step_errors += [f'{route}__{error}' if isinstance(error, str) else error for error in errors]
+                    outputs[route] = data
+                    done.add(route)
+        flush_start = time.perf_counter()
+    flush_time = time.perf_counter() - flush_start
+    for error in context.errors:
+        step_errors.append(f'flush__{error["key"]}')
+    core = None
+    for route in steps_in_order:
+        if outputs.get(route) and outputs[route].get('core'):
+            core = outputs[route]['core']
+    action = {
+        'steps':{route:steps[route] for route in steps_in_order},
+        'levels':dag_levels(dag),
+        'flush_time':round(flush_time, 3),
+        'wall_time':round(time.perf_counter() - start_time, 3),
+        'context':context.stats
+    }
+    output = {
+        'action':action,
+        'core':core
+    }
+    return output, len(context.errors) == 0, step_errors
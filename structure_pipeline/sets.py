@@ -0,0 +1,128 @@
+from typing import Dict, List, Optional, Tuple
+
+from common.helpers import slugify
+from common.models import itemSet
+
+from storage import storageProvider
+
+import logging
+
+
+error_set_context = 'errors'
+
+
+def fetch_set_members(set_context:str, set_slug:str, page_size:int=100) -> List:
+    """
+    This function fetches all of the members of a set, page by page
+
+    Args:
+        set_context (str): the context of the set e.g. 'search_query'
+        set_slug (str): the slug of the set e.g. 'class_i_pdbefold_query'
+        page_size (int): the number of members to fetch per page
+
+    Returns:
+        List: the pdb codes of the members of the set
+    """
+    members = []
+    page_number = 1
+    while True:
+        itemset, success, errors = itemSet(set_slug, set_context).get(page_number=page_number, page_size=page_size)
+        if not success or not itemset or not itemset['members']:
+            break
+        page_members = [pdb_code.lower() for pdb_code in itemset['members']]
+        # guard against a set which returns the last page for any page number beyond the end
+        if page_members[0] in members:
+            break
+        members += page_members
+        if len(page_members) < page_size:
+            break
+        page_number += 1
+    return members
+
+
+def error_set_slug(action_name:str, error_type:str) -> str:
+    """
+    This function returns the slug of the autogenerated error set for an action and error type, named '<action> | <error>'
+    """
+    return slugify(f'{action_name} | {error_type}')
+
+
+def error_index_key(action_name:str) -> str:
+    """
+    This function returns the key of the index of the error types which have error sets for an action
+    """
+    return f'pipeline/error_sets/{slugify(action_name)}.json'
+
+
+def record_error_types(action_name:str, error_types:List, aws_config:Dict) -> List:
+    """
+    This function adds error types to the index of error sets for an action, so that the error sets can be found to retry them
+
+    Args:
+        action_name (str): the display name of the action e.g. 'Align structures'
+        error_types (List): the error types which have error sets
+        aws_config (Dict): the configuration details for AWS for the current app
+
+    Returns:
+        List: all of the error types in the index
+    """
+    s3 = storageProvider(aws_config)
+    index, success, errors = s3.get(error_index_key(action_name))
+    if not success or not index:
+        index = {'action_name':action_name, 'error_types':[]}
+    new_error_types = [error_type for error_type in error_types if error_type not in index['error_types']]
+    if len(new_error_types) > 0:
+        index['error_types'] += new_error_types
+        data, success, errors = s3.put(error_index_key(action_name), index)
+        if not success:
+            logging.warn(f'UNABLE TO UPDATE ERROR SET INDEX FOR {action_name}')
+    return index['error_types']
+
+
+def fetch_error_members(action_name:str, aws_config:Dict, error_types:Optional[List]=None) -> Tuple[List, Dict]:
+    """
+    This function fetches the members of the error sets for an action
+
+    Args:
+        action_name (str): the display name of the action e.g. 'Align structures'
+        aws_config (Dict): the configuration details for AWS for the current app
+        error_types (List): only fetch the error sets for these error types, defaults to all of the error types in the index
+
+    Returns:
+        List: the pdb codes which are in any of the error sets, in the order found
+        Dict: the pdb codes in each error set, keyed by error type
+    """
+    if error_types is None:
+        index, success, errors = storageProvider(aws_config).get(error_index_key(action_name))
+        error_types = index['error_types'] if success and index else []
+    members = []
+    by_error = {}
+    for error_type in error_types:
+        by_error[error_type] = fetch_set_members(error_set_context, error_set_slug(action_name, error_type))
+        members += [pdb_code for pdb_code in by_error[error_type] if pdb_code not in members]
+    return members, by_error
+
+
+def clear_resolved_errors(action_name:str, by_error:Dict, members:List, errordict:Dict) -> Dict:
+    """
+    This function removes the members which no longer have an error from the error sets for an action
+
+    Each error set is updated with one write, removing all of its resolved members at once. A member which now fails with a different error is added to that error set by store_error_sets when the stats for the run are rolled up.
+
+    Args:
+        action_name (str): the display name of the action e.g. 'Align structures'
+        by_error (Dict): the pdb codes in each error set, keyed by error type, as returned by fetch_error_members
+        members (List): the pdb codes the action was re-run on
+        errordict (Dict): a dictionary of error lists from the re-run keyed by pdb code
+
+    Returns:
+        Dict: the pdb codes removed from each error set, keyed by error type
+    """
+    resolved = {}
+    for error_type in by_error:
+        resolved[error_type] = [pdb_code for pdb_code in by_error[error_type] if pdb_code in members and error_type not in (errordict.get(pdb_code) or [])]
+        if len(resolved[error_type]) > 0:
+            itemset, success, errors = itemSet(error_set_slug(action_name, error_type), error_set_context).remove_members(resolved[error_type])
+            if not success:
+                logging.warn(f'UNABLE TO UPDATE ERROR SET {action_name} | {error_type}')
+    return resolved
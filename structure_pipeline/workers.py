@@ -0,0 +1,192 @@
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from storage import active_context, runContext
+
+from .fingerprints import is_skipped
+
+import contextvars
+import logging
+import multiprocessing
+import time
+
+
+execution_modes = ['serial', 'thread', 'process']
+
+# process pool workers are started afresh rather than forked, so that they don't inherit the locks of the storage layer (or of the job queue) in whatever state another thread held them at the fork
+process_start_method = 'spawn'
+
+
+def run_member(action:Callable, pdb_code:str, aws_config:Dict, force:bool=False) -> Tuple[str, Union[Dict, None], Union[List, None], float]:
+    """
+    This function runs a single pipeline action on a single structure and times it
+
+    It is a module level function so that it can be pickled and sent to a process pool. If the action runs in a run context, the updates it coalesced are flushed when it finishes (see runContext.end_step)
+
+    Args:
+        action (Callable): the pipeline action function e.g. align_structures
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+        force (bool): passed through to the action
+
+    Returns:
+        str: the pdb code of the structure
+        Dict: the output of the action, or None if it raised
+        List: a list of error strings from the action
+        float: the wall time for the action in seconds
+    """
+    start = time.perf_counter()
+    try:
+        data, success, errors = action(pdb_code, aws_config, force)
+    except Exception as e:
+        logging.warn(f'UNHANDLED EXCEPTION FOR {pdb_code}')
+        logging.warn(e)
+        data = None
+        errors = [f'unhandled_exception__{type(e).__name__.lower()}']
+    finally:
+        context = active_context()
+        if context is not None:
+            context.end_step()
+    return pdb_code, data, errors, time.perf_counter() - start
+
+
+def run_member_in_context(action:Callable, pdb_code:str, aws_config:Dict, force:bool, options:Dict) -> Tuple[Tuple, Dict, List]:
+    """
+    This function runs a single pipeline action on a single structure in a process pool worker, in a run context of its own set up like the caller's, as the worker doesn't inherit the caller's run context
+
+    Args:
+        action (Callable): the pipeline action function e.g. align_structures
+        pdb_code (str): the pdb code of the structure
+        aws_config (Dict): the configuration details for AWS for the current app
+        force (bool): passed through to the action
+        options (Dict): the defer_writes, cache_formats and coalesce_updates of the caller's run context
+
+    Returns:
+        Tuple: the result of run_member
+        Dict: the stats of the worker's run context
+        List: the errors from flushing the worker's run context
+    """
+    with runContext(aws_config, **options) as context:
+        result = run_member(action, pdb_code, aws_config, force)
+    return result, context.stats, context.errors
+
+
+def run_members(action:Callable, pdb_codes:List, aws_config:Dict, execution:str='serial', max_workers:int=1, force:bool=False, outputs:Optional[Dict]=None) -> Tuple[List, Dict, Dict, List]:
+    """
+    This function runs a pipeline action over a list of structures, either one at a time or concurrently
+
+    Threads suit the steps which mostly wait on the network (PDBe, IEDB, S3), processes suit the steps which spend their time in BioPython
+
+    Threads run in a copy of the caller's context, so they share its run context. Process pool workers can't, so if there is an active run context each structure runs in a run context of its own in the worker, set up in the same way (see run_member_in_context). Its reads are cached and its updates coalesced for that structure only, and its stats and flush errors are added to the caller's run context.
+
+    Args:
+        action (Callable): the pipeline action function e.g. align_structures
+        pdb_codes (List): the pdb codes of the structures to run the action on
+        aws_config (Dict): the configuration details for AWS for the current app
+        execution (str): one of 'serial', 'thread' or 'process'
+        max_workers (int): the size of the worker pool, a value of 1 runs serially
+        force (bool): passed through to the action
+        outputs (Dict): a dictionary to collect the output of the action for each structure in, keyed by pdb code
+
+    Returns:
+        List: the pdb codes for which the action returned data (successes), in the order given
+        Dict: a dictionary of error lists keyed by pdb code (errordict)
+        Dict: a dictionary of wall times in seconds keyed by pdb code (timings)
+        List: the pdb codes for which the step was skipped as its inputs were unchanged (skipped)
+    """
+    if execution not in execution_modes:
+        execution = 'serial'
+    results = {}
+    if execution == 'serial' or max_workers <= 1 or len(pdb_codes) <= 1:
+        for pdb_code in pdb_codes:
+            results[pdb_code] = run_member(action, pdb_code, aws_config, force)
+    else:
+        if execution == 'process':
+            executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(process_start_method))
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        context = active_context()
+        with executor:
+            if execution == 'process' and context is not None:
+                options = {'defer_writes':context.defer_writes, 'cache_formats':context.cache_formats, 'coalesce_updates':context.coalesce_updates}
+                futures = [executor.submit(run_member_in_context, action, pdb_code, aws_config, force, options) for pdb_code in pdb_codes]
+            elif execution == 'process':
+                futures = [executor.submit(run_member, action, pdb_code, aws_config, force) for pdb_code in pdb_codes]
+            else:
+                # each thread runs in a copy of the caller's context, so that the app context (and any run context) is available to the action
+                futures = [executor.submit(contextvars.copy_context().run, run_member, action, pdb_code, aws_config, force) for pdb_code in pdb_codes]
+            for future in as_completed(futures):
+                result = future.result()
+                if execution == 'process' and context is not None:
+                    result, stats, errors = result
+                    with context.lock:
+                        for counter in stats:
+                            context.stats[counter] = context.stats.get(counter, 0) + stats[counter]
+                        context.errors += errors
+                results[result[0]] = result
+    successes = []
+    errordict = {}
+    timings = {}
+    skipped = []
+    for pdb_code in pdb_codes:
+        pdb_code, data, errors, elapsed = results[pdb_code]
+        if outputs is not None:
+            outputs[pdb_code] = data
+        if data:
+            successes.append(pdb_code)
+        if is_skipped(data):
+            skipped.append(pdb_code)
+        if errors:
+            errordict[pdb_code] = errors
+        timings[pdb_code] = round(elapsed, 3)
+    return successes, errordict, timings, skipped
+
+
+def build_chain(actions:Dict, start:str='initialise', end:Optional[str]=None) -> List:
+    """
+    This function follows the 'next' links in a pipeline actions dictionary to build the list of steps to run
+
+    The chain stops at the end step (inclusive), or at the 'view' step which ends the pipeline
+
+    Args:
+        actions (Dict): the pipeline actions for a class of MHC molecule e.g. pipeline_actions['class_i']
+        start (str): the route of the first step e.g. 'initialise'
+        end (str): the route of the last step, defaults to the end of the pipeline
+
+    Returns:
+        List: the routes of the steps in order
+    """
+    steps = []
+    route = start
+    while route is not None:
+        if route == 'view' and end != 'view':
+            break
+        steps.append(route)
+        if route == end:
+            break
+        route = actions[route]['next']
+    return steps
+
+
+def summarise_timings(timings:Dict, wall_time:float) -> Dict:
+    """
+    This function summarises the per structure timings for a page of a set run
+
+    Args:
+        timings (Dict): a dictionary of wall times in seconds keyed by pdb code
+        wall_time (float): the wall time in seconds for the whole page
+
+    Returns:
+        Dict: the per structure timings along with the total, mean and slowest
+    """
+    summary = {
+        'by_pdb_code':timings,
+        'wall_time':round(wall_time, 3),
+        'total':round(sum(timings.values()), 3),
+        'mean':None,
+        'slowest':None
+    }
+    if len(timings) > 0:
+        summary['mean'] = round(summary['total'] / len(timings), 3)
+        summary['slowest'] = max(timings, key=timings.get)
+    return summary
@@ -0,0 +1,97 @@
+import os
+import sys
+
+import pytest
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture
+def fragment_cif() -> str:
+    """
+    Residues 151-170 of chain A of 1A8O (HIV capsid, with a selenomethionine at 151) and three waters, with an alternate location added for the CB of residue 152, an insertion code on the last water and a second model
+    """
+    with open(os.path.join(data_dir, '1a8o_fragment.cif')) as cif_file:
+        return cif_file.read()
+
+
+@pytest.fixture
+def fragment_path() -> str:
+    return os.path.join(data_dir, '1a8o_fragment.cif')
+
+
+@pytest.fixture
+def complex_cif(fragment_cif) -> str:
+    """
+    The first model of the fragment, with residues 151-157 moved into a chain P of their own, so that there are two chains in contact (as for the peptide and the class I alpha chain of a complex)
+    """
+    lines = []
+    for line in fragment_cif.splitlines():
+        tokens = line.split()
+        if tokens and tokens[0] in ['ATOM', 'HETATM']:
+            if tokens[-1] != '1':
+                continue
+            if tokens[5] != 'HOH' and int(tokens[21]) < 158:
+                tokens[6] = tokens[23] = 'P'
+            line = ' '.join(tokens)
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.fixture
+def aws_config(tmp_path):
+    """
+    An AWS configuration for the local storage backend, in a directory of its own for each test
+    """
+    from storage import reset_backends
+    reset_backends()
+    yield {
+        'storage_backend':'local',
+        'local_storage_path':str(tmp_path),
+        's3_bucket':'test',
+        'storage_pool':True,
+        'block_cache_ttl':0
+    }
+    reset_backends()
+
+
+def block_writer(facet:str, value):
+    """
+    This function returns a pipeline action which writes a block with a fixed value
+    """
+    def action(pdb_code, aws_config, force=False):
+        from storage import update_block
+        data, success, errors = update_block(pdb_code, facet, 'info', {'value':value}, aws_config)
+        return {'action':{'value':value}, 'core':None}, success, []
+    action.__name__ = f'write_{facet}'
+    return action
+
+
+@pytest.fixture
+def actions():
+    """
+    A chain of steps like the class I pipeline, each writing a block, which declare the facets they read and write
+    """
+    return {
+        'initialise':{'action':block_writer('core', 'initialised'), 'reads':['core'], 'writes':['core'], 'next':'assign_chains'},
+        'assign_chains':{'action':block_writer('chains', 'A'), 'reads':['core.value'], 'writes':['chains'], 'next':'align'},
+        'align':{'action':block_writer('aligned', '1hhk_1'), 'reads':['chains'], 'writes':['aligned'], 'next':'measure_distances'},
+        'measure_distances':{'action':block_writer('c_alpha_distances', 1.8), 'reads':['aligned'], 'writes':['c_alpha_distances'], 'next':'fetch_experiment'},
+        'fetch_experiment':{'action':block_writer('experiment', 'x-ray'), 'reads':['core.resolution'], 'writes':['experiment'], 'next':'view'},
+    }
+
+
+@pytest.fixture
+def run_pipeline(actions):
+    """
+    A function which runs each of the actions on a structure in turn, skipping the steps whose inputs are unchanged
+    """
+    from structure_pipeline.fingerprints import run_if_stale, step_version
+    def run(pdb_code, aws_config):
+        for route, step in actions.items():
+            output, success, errors = run_if_stale(step['action'], route, step['reads'], step_version(step), pdb_code, aws_config)
+            assert success
+    return run
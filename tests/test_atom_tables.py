@@ -0,0 +1,26 @@
+from storage import atom_table_key, load_atom_table, parse_atom_site, store_atom_table, storageProvider
+
+
+def test_atom_table_key():
+    assert atom_table_key('structures/files/aligned/1hhk_1.cif') == 'structures/files/aligned/1hhk_1.atoms.npz'
+
+
+def test_load_atom_table_does_not_write(fragment_cif, aws_config):
+    file_key = 'structures/files/split/1a8o_1.cif'
+    storageProvider(aws_config).put(file_key, fragment_cif, data_format='cif')
+    table = load_atom_table(file_key, aws_config)
+    assert len(table) == len(parse_atom_site(fragment_cif))
+    data, success, errors = storageProvider(aws_config).get(atom_table_key(file_key), data_format='binary')
+    assert not success
+
+
+def test_stored_atom_table_round_trip(fragment_cif, aws_config):
+    file_key = 'structures/files/split/1a8o_1.cif'
+    table = parse_atom_site(fragment_cif)
+    assert store_atom_table(file_key, table, aws_config)
+    # the table is read in preference to the (missing) file
+    assert (load_atom_table(file_key, aws_config) == table).all()
+
+
+def test_load_atom_table_missing_file(aws_config):
+    assert load_atom_table('structures/files/split/none_1.cif', aws_config) is None
@@ -0,0 +1,66 @@
+from io import StringIO
+
+import Bio.PDB
+import numpy as np
+
+from storage import atom_table, parse_atom_site, residue_rows
+from storage.atoms import cif_tokens
+
+
+def parsed_structure(path):
+    return Bio.PDB.MMCIFParser(QUIET=True).get_structure('1a8o', path)
+
+
+def test_parse_atom_site_matches_atom_table(fragment_cif, fragment_path):
+    parsed = parse_atom_site(fragment_cif)
+    built = atom_table(parsed_structure(fragment_path))
+    assert len(parsed) == len(built)
+    for field in ['chain_id', 'residue_index', 'residue_number', 'insertion_code', 'residue_name', 'hetero', 'atom_name', 'element']:
+        assert (parsed[field] == built[field]).all(), field
+    assert np.allclose(parsed['b_factor'], built['b_factor'])
+    assert np.allclose(parsed['coord'], built['coord'])
+
+
+def test_parse_atom_site_reads_the_first_model(fragment_cif):
+    table = parse_atom_site(fragment_cif)
+    assert table['residue_number'].min() == 151
+    # the second model moves the first five atoms
+    assert np.allclose(table['coord'][0], [19.594, 32.367, 28.012])
+
+
+def test_parse_atom_site_keeps_waters_and_insertion_codes(fragment_cif):
+    table = parse_atom_site(fragment_cif)
+    waters = table[table['residue_name'] == 'HOH']
+    assert len(waters) == 3
+    assert waters['hetero'].all()
+    assert (waters['chain_id'] == 'A').all()
+    assert list(waters['insertion_code']) == ['', '', 'A']
+    assert not table[table['residue_name'] != 'HOH']['hetero'].any()
+
+
+def test_parse_atom_site_selects_alternate_locations(fragment_cif):
+    def beta_carbon(table):
+        return table[(table['residue_number'] == 152) & (table['atom_name'] == 'CB')]
+    highest_occupancy = beta_carbon(parse_atom_site(fragment_cif))
+    selected = beta_carbon(parse_atom_site(fragment_cif, alt_loc='B'))
+    assert len(highest_occupancy) == 1 and len(selected) == 1
+    assert np.isclose(selected['coord'][0][0] - highest_occupancy['coord'][0][0], 0.8)
+
+
+def test_parse_atom_site_accepts_bytes_and_lines(fragment_cif):
+    table = parse_atom_site(fragment_cif)
+    assert (parse_atom_site(fragment_cif.encode('utf-8')) == table).all()
+    assert (parse_atom_site(StringIO(fragment_cif)) == table).all()
+
+
+def test_cif_tokens_unquotes_values():
+    assert cif_tokens('''ATOM 1 O "O5'" . A''') == ['ATOM', '1', 'O', "O5'", '.', 'A']
+    assert cif_tokens("HETATM 2 C 'C 1' .") == ['HETATM', '2', 'C', 'C 1', '.']
+
+
+def test_residue_rows_follow_the_table(fragment_cif):
+    table = parse_atom_site(fragment_cif)
+    rows = residue_rows(table)
+    assert sum(len(residue) for residue in rows.values()) == len(table)
+    for residue_index, residue in rows.items():
+        assert (table['residue_index'][residue] == residue_index).all()
@@ -0,0 +1,38 @@
+import pytest
+
+from structure_pipeline.alignment import alignment_summary_key, summarise_alignments
+
+
+def test_summarise_alignments():
+    outputs = {
+        '1hhk':{'alignments':{'1':{'rmsd':0.4}, '2':{'rmsd':0.5}}},
+        '1hhj':{'alignments':{'1':{'rmsd':0.45}, '2':{'error':'no_class_i_alpha_chain'}}},
+        '2bnr':{'alignments':{'1':{'rmsd':0.55}, '2':{'rmsd':0.5}}},
+        '3mre':{'alignments':{'1':{'rmsd':6.0}}},
+        '1a1m':{'alignments':{}},
+        '1a1n':None
+    }
+    summary = summarise_alignments(outputs, list(outputs), bins=4)
+    assert summary['structures'] == 6
+    assert summary['aligned'] == 6
+    assert summary['rmsd']['median'] == pytest.approx(0.5)
+    assert summary['rmsd']['max'] == pytest.approx(6.0)
+    assert sum(summary['rmsd']['histogram']['counts']) == 6
+    assert summary['outliers'] == [{'identifier':'3mre_1', 'rmsd':6.0}]
+    assert summary['failures'] == {
+        'no_chains_to_align':{'count':1, 'members':['1a1m']},
+        'no_class_i_alpha_chain':{'count':1, 'members':['1hhj_2']},
+        'unable_to_align_structure':{'count':1, 'members':['1a1n']}
+    }
+
+
+def test_summarise_alignments_with_nothing_aligned():
+    summary = summarise_alignments({}, ['1hhk'])
+    assert summary['aligned'] == 0
+    assert summary['rmsd'] is None
+    assert summary['outliers'] == []
+
+
+def test_alignment_summary_key():
+    assert alignment_summary_key('class_i', 'search_query', 'class_i_pdbefold_query') == 'pipeline/alignment/class_i/search_query/class_i_pdbefold_query.json'
+    assert alignment_summary_key('class_i', None, None) == 'pipeline/alignment/class_i/runs/latest.json'
@@ -0,0 +1,63 @@
+import pytest
+
+from common.providers import awsKeyProvider
+from storage import build_inventory, fetch_facets, read_bundle, storageProvider, storage_backend, write_bundle_facets
+
+
+def block_key(facet:str) -> str:
+    return awsKeyProvider().block_key('1hhk', facet, 'info')
+
+
+@pytest.fixture
+def bundle_config(aws_config):
+    return {**aws_config, 'facet_bundles':True}
+
+
+def test_writes_are_copied_into_the_bundle(bundle_config):
+    storageProvider(bundle_config).put(block_key('chains'), {'A':{'chains':['A']}})
+    bundle = read_bundle('1hhk', bundle_config)
+    assert bundle['facets']['chains'] == {'A':{'chains':['A']}}
+    assert bundle['md5']['chains'] == storage_backend(bundle_config).head(block_key('chains'))
+    # the pipeline's own blocks aren't bundled
+    storageProvider(bundle_config).put(block_key('fingerprints'), {'align':{}})
+    assert 'fingerprints' not in read_bundle('1hhk', bundle_config)['facets']
+
+
+def test_fresh_blocks_are_read_from_the_bundle(bundle_config):
+    storageProvider(bundle_config).put(block_key('chains'), {'A':{'chains':['A']}})
+    bundle = read_bundle('1hhk', bundle_config)
+    # a marker which is only in the bundle shows where the block was read from
+    bundle['facets']['chains']['bundled'] = True
+    storage_backend(bundle_config).put(block_key('bundle'), bundle)
+    blocks, success, errors = fetch_facets('1hhk', ['chains'], bundle_config)
+    assert blocks['chains']['bundled']
+
+
+def test_blocks_written_without_bundles_are_read_again(aws_config, bundle_config):
+    storageProvider(bundle_config).put(block_key('chains'), {'A':{'chains':['A']}})
+    storageProvider(aws_config).put(block_key('chains'), {'A':{'chains':['A', 'D']}})
+    assert read_bundle('1hhk', bundle_config)['facets']['chains'] == {'A':{'chains':['A']}}
+    blocks, success, errors = fetch_facets('1hhk', ['chains', 'core'], bundle_config)
+    assert blocks == {'chains':{'A':{'chains':['A', 'D']}}, 'core':None}
+    # and the bundle is brought up to date
+    assert read_bundle('1hhk', bundle_config)['facets']['chains'] == {'A':{'chains':['A', 'D']}}
+
+
+def test_facets_without_a_hash_are_read_again(bundle_config):
+    storageProvider(bundle_config).put(block_key('chains'), {'A':{'chains':['A']}})
+    # e.g. another process wrote the facet into the bundle without a hash, or a bundle written before they were recorded
+    write_bundle_facets('1hhk', {'chains':{'A':{'chains':['B']}}}, bundle_config)
+    blocks, success, errors = fetch_facets('1hhk', ['chains'], bundle_config)
+    assert blocks['chains'] == {'A':{'chains':['A']}}
+
+
+def test_hashes_are_taken_from_the_inventory(bundle_config, monkeypatch):
+    storageProvider(bundle_config).put(block_key('chains'), {'A':{'chains':['A']}})
+    storageProvider(bundle_config).put(block_key('core'), {'pdb_code':'1hhk'})
+    build_inventory(bundle_config)
+    backend = storage_backend(bundle_config)
+    def head(key):
+        raise AssertionError(f'{key} was checked with a HEAD request')
+    monkeypatch.setattr(backend, 'head', head)
+    blocks, success, errors = fetch_facets('1hhk', ['chains', 'core'], bundle_config)
+    assert blocks == {'chains':{'A':{'chains':['A']}}, 'core':{'pdb_code':'1hhk'}}
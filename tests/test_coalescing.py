@@ -0,0 +1,46 @@
+from storage import deep_merge, runContext, storageProvider, storage_backend, update_block
+
+
+def test_deep_merge_merges_nested_blocks():
+    block = {'assemblies':{'files':{'1':{'file_key':'a'}}, 'count':1}, 'peptide':'SIINFEKL'}
+    update = {'assemblies':{'files':{'2':{'file_key':'b'}}, 'count':2}, 'class':'class_i'}
+    merged = deep_merge(block, update)
+    assert merged is block
+    assert merged == {
+        'assemblies':{'files':{'1':{'file_key':'a'}, '2':{'file_key':'b'}}, 'count':2},
+        'peptide':'SIINFEKL',
+        'class':'class_i'
+    }
+
+
+def test_deep_merge_replaces_anything_but_dictionaries():
+    block = {'chains':['A', 'B'], 'best_match':{'match':'class_i_alpha'}, 'resolution':None}
+    merged = deep_merge(block, {'chains':['C'], 'best_match':None, 'resolution':{'value':1.8}})
+    assert merged == {'chains':['C'], 'best_match':None, 'resolution':{'value':1.8}}
+
+
+def test_run_context_update_defers_and_merges(aws_config):
+    key = 'structures/info/core/1hhk.json'
+    storageProvider(aws_config).put(key, {'pdb_code':'1hhk', 'assemblies':{'count':1}})
+    with runContext(aws_config) as context:
+        context.update(key, {'assemblies':{'files':{'1':{}}}})
+        block, success, errors = context.update(key, {'resolution':1.8})
+        assert block == {'pdb_code':'1hhk', 'assemblies':{'count':1, 'files':{'1':{}}}, 'resolution':1.8}
+        # nothing is written until the context is flushed
+        stored, success, errors = storage_backend(aws_config).get(key)
+        assert 'resolution' not in stored
+    stored, success, errors = storage_backend(aws_config).get(key)
+    assert stored == block
+    assert context.stats['updates'] == 2
+    assert context.stats['flushed'] == 1
+
+
+def test_coalesced_updates_are_written_when_the_step_ends(aws_config):
+    key = 'structures/info/core/1hhk.json'
+    with runContext(aws_config, defer_writes=False, coalesce_updates=True) as context:
+        update_block('1hhk', 'core', 'info', {'pdb_code':'1hhk'}, aws_config)
+        update_block('1hhk', 'core', 'info', {'resolution':1.8}, aws_config)
+        assert not storage_backend(aws_config).get(key)[1]
+        assert context.end_step() == []
+        assert storage_backend(aws_config).get(key)[0] == {'pdb_code':'1hhk', 'resolution':1.8}
+    assert context.stats['flushed'] == 1
@@ -0,0 +1,73 @@
+import pytest
+
+from storage import compressedProvider, localProvider, migrate_keys, storageProvider, storage_backend
+from storage.compression import decode, detect_codec, encode
+from storage.keys import compressible_key
+
+
+@pytest.mark.parametrize('codec', ['gzip', 'lzma'])
+def test_compression_round_trip(codec):
+    block = {'atoms':list(range(2000))}
+    stored = encode(block, 'json', codec)
+    assert detect_codec(stored) == codec
+    assert decode(stored, 'json') == block
+    cif_data = 'data_1HHK\n' + 'ATOM 1 N N . GLY A 1 1 ? 1.0 2.0 3.0\n' * 100
+    stored = encode(cif_data, 'cif', codec)
+    assert detect_codec(stored) == codec
+    assert decode(stored, 'cif') == cif_data
+
+
+def test_uncompressed_data_is_detected():
+    assert detect_codec(b'{"pdb_code": "1hhk"}') is None
+    assert decode('{"pdb_code": "1hhk"}', 'json') == {'pdb_code':'1hhk'}
+    assert decode(b'\x00\x01', 'binary') == b'\x00\x01'
+    # small blocks are stored uncompressed
+    assert detect_codec(encode({'pdb_code':'1hhk'}, 'json', 'gzip', minimum_size=4096)) is None
+
+
+def test_compressed_provider_reads_uncompressed_data(aws_config):
+    local = localProvider(aws_config)
+    local.put('structures/info/bundle/1hhk.json', {'core':{'pdb_code':'1hhk'}})
+    provider = compressedProvider(local, {'compression':{'json':'gzip'}, 'compression_minimum_size':0})
+    assert provider.get('structures/info/bundle/1hhk.json')[0] == {'core':{'pdb_code':'1hhk'}}
+    provider.put('structures/info/bundle/1hhj.json', {'core':{'pdb_code':'1hhj'}})
+    raw, success, errors = local.get('structures/info/bundle/1hhj.json', data_format='binary')
+    assert detect_codec(raw) == 'gzip'
+    assert provider.get('structures/info/bundle/1hhj.json')[0] == {'core':{'pdb_code':'1hhj'}}
+
+
+def test_compressible_keys():
+    assert compressible_key('pipeline/inventory/inventory.json')
+    assert compressible_key('structures/blobs/ab/' + 'ab' * 32 + '.cif')
+    assert compressible_key('structures/info/bundle/1hhk.json')
+    assert compressible_key('structures/info/fingerprints/1hhk.json')
+    # read directly from the bucket by the web app's models and the downloads
+    assert not compressible_key('structures/info/core/1hhk.json')
+    assert not compressible_key('structures/files/split/1hhk_1.cif')
+    assert compressible_key('structures/info/core/1hhk.json', prefixes=['structures/info/'])
+
+
+def test_keys_read_outside_storage_are_not_compressed(aws_config, fragment_cif):
+    config = {**aws_config, 'compression':{'cif':'gzip', 'json':'gzip'}, 'compression_minimum_size':0}
+    storageProvider(config).put('structures/info/core/1hhk.json', {'pdb_code':'1hhk'})
+    storageProvider(config).put('structures/files/split/1a8o_1.cif', fragment_cif, data_format='cif')
+    local = localProvider(aws_config)
+    assert local.get('structures/info/core/1hhk.json')[0] == {'pdb_code':'1hhk'}
+    assert local.get('structures/files/split/1a8o_1.cif', data_format='cif')[0] == fragment_cif
+    storageProvider(config).put('structures/info/bundle/1hhk.json', {'core':{'pdb_code':'1hhk'}})
+    raw, success, errors = local.get('structures/info/bundle/1hhk.json', data_format='binary')
+    assert detect_codec(raw) == 'gzip'
+
+
+def test_migrate_keys_only_compresses_storage_only_keys(aws_config, fragment_cif):
+    local = localProvider(aws_config)
+    local.put('structures/info/core/1hhk.json', {'pdb_code':'1hhk', 'atoms':list(range(2000))})
+    local.put('structures/info/bundle/1hhk.json', {'core':{'pdb_code':'1hhk', 'atoms':list(range(2000))}})
+    local.put('structures/files/split/1a8o_1.cif', fragment_cif, data_format='cif')
+    config = {**aws_config, 'compression':{'cif':'gzip', 'json':'gzip'}}
+    keys = [('structures/info/core/1hhk.json', 'json'), ('structures/info/bundle/1hhk.json', 'json'), ('structures/files/split/1a8o_1.cif', 'cif')]
+    report = migrate_keys(keys, config)
+    assert report['compressed'] == ['structures/info/bundle/1hhk.json']
+    assert report['skipped'] == ['structures/info/core/1hhk.json', 'structures/files/split/1a8o_1.cif']
+    assert detect_codec(local.get('structures/info/core/1hhk.json', data_format='binary')[0]) is None
+    assert storage_backend(config).get('structures/info/bundle/1hhk.json')[0]['core']['pdb_code'] == '1hhk'
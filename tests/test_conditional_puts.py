@@ -0,0 +1,99 @@
+import hashlib
+import os
+
+import pytest
+
+from storage import runContext, storage_backend, storageProvider, write_stats
+from storage.cache import write_through
+
+
+block = {'A':{'chains':['A'], 'best_match':{'match':'class_i_alpha'}}}
+
+
+@pytest.fixture
+def conditional_config(aws_config):
+    return {**aws_config, 'conditional_puts':True}
+
+
+def skipped_writes() -> int:
+    return write_stats['skipped_writes']
+
+
+def stored_mtime(aws_config, key) -> int:
+    return os.stat(storage_backend(aws_config).provider.path(key)).st_mtime_ns
+
+
+def test_unchanged_blocks_are_not_written_outside_a_run(conditional_config):
+    key = 'structures/info/chains/1hhk.json'
+    storageProvider(conditional_config).put(key, block)
+    before = skipped_writes()
+    payload, success, errors = storageProvider(conditional_config).put(key, block)
+    assert success
+    assert skipped_writes() == before + 1
+
+
+def test_changed_blocks_are_written(conditional_config):
+    key = 'structures/info/chains/1hhk.json'
+    storageProvider(conditional_config).put(key, block)
+    before = skipped_writes()
+    storageProvider(conditional_config).put(key, {'A':{'chains':['A', 'D']}})
+    assert skipped_writes() == before
+    assert storageProvider(conditional_config).get(key)[0] == {'A':{'chains':['A', 'D']}}
+
+
+def test_objects_changed_by_another_process_are_written(conditional_config):
+    key = 'structures/info/chains/1hhk.json'
+    with runContext(conditional_config, defer_writes=False) as context:
+        context.put(key, block)
+        # another process writes the block while the run holds its hash
+        storage_backend(conditional_config).put(key, {'A':{'chains':['B']}})
+        before = skipped_writes()
+        context.put(key, {'A':{'chains':['B']}})
+        assert skipped_writes() == before + 1
+        context.put(key, block)
+        assert skipped_writes() == before + 1
+    assert storageProvider(conditional_config).get(key)[0] == block
+
+
+def test_unchanged_files_are_not_written(conditional_config, fragment_cif):
+    key = 'structures/files/split/1a8o_1.cif'
+    storageProvider(conditional_config).put(key, fragment_cif, data_format='cif')
+    mtime = stored_mtime(conditional_config, key)
+    before = skipped_writes()
+    storageProvider(conditional_config).put(key, fragment_cif, data_format='cif')
+    assert skipped_writes() == before + 1
+    assert stored_mtime(conditional_config, key) == mtime
+
+
+@pytest.mark.parametrize('codec', ['gzip', 'lzma'])
+def test_compressed_objects_are_compared_as_stored(conditional_config, fragment_cif, codec):
+    config = {**conditional_config, 'compression':{'cif':codec, 'json':codec}, 'compression_minimum_size':0, 'compression_prefixes':['structures/']}
+    key = 'structures/files/split/1a8o_1.cif'
+    storageProvider(config).put(key, fragment_cif, data_format='cif')
+    before = skipped_writes()
+    storageProvider(config).put(key, fragment_cif, data_format='cif')
+    storageProvider(config).put('structures/info/chains/1hhk.json', block)
+    storageProvider(config).put('structures/info/chains/1hhk.json', block)
+    assert skipped_writes() == before + 2
+    assert storageProvider(config).get(key, data_format='cif')[0] == fragment_cif
+
+
+def test_writes_without_conditional_puts(aws_config):
+    key = 'structures/info/chains/1hhk.json'
+    before = skipped_writes()
+    for i in range(2):
+        write_through(aws_config, key, block)
+    assert skipped_writes() == before
+
+
+def test_s3_head_is_the_md5_of_the_stored_bytes():
+    moto = pytest.importorskip('moto')
+    import boto3
+    from storage import s3ClientProvider
+    config = {'aws_access_key_id':'testing', 'aws_access_secret':'testing', 'aws_region':'us-east-1', 's3_bucket':'test'}
+    with moto.mock_aws():
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket='test')
+        provider = s3ClientProvider(config)
+        assert provider.head('structures/info/chains/1hhk.json') is None
+        provider.put('structures/info/chains/1hhk.json', block)
+        assert provider.head('structures/info/chains/1hhk.json') == hashlib.md5(provider.stored_bytes('structures/info/chains/1hhk.json', block)).hexdigest()
@@ -0,0 +1,65 @@
+import pytest
+
+from storage import content_hash, recorded_file, save_derived_file, save_derived_files, storageProvider, localProvider
+from storage.content import blob_hash, blob_key
+
+
+key = 'structures/files/aligned/1a8o_1.cif'
+
+
+@pytest.fixture
+def content_config(aws_config):
+    return {**aws_config, 'content_addressed':True}
+
+
+def test_content_hash_is_the_same_for_text_and_bytes(fragment_cif):
+    assert content_hash(fragment_cif) == content_hash(fragment_cif.encode('utf-8'))
+    digest = content_hash(fragment_cif)
+    assert blob_hash(blob_key(digest)) == digest
+    assert blob_hash(key) is None
+
+
+def test_files_are_stored_at_their_key_without_content_addressing(aws_config, fragment_cif):
+    details, success, errors = save_derived_file(key, fragment_cif, aws_config)
+    assert success and details['file_key'] == key
+    assert storageProvider(aws_config).get(key, data_format='cif')[0] == fragment_cif
+
+
+def test_files_are_stored_as_blobs(content_config, fragment_cif):
+    details, success, errors = save_derived_file(key, fragment_cif, content_config)
+    assert success
+    assert details['file_key'] == blob_key(content_hash(fragment_cif))
+    assert details['alias_key'] == key
+    assert details['content_hash'] == content_hash(fragment_cif)
+    # the file is still at its own key for downloads
+    for stored_key in [details['file_key'], key]:
+        assert storageProvider(content_config).get(stored_key, data_format='cif')[0] == fragment_cif
+
+
+def test_identical_files_are_uploaded_once(content_config, fragment_cif):
+    results = save_derived_files([(key, fragment_cif, 'cif', None), ('structures/files/aligned/1a8o_2.cif', fragment_cif, 'cif', None)], content_config)
+    assert results[key][0]['file_key'] == results['structures/files/aligned/1a8o_2.cif'][0]['file_key']
+    blob = results[key][0]['file_key']
+    # a blob the process has stored isn't uploaded again, so a marker written over it is left alone
+    localProvider(content_config).put(blob, 'marker', data_format='cif')
+    save_derived_file('structures/files/aligned/1a8o_3.cif', fragment_cif, content_config)
+    assert localProvider(content_config).get(blob, data_format='cif')[0] == 'marker'
+
+
+def test_unchanged_files_keep_their_details(content_config, fragment_cif):
+    first, success, errors = save_derived_file(key, fragment_cif, content_config)
+    block = {'aligned':{'files':{'1':{'files':first}}}}
+    previous = recorded_file(block, ['aligned', 'files', '1', 'files'])
+    localProvider(content_config).put(key, 'marker', data_format='cif')
+    second, success, errors = save_derived_file(key, fragment_cif, content_config, previous=previous)
+    assert second == first
+    # the alias isn't written again either
+    assert localProvider(content_config).get(key, data_format='cif')[0] == 'marker'
+    changed, success, errors = save_derived_file(key, fragment_cif + '#\n', content_config, previous=previous)
+    assert changed['content_hash'] != first['content_hash']
+    assert localProvider(content_config).get(key, data_format='cif')[0] == fragment_cif + '#\n'
+
+
+def test_recorded_file_without_details():
+    assert recorded_file(None, ['aligned', 'files', '1', 'files']) is None
+    assert recorded_file({'aligned':{'files':{'1':None}}}, ['aligned', 'files', '1', 'files']) is None
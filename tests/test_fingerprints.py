@@ -0,0 +1,44 @@
+import pickle
+
+from storage import update_block
+from structure_pipeline.fingerprints import fingerprinted, is_skipped, run_if_stale, step_version
+
+
+def run_step(actions, route, aws_config, force=False):
+    step = actions[route]
+    return run_if_stale(step['action'], route, step['reads'], step_version(step), '1hhk', aws_config, force=force)
+
+
+def test_run_if_stale_skips_unchanged_steps(actions, run_pipeline, aws_config):
+    run_pipeline('1hhk', aws_config)
+    output, success, errors = run_step(actions, 'align', aws_config)
+    assert output['action']['skipped']
+    assert is_skipped(output)
+
+
+def test_steps_run_again_when_their_inputs_change(actions, run_pipeline, aws_config):
+    run_pipeline('1hhk', aws_config)
+    update_block('1hhk', 'chains', 'info', {'value':'D'}, aws_config)
+    output, success, errors = run_step(actions, 'align', aws_config)
+    assert not is_skipped(output)
+    # a dotted path is only stale when its own value changes
+    update_block('1hhk', 'core', 'info', {'resolution':1.8}, aws_config)
+    assert is_skipped(run_step(actions, 'assign_chains', aws_config)[0])
+    assert not is_skipped(run_step(actions, 'fetch_experiment', aws_config)[0])
+
+
+def test_forced_steps_always_run(actions, run_pipeline, aws_config):
+    run_pipeline('1hhk', aws_config)
+    assert not is_skipped(run_step(actions, 'align', aws_config, force=True)[0])
+
+
+def test_step_versions_change_with_the_version_key(actions):
+    step = actions['align']
+    assert step_version({**step, 'version':'2'}) == f'2-{step_version(step)}'
+
+
+def test_fingerprinted_actions_can_be_pickled():
+    step = {'action':update_block, 'reads':['core'], 'writes':['core']}
+    assert pickle.loads(pickle.dumps(fingerprinted(step, 'initialise'))).func is run_if_stale
+    # steps which don't declare what they read run as they are
+    assert fingerprinted({'action':update_block}, 'initialise') is update_block
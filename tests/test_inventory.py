@@ -0,0 +1,54 @@
+import storage.inventory as inventory
+from storage import build_inventory, save_inventory, storageProvider, storage_backend, structure_inventory
+from storage.inventory import delta_prefix, inventory_exists, inventory_key, list_keys
+
+
+def new_process(monkeypatch, token:str):
+    """
+    Starts the inventory afresh in this process, as another process would, with a delta object of its own
+    """
+    monkeypatch.setattr(inventory, '_inventories', {})
+    monkeypatch.setattr(inventory, '_process_token', token)
+
+
+def test_stored_inventory_has_no_structure_index(aws_config):
+    storageProvider(aws_config).put('structures/info/core/1hhk.json', {'pdb_code':'1hhk'})
+    report = build_inventory(aws_config)
+    assert report['objects'] == 1 and report['structures'] == 1
+    stored, success, errors = storage_backend(aws_config).get(inventory_key)
+    assert 'structures' not in stored
+    assert list(structure_inventory('1hhk', aws_config)) == ['structures/info/core/1hhk.json']
+
+
+def test_puts_are_recorded_and_indexed(aws_config):
+    build_inventory(aws_config)
+    assert not inventory_exists('structures/info/core/1hhk.json', aws_config)
+    storageProvider(aws_config).put('structures/info/core/1hhk.json', {'pdb_code':'1hhk'})
+    assert inventory_exists('structures/info/core/1hhk.json', aws_config)
+    assert list(structure_inventory('1hhk', aws_config)) == ['structures/info/core/1hhk.json']
+
+
+def test_processes_saving_at_once_keep_each_others_puts(aws_config, monkeypatch):
+    build_inventory(aws_config)
+    for token, pdb_code in [('first', '1hhk'), ('second', '1hhj')]:
+        new_process(monkeypatch, token)
+        storageProvider(aws_config).put(f'structures/info/core/{pdb_code}.json', {'pdb_code':pdb_code})
+        assert save_inventory(aws_config)
+    # each process writes its own delta, and never the inventory itself
+    assert len([key for key, size, modified, digest in list_keys(aws_config, prefix=delta_prefix)]) == 2
+    assert storage_backend(aws_config).get(inventory_key)[0]['keys'] == {}
+    new_process(monkeypatch, 'third')
+    assert inventory_exists('structures/info/core/1hhk.json', aws_config)
+    assert inventory_exists('structures/info/core/1hhj.json', aws_config)
+    assert sorted(inventory.cached_inventory(aws_config)['structures']) == ['1hhj', '1hhk']
+
+
+def test_deltas_are_folded_into_a_new_inventory(aws_config, monkeypatch):
+    build_inventory(aws_config)
+    storageProvider(aws_config).put('structures/info/core/1hhk.json', {'pdb_code':'1hhk'})
+    save_inventory(aws_config)
+    report = build_inventory(aws_config)
+    assert report['objects'] == 1
+    new_process(monkeypatch, 'other')
+    assert inventory_exists('structures/info/core/1hhk.json', aws_config)
+    assert not inventory_exists(inventory_key, aws_config)
@@ -0,0 +1,47 @@
+import contextlib
+
+import pytest
+
+from structure_pipeline.jobs import jobQueue
+
+
+class app():
+    def app_context(self):
+        return contextlib.nullcontext()
+
+
+def echo(pdb_code, aws_config, force=False):
+    return {'action':{'pdb_code':pdb_code}, 'core':None}, True, []
+
+
+def wait_for(queue, job_id):
+    queue.queue.join()
+    return queue.get(job_id)
+
+
+@pytest.fixture
+def queue():
+    return jobQueue(max_workers=2)
+
+
+def test_jobs_complete_with_the_result_of_on_complete(queue, aws_config):
+    job_id = queue.enqueue(app(), echo, ['1hhk', '1hhj'], aws_config, {}, on_complete=lambda job: {'successes':job['successes']})
+    job = wait_for(queue, job_id)
+    assert job['status'] == 'complete'
+    assert job['result'] == {'successes':['1hhk', '1hhj']}
+
+
+def test_jobs_complete_when_on_complete_fails(queue, aws_config):
+    def on_complete(job):
+        raise KeyError('title')
+    job_id = queue.enqueue(app(), echo, ['1hhk'], aws_config, {}, on_complete=on_complete)
+    job = wait_for(queue, job_id)
+    assert job['status'] == 'complete'
+    assert job['result'] == {'errors':['unable_to_complete_job__keyerror']}
+
+
+def test_jobs_without_on_complete_have_no_result(queue, aws_config):
+    job_id = queue.enqueue(app(), echo, ['1hhk'], aws_config, {'route':'fused'})
+    job = wait_for(queue, job_id)
+    assert job['status'] == 'complete' and job['result'] is None
+    assert queue.progress(job_id)['succeeded'] == 1
@@ -0,0 +1,67 @@
+from Bio.PDB import Superimposer
+from Bio.PDB.Atom import Atom
+from Bio.SVDSuperimposer import SVDSuperimposer
+
+import numpy as np
+import pytest
+
+from structure_pipeline.pipeline_actions.align_structures import kabsch
+
+
+def random_rotation(generator) -> np.ndarray:
+    q, r = np.linalg.qr(generator.normal(size=(3, 3)))
+    if np.linalg.det(q) < 0:
+        q[:, 0] = -q[:, 0]
+    return q
+
+
+@pytest.fixture
+def coordinates():
+    generator = np.random.default_rng(151)
+    reference = generator.uniform(-20, 20, size=(40, 3))
+    moved = np.dot(reference, random_rotation(generator)) + generator.uniform(-50, 50, size=3) + generator.normal(scale=0.3, size=(40, 3))
+    return reference, moved
+
+
+def test_kabsch_matches_svd_superimposer(coordinates):
+    reference, moved = coordinates
+    superimposer = SVDSuperimposer()
+    superimposer.set(reference, moved)
+    superimposer.run()
+    expected_rotation, expected_translation = superimposer.get_rotran()
+    rotation, translation, rmsd = kabsch(reference, moved)
+    assert np.allclose(rotation, expected_rotation)
+    assert np.allclose(translation, expected_translation)
+    assert rmsd == pytest.approx(superimposer.get_rms())
+
+
+def test_kabsch_matches_bio_pdb_superimposer(coordinates):
+    reference, moved = coordinates
+    fixed_atoms = [Atom('CA', coord, 0.0, 1.0, ' ', ' CA ', i, element='C') for i, coord in enumerate(reference)]
+    moving_atoms = [Atom('CA', coord, 0.0, 1.0, ' ', ' CA ', i, element='C') for i, coord in enumerate(moved)]
+    superimposer = Superimposer()
+    superimposer.set_atoms(fixed_atoms, moving_atoms)
+    rotation, translation, rmsd = kabsch(reference, moved)
+    assert np.allclose(rotation, superimposer.rotran[0])
+    assert np.allclose(translation, superimposer.rotran[1])
+    assert rmsd == pytest.approx(superimposer.rms)
+
+
+def test_kabsch_recovers_a_rigid_motion():
+    generator = np.random.default_rng(3)
+    reference = generator.uniform(-10, 10, size=(12, 3))
+    rotation = random_rotation(generator)
+    moved = np.dot(reference - 4.0, rotation.T)
+    found_rotation, translation, rmsd = kabsch(reference, moved)
+    assert rmsd == pytest.approx(0.0, abs=1e-9)
+    assert np.allclose(np.dot(moved, found_rotation) + translation, reference)
+    assert np.linalg.det(found_rotation) == pytest.approx(1.0)
+
+
+def test_kabsch_does_not_reflect():
+    generator = np.random.default_rng(7)
+    reference = generator.uniform(-10, 10, size=(12, 3))
+    mirrored = reference * np.array([-1.0, 1.0, 1.0])
+    rotation, translation, rmsd = kabsch(reference, mirrored)
+    assert np.linalg.det(rotation) == pytest.approx(1.0)
+    assert rmsd > 0.1
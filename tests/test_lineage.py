@@ -0,0 +1,33 @@
+from storage import update_block
+from structure_pipeline.lineage import downstream_steps, group_plan, lineage_graph, plan_recomputation, stale_steps
+
+
+def test_lineage_graph(actions):
+    graph = lineage_graph(actions)
+    assert graph['align'] == {'chains':'assign_chains'}
+    assert graph['measure_distances'] == {'aligned':'align'}
+    assert graph['fetch_experiment'] == {'core.resolution':'initialise'}
+    assert downstream_steps(actions, 'assign_chains') == ['align', 'measure_distances']
+
+
+def test_stale_steps_follow_the_changed_facets(actions, run_pipeline, aws_config):
+    run_pipeline('1hhk', aws_config)
+    assert stale_steps(actions, 'assign_chains', '1hhk', aws_config) == []
+    update_block('1hhk', 'chains', 'info', {'value':'D'}, aws_config)
+    # align read the chains, and measure_distances depends on align
+    assert stale_steps(actions, 'assign_chains', '1hhk', aws_config) == ['align', 'measure_distances']
+    assert stale_steps(actions, 'align', '1hhk', aws_config) == []
+
+
+def test_stale_steps_without_lineage(actions, aws_config):
+    assert stale_steps(actions, 'assign_chains', '1hhj', aws_config) == ['align', 'measure_distances']
+
+
+def test_plan_recomputation(actions, run_pipeline, aws_config):
+    for pdb_code in ['1hhk', '1hhj', '2bnr']:
+        run_pipeline(pdb_code, aws_config)
+    update_block('1hhj', 'aligned', 'info', {'value':'1hhj_2'}, aws_config)
+    update_block('2bnr', 'chains', 'info', {'value':'C'}, aws_config)
+    plan = plan_recomputation(actions, 'assign_chains', ['1hhk', '1hhj', '2bnr'], aws_config)
+    assert plan == {'1hhj':['measure_distances'], '2bnr':['align', 'measure_distances']}
+    assert group_plan(plan) == {('measure_distances',):['1hhj'], ('align', 'measure_distances'):['2bnr']}
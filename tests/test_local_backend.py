@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from storage import localProvider
+from storage.backends import temporary_suffix
+
+
+def test_local_provider_replaces_files_atomically(aws_config):
+    provider = localProvider(aws_config)
+    key = 'structures/files/split/1hhk_1.cif'
+    for version in ['first', 'second']:
+        payload, success, errors = provider.put(key, f'data_1HHK\n# {version}\n', data_format='cif')
+        assert success
+    assert provider.get(key, data_format='cif')[0] == 'data_1HHK\n# second\n'
+    directory = os.path.dirname(provider.path(key))
+    assert os.listdir(directory) == ['1hhk_1.cif']
+
+
+def test_local_provider_skips_temporary_files(aws_config):
+    provider = localProvider(aws_config)
+    provider.put('structures/info/core/1hhk.json', {'pdb_code':'1hhk'})
+    # a file left by a write which was interrupted
+    partial = os.path.join(os.path.dirname(provider.path('structures/info/core/1hhk.json')), f'.tmp1234{temporary_suffix}')
+    with open(partial, 'w') as partial_file:
+        partial_file.write('{"pdb_')
+    assert [key for key, size, modified, digest in provider.list_keys()] == ['structures/info/core/1hhk.json']
+    with pytest.raises(ValueError):
+        provider.path(f'structures/info/core/.tmp1234{temporary_suffix}')
+    # a file which merely starts with tmp is an ordinary key
+    provider.put('structures/info/core/tmp.json', {})
+    assert provider.get('structures/info/core/tmp.json')[1]
+
+
+def test_local_provider_refuses_keys_outside_its_directory(aws_config):
+    with pytest.raises(ValueError):
+        localProvider(aws_config).path('../other/core.json')
+
+
+def test_missing_keys(aws_config):
+    data, success, errors = localProvider(aws_config).get('structures/info/core/none.json')
+    assert data is None and not success and errors == ['file_not_found']
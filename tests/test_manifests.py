@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from structure_pipeline.manifests import advance_cursor, checkpoint_page, load_manifest, new_manifest, record_members, remaining_members, save_manifest
+
+
+def set_manifest(page_size:int=10):
+    return new_manifest('class_i', 'align', 'search_query', 'class_i_pdbefold_query', page_size=page_size)
+
+
+def test_advance_cursor_moves_on_to_later_pages():
+    manifest = set_manifest()
+    assert manifest['cursor'] == {'page':1, 'position':0}
+    assert advance_cursor(manifest, 1, 4)['cursor'] == {'page':1, 'position':4}
+    assert advance_cursor(manifest, 1, 10)['cursor'] == {'page':2, 'position':0}
+    assert advance_cursor(manifest, 2, 23)['cursor'] == {'page':4, 'position':3}
+
+
+def test_remaining_members_leaves_out_completed_and_errored_members():
+    manifest = set_manifest()
+    members = ['1hhk', '1hhj', '2bnr', '3mre']
+    record_members(manifest, ['1hhk', '1hhj', '2bnr'], ['1hhk', '2bnr'], {'1hhj':['no_class_i_alpha_chain']}, skipped=['2bnr'])
+    assert remaining_members(manifest, members) == ['3mre']
+    assert manifest['skipped'] == ['2bnr']
+    # an errored member which succeeds later has its errors cleared
+    record_members(manifest, ['1hhj'], ['1hhj'], {})
+    assert manifest['errors'] == {}
+    assert manifest['completed'] == ['1hhk', '2bnr', '1hhj']
+    assert remaining_members(manifest, list(reversed(members))) == ['3mre']
+
+
+def test_pages_started_together_are_all_recorded(aws_config):
+    # every page starts from the manifest as it was before any of them finished
+    started = set_manifest(page_size=2)
+    pages = {page:[f'{page}aa{i}' for i in range(2)] for page in range(1, 9)}
+    pages[8] = pages[8][:1]
+
+    def finish(page):
+        errors = {pages[page][1]:['unable_to_align']} if page % 2 == 0 and len(pages[page]) > 1 else {}
+        successes = [pdb_code for pdb_code in pages[page] if pdb_code not in errors]
+        return checkpoint_page(started, page, pages[page], successes, errors, aws_config, last_page=page == 8)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(finish, [3, 1, 8, 2, 5, 7, 4, 6]))
+    stored = load_manifest('class_i', 'align', 'search_query', 'class_i_pdbefold_query', aws_config)
+    assert stored['pages'] == list(range(1, 9))
+    assert len(stored['completed']) + len(stored['errors']) == 15
+    assert sorted(stored['errors']) == ['2aa1', '4aa1', '6aa1']
+    assert stored['cursor'] == {'page':9, 'position':0}
+    assert stored['status'] == 'complete'
+
+
+def test_cursor_is_the_first_page_not_run(aws_config):
+    started = set_manifest(page_size=2)
+    checkpoint_page(started, 1, ['1hhk', '1hhj'], ['1hhk', '1hhj'], {}, aws_config)
+    manifest = checkpoint_page(started, 3, ['2bnr', '3mre'], ['2bnr', '3mre'], {}, aws_config, last_page=True)
+    assert manifest['cursor'] == {'page':2, 'position':0}
+    assert manifest['status'] == 'running'
+    manifest = checkpoint_page(started, 2, ['1a1m', '1a1n'], ['1a1m'], {'1a1n':['no_class_i_alpha_chain']}, aws_config)
+    assert manifest['cursor'] == {'page':4, 'position':0}
+    assert manifest['status'] == 'complete'
+
+
+def test_pages_are_added_to_the_stored_manifest(aws_config):
+    earlier = set_manifest()
+    record_members(earlier, ['1hhk'], ['1hhk'], {})
+    save_manifest(earlier, aws_config)
+    manifest = checkpoint_page(set_manifest(), 1, ['1hhj'], ['1hhj'], {}, aws_config)
+    assert manifest['completed'] == ['1hhk', '1hhj']
@@ -0,0 +1,48 @@
+import Bio.PDB
+import pytest
+
+from storage import parse_atom_site
+from structure_pipeline.pipeline_actions.measure_cleft_angles import cleft_torsion_angles, table_cleft_torsion_angles, dihedral_angle, bond_angle
+
+import numpy as np
+
+
+def angle_difference(first, second) -> float:
+    return abs((first - second + 180) % 360 - 180)
+
+
+def first_model(path):
+    structure = Bio.PDB.MMCIFParser(QUIET=True).get_structure('1a8o', path)
+    for model in list(structure)[1:]:
+        structure.detach_child(model.get_id())
+    return structure
+
+
+def test_table_angles_match_bio_pdb(fragment_cif, fragment_path):
+    expected_contacts, expected = cleft_torsion_angles(first_model(fragment_path), 'A')
+    contacts, angles = table_cleft_torsion_angles(parse_atom_site(fragment_cif), 'A')
+    assert sorted(angles) == sorted(expected)
+    assert sorted(contacts) == sorted(expected_contacts)
+    for residue_number in expected:
+        for angle_name, value in expected[residue_number].items():
+            if value is None or isinstance(value, str):
+                assert angles[residue_number][angle_name] == value, (residue_number, angle_name)
+            else:
+                assert angle_difference(angles[residue_number][angle_name], value) < 1e-3, (residue_number, angle_name)
+
+
+def test_non_standard_residues_have_no_angles(fragment_cif):
+    contacts, angles = table_cleft_torsion_angles(parse_atom_site(fragment_cif), 'A')
+    assert angles[151]['residue'] == 'MSE'
+    assert all(angles[151][angle_name] is None for angle_name in angles[151] if angle_name != 'residue')
+    # nor is the residue after it linked to it
+    assert angles[152]['phi'] is None
+    assert angles[152]['psi'] is not None
+
+
+def test_dihedral_and_bond_angles():
+    points = [np.array(point, dtype=float) for point in [[1, 0, 0], [0, 0, 0], [0, 1, 0], [0, 1, 1]]]
+    assert dihedral_angle(*points) == pytest.approx(-90.0)
+    assert dihedral_angle(points[0], points[1], points[2], None) is None
+    assert bond_angle(*points[:3]) == pytest.approx(90.0)
+    assert bond_angle(None, points[1], points[2]) is None
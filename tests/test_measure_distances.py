@@ -0,0 +1,42 @@
+import pytest
+
+from common.providers import awsKeyProvider
+from storage import storageProvider
+from structure_pipeline.pipeline_actions.measure_distances import measure_distances
+
+
+file_key = 'structures/files/aligned/1a8o_1.cif'
+
+
+def store_complex(aws_config, cif_data):
+    s3 = storageProvider(aws_config)
+    s3.put(file_key, cif_data, data_format='cif')
+    s3.put(awsKeyProvider().block_key('1a8o', 'core', 'info'), {'pdb_code':'1a8o'})
+    s3.put(awsKeyProvider().block_key('1a8o', 'aligned', 'info'), {'aligned':{'files':{'1':{'files':{'file_key':file_key}}}}})
+    s3.put(awsKeyProvider().block_key('1a8o', 'chains', 'info'), {'1':{'chains':['P'], 'best_match':{'match':'peptide'}}, '2':{'chains':['A'], 'best_match':{'match':'class_i_alpha'}}})
+    return aws_config
+
+
+def without_c_alpha(cif_data, residue_number):
+    return '\n'.join(line for line in cif_data.splitlines() if not (line.startswith('ATOM') and line.split()[3] == 'CA' and line.split()[21] == str(residue_number))) + '\n'
+
+
+def test_table_distances_match_bio_pdb(aws_config, complex_cif):
+    store_complex(aws_config, complex_cif)
+    output, success, errors = measure_distances('1a8o', aws_config)
+    table_output, table_success, table_errors = measure_distances('1a8o', {**aws_config, 'atom_tables':True})
+    assert sorted(output['action']['c_alpha_distances']['1']['peptide']) == list(range(151, 158))
+    assert table_output['action'] == output['action']
+    assert errors == table_errors == []
+
+
+@pytest.mark.parametrize('residue_number', [153, 157])
+def test_missing_c_alphas_give_the_same_errors(aws_config, complex_cif, residue_number):
+    # a C alpha missing part way through raises on the next pair, one missing from the last pair leaves the set empty
+    store_complex(aws_config, without_c_alpha(complex_cif, residue_number))
+    output, success, errors = measure_distances('1a8o', aws_config)
+    table_output, table_success, table_errors = measure_distances('1a8o', {**aws_config, 'atom_tables':True})
+    assert output['action']['c_alpha_distances']['1'] is None
+    assert table_output['action'] == output['action']
+    assert table_errors == errors
+    assert set(errors) == {'unable_to_build_calpha_set'}
@@ -0,0 +1,23 @@
+from structure_pipeline.paging import adaptive_page_size, estimate_cost, default_page_size, minimum_page_size, maximum_page_size
+
+
+def test_estimate_cost_is_the_median_per_structure():
+    runs = [{'per_structure':per_structure, 'workers':4} for per_structure in [1.0, 3.0, 2.0, 10.0]]
+    assert estimate_cost(runs) == 2.5
+    assert estimate_cost([]) is None
+
+
+def test_estimate_cost_prefers_runs_with_the_same_workers():
+    runs = [{'per_structure':1.0, 'workers':8}, {'per_structure':4.0, 'workers':1}, {'per_structure':6.0, 'workers':1}]
+    assert estimate_cost(runs, workers=8) == 1.0
+    assert estimate_cost(runs, workers=1) == 5.0
+    # with no runs on as many workers, all of the runs are used
+    assert estimate_cost(runs, workers=4) == 4.0
+
+
+def test_adaptive_page_size():
+    assert adaptive_page_size(None, 600) == default_page_size
+    assert adaptive_page_size(0, 600) == maximum_page_size
+    assert adaptive_page_size(2.0, 600) == 300
+    assert adaptive_page_size(0.01, 600) == maximum_page_size
+    assert adaptive_page_size(1200, 600) == minimum_page_size
@@ -0,0 +1,34 @@
+import pytest
+
+from common.providers import awsKeyProvider
+from storage import parse_atom_site, storageProvider
+from structure_pipeline.pipeline_actions.peptide_neighbours import peptide_neighbours, table_residue_pairs
+
+
+file_key = 'structures/files/split/1a8o_1.cif'
+
+
+@pytest.fixture
+def complex_config(aws_config, complex_cif):
+    s3 = storageProvider(aws_config)
+    s3.put(file_key, complex_cif, data_format='cif')
+    s3.put(awsKeyProvider().block_key('1a8o', 'core', 'info'), {'pdb_code':'1a8o', 'complex':{'slug':'class_i_test'}, 'assemblies':{'files':{'1':{'files':{'file_key':file_key}}}}})
+    s3.put(awsKeyProvider().block_key('1a8o', 'chains', 'info'), {'1':{'chains':['P'], 'best_match':{'match':'peptide'}}, '2':{'chains':['A'], 'best_match':{'match':'class_i_alpha'}}})
+    return aws_config
+
+
+def test_table_residue_pairs_are_in_file_order(complex_cif):
+    table = parse_atom_site(complex_cif)
+    pairs = table_residue_pairs(table, 'A', 'P')
+    assert len(pairs) > 0
+    assert pairs == sorted(pairs)
+    assert all(table['chain_id'][a] == 'A' and table['chain_id'][p] == 'P' for a, p in pairs)
+
+
+def test_table_neighbours_match_bio_pdb(complex_config):
+    output, success, errors = peptide_neighbours('1a8o', complex_config)
+    table_output, table_success, table_errors = peptide_neighbours('1a8o', {**complex_config, 'atom_tables':True})
+    assert output['action']['peptide_neighbours']['1']
+    # the neighbours of each residue are listed in the same order too
+    assert table_output['action'] == output['action']
+    assert (table_success, table_errors) == (success, errors)
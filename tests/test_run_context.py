@@ -0,0 +1,35 @@
+from storage import fetch_core, runContext, storageProvider, storage_backend
+from storage.cache import block_cache_key, configure_process_cache
+
+
+def test_run_context_returns_copies(aws_config):
+    key = 'structures/info/chains/1hhk.json'
+    with runContext(aws_config) as context:
+        context.put(key, {'A':{'chains':['A']}})
+        block, success, errors = context.get(key)
+        block['A']['chains'].append('D')
+        assert context.get(key)[0] == {'A':{'chains':['A']}}
+
+
+def test_blocks_are_read_once_per_run(aws_config):
+    storageProvider(aws_config).put('structures/info/core/1hhk.json', {'pdb_code':'1hhk'})
+    with runContext(aws_config) as context:
+        for i in range(3):
+            core, success, errors = fetch_core('1hhk', aws_config)
+            assert core == {'pdb_code':'1hhk'}
+        # written outside the run, so not seen until the next one
+        storage_backend(aws_config).put('structures/info/core/1hhk.json', {'pdb_code':'1hhj'})
+        assert fetch_core('1hhk', aws_config)[0] == {'pdb_code':'1hhk'}
+    assert (context.stats['reads'], context.stats['hits'], context.stats['misses']) == (4, 3, 1)
+    assert fetch_core('1hhk', aws_config)[0] == {'pdb_code':'1hhj'}
+
+
+def test_process_cache_is_keyed_by_store(aws_config):
+    other = {**aws_config, 's3_bucket':'other', 'block_cache_ttl':60}
+    config = {**aws_config, 'block_cache_ttl':60}
+    key = 'structures/info/core/1hhk.json'
+    storageProvider(config).put(key, {'pdb_code':'1hhk'})
+    assert storageProvider(config).get(key)[0] == {'pdb_code':'1hhk'}
+    assert block_cache_key(config, key) != block_cache_key(other, key)
+    assert not storageProvider(other).get(key)[1]
+    configure_process_cache(config).invalidate(block_cache_key(config, key))
@@ -0,0 +1,33 @@
+from structure_pipeline.scheduler import build_dag, dag_levels, facets_conflict
+
+
+def test_facets_conflict():
+    assert facets_conflict('core', 'core')
+    assert facets_conflict('core', 'core.peptide')
+    assert facets_conflict('core.peptide', 'core')
+    assert not facets_conflict('core.peptide', 'core.organism')
+    assert not facets_conflict('core', 'core_features')
+
+
+def test_build_dag(actions):
+    dag = build_dag(actions, list(actions))
+    assert dag == {
+        'initialise':set(),
+        'assign_chains':{'initialise'},
+        'align':{'assign_chains'},
+        'measure_distances':{'align'},
+        'fetch_experiment':{'initialise'}
+    }
+
+
+def test_steps_without_reads_and_writes_are_barriers(actions):
+    actions['view'] = {'action':None, 'next':None}
+    actions['after_view'] = {'action':None, 'reads':['experiment'], 'writes':['view'], 'next':None}
+    dag = build_dag(actions, list(actions))
+    assert dag['view'] == {'initialise', 'assign_chains', 'align', 'measure_distances', 'fetch_experiment'}
+    assert 'view' in dag['after_view']
+
+
+def test_dag_levels(actions):
+    levels = dag_levels(build_dag(actions, list(actions)))
+    assert levels == [['initialise'], ['assign_chains', 'fetch_experiment'], ['align'], ['measure_distances']]
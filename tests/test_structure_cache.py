@@ -0,0 +1,67 @@
+import Bio.PDB
+import pytest
+
+from storage import configure_structure_cache, load_cif, process_structures, storageProvider
+from storage.structures import bytes_per_atom, structureCache
+
+
+@pytest.fixture
+def structure(fragment_path):
+    return Bio.PDB.MMCIFParser(QUIET=True).get_structure('1a8o', fragment_path)
+
+
+@pytest.fixture
+def structure_config(aws_config):
+    yield {**aws_config, 'structure_cache_size':16}
+    configure_structure_cache(aws_config)
+    process_structures.clear()
+
+
+def structure_size(structure) -> int:
+    return sum(1 for atom in structure.get_atoms()) * bytes_per_atom
+
+
+def test_least_recently_used_structures_are_evicted(structure):
+    cache = structureCache(max_bytes=int(structure_size(structure) * 2.5))
+    cache.set('first', structure)
+    cache.set('second', structure)
+    assert cache.checkout('first') is not None
+    cache.set('third', structure)
+    assert cache.checkout('second') is None
+    assert cache.checkout('first') is not None and cache.checkout('third') is not None
+    assert cache.report()['evictions'] == 1
+    assert cache.report()['bytes'] == structure_size(structure) * 2
+
+
+def test_structures_larger_than_the_cache_are_not_stored(structure):
+    cache = structureCache(max_bytes=structure_size(structure) - 1)
+    cache.set('first', structure)
+    assert cache.report()['structures'] == 0
+
+
+def test_checked_out_structures_are_copies(structure):
+    cache = structureCache()
+    cache.set('first', structure)
+    atom = next(cache.checkout('first').get_atoms())
+    atom.set_coord(atom.get_coord() + 10.0)
+    assert (next(cache.checkout('first').get_atoms()).get_coord() == next(structure.get_atoms()).get_coord()).all()
+
+
+def test_load_cif_parses_each_file_once(structure_config, fragment_cif):
+    key = 'structures/files/split/1a8o_1.cif'
+    storageProvider(structure_config).put(key, fragment_cif, data_format='cif')
+    before = process_structures.report()
+    for i in range(3):
+        assert load_cif(key, '1a8o_1', structure_config) is not None
+    report = process_structures.report()
+    assert report['hits'] - before['hits'] == 2
+    # a file which has been rewritten is parsed again
+    storageProvider(structure_config).put(key, fragment_cif + '#\n', data_format='cif')
+    load_cif(key, '1a8o_1', structure_config)
+    assert process_structures.report()['misses'] - report['misses'] == 1
+    assert process_structures.report()['structures'] == 2
+
+
+def test_a_size_of_zero_turns_the_cache_off(aws_config):
+    assert configure_structure_cache({**aws_config, 'structure_cache_size':0}).max_bytes == 0
+    configure_structure_cache(aws_config)
@@ -0,0 +1,22 @@
+import threading
+
+from storage import compression_report
+from storage.compression import _stats_lock
+from structure_pipeline.workers import run_members
+
+
+def report_compression(pdb_code, aws_config, force=False):
+    return {'action':{'compression':compression_report()}, 'core':None}, True, []
+
+
+def test_process_workers_do_not_inherit_held_locks(aws_config):
+    results = []
+    run = threading.Thread(target=lambda: results.append(run_members(report_compression, ['1hhk', '1hhj'], aws_config, execution='process', max_workers=2)), daemon=True)
+    # a lock held by another thread of the runner, which a forked worker would wait on for ever
+    with _stats_lock:
+        run.start()
+        run.join(timeout=60)
+    assert len(results) == 1
+    successes, errordict, timings, skipped = results[0]
+    assert successes == ['1hhk', '1hhj']
+    assert errordict == {}